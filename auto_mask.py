@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Automatic Statistical Masking
+Masks pixels that do not belong to the powder rings, from the calibrated
+geometry and the frame itself, so every pressure point gets its own mask:
+
+    spots      single-crystal reflections (diamond, ruby, recrystallized
+               sample) that move from frame to frame: pixels brighter than
+               median + sigma * MAD of their radial/azimuthal bin
+    hot/dead   pixels that are outliers (or at/below dead_value) in most
+               frames of a reference stack; a beamstop shadow shows up as a
+               persistent low outlier and is masked the same way
+
+Every pixel belongs to one (2theta, chi) bin of the geometry. The median and
+MAD of all bins are computed at once: values are offset by their bin index
+and sorted in a single pass, which leaves each bin as a sorted segment.
+
+Per-frame outliers are handed to integrate1d as dummy pixels rather than as
+a mask, so the cached integration engines (keyed by the static mask) are
+reused for every frame. Stack results are cached like the frame corrections.
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from frame_correction import iter_reference_blocks, _file_signature
+from mask_io import load_mask, save_mask, COMPACT_EXTENSION
+
+
+# Value written into auto-masked pixels, passed to integrate1d as dummy
+DUMMY = np.float32(-1.0e30)
+DUMMY_KWARGS = {'dummy': float(DUMMY), 'delta_dummy': 1.0e25}
+
+# Scale of the MAD to the standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+
+def grow(mask, pixels=1):
+    """Dilate a mask by whole pixels in 4 directions (as the mask editor's grow)"""
+    mask = mask.copy()
+    for _ in range(pixels):
+        mask[1:, :] |= mask[:-1, :]
+        mask[:-1, :] |= mask[1:, :]
+        mask[:, 1:] |= mask[:, :-1]
+        mask[:, :-1] |= mask[:, 1:]
+    return mask
+
+
+def _segment_median(bins, values, counts, starts):
+    """
+    Median of values per bin, for all bins at once
+
+    Args:
+        bins (numpy.ndarray): Bin of every value (int)
+        values (numpy.ndarray): Values
+        counts (numpy.ndarray): Values per bin (np.bincount(bins))
+        starts (numpy.ndarray): First index of every bin in bin order
+
+    Returns:
+        numpy.ndarray: Median per bin (nan for empty bins)
+    """
+    low = values.min()
+    span = float(values.max() - low) or 1.0
+    # bin + fraction in [0, 1): one sort orders by bin, then by value
+    keys = bins + (values - low) * (0.999999 / span)
+    keys.sort()
+    fractions = keys - np.floor(keys)
+
+    median = np.full(len(counts), np.nan)
+    filled = counts > 0
+    lower = (starts + (counts - 1) // 2)[filled]
+    upper = (starts + counts // 2)[filled]
+    median[filled] = low + (fractions[lower] + fractions[upper]) * (0.5 * span / 0.999999)
+    return median
+
+
+class AutoMasker:
+    """Sigma clipping of each pixel against its radial/azimuthal bin"""
+
+    def __init__(self, ai, sigma=5.0, low_sigma=None, radial_bins=None, azimuth_bins=36,
+                 min_pixels=16, grow_pixels=1, poisson=True, stack_file=None, dataset_path=None,
+                 persist_fraction=0.5, dead_value=0.0, dead_fraction=0.9, cache_dir=None,
+                 mask=None, verbose=True):
+        """
+        Args:
+            ai: pyFAI AzimuthalIntegrator (calibrated geometry)
+            sigma (float): Pixels above median + sigma * MAD-sigma of their bin are masked
+            low_sigma (float, optional): Also mask pixels below median - low_sigma * MAD-sigma
+            radial_bins (int, optional): 2theta bins of the statistics; None = one bin per
+                                         pixel of radius, so a bin is narrower than a ring
+            azimuth_bins (int): Azimuthal (chi) bins of the statistics
+            min_pixels (int): Bins with fewer valid pixels are never clipped
+            grow_pixels (int): Dilate the per-frame outliers by this many pixels (spot tails)
+            poisson (bool): Use at least sqrt(median) as the bin sigma (counting detectors)
+            stack_file (str, optional): Reference stack scanned for hot/dead pixels
+            dataset_path (str, optional): HDF5 dataset path of the stack
+            persist_fraction (float): Outlier in at least this fraction of the stack = hot pixel
+            dead_value (float): Pixels at or below this value count as dead
+            dead_fraction (float): Dead in at least this fraction of the stack = dead pixel
+            cache_dir (str, optional): Directory of the cached hot/dead mask (None = no disk cache)
+            mask (numpy.ndarray, optional): Static mask; its pixels are left out of the statistics
+            verbose (bool): Print a summary of the stack scan
+        """
+        if stack_file is not None and not os.path.exists(stack_file):
+            raise FileNotFoundError(f"Auto-mask stack file not found: {stack_file}")
+
+        self.ai = ai
+        self.sigma = float(sigma)
+        self.low_sigma = None if low_sigma is None else float(low_sigma)
+        self.radial_bins = None if radial_bins is None else int(radial_bins)
+        self.azimuth_bins = int(azimuth_bins)
+        self.min_pixels = int(min_pixels)
+        self.grow_pixels = int(grow_pixels)
+        self.poisson = bool(poisson)
+        self.stack_file = stack_file
+        self.dataset_path = dataset_path
+        self.persist_fraction = float(persist_fraction)
+        self.dead_value = float(dead_value)
+        self.dead_fraction = float(dead_fraction)
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+
+        settings = {
+            'sigma': self.sigma, 'low_sigma': self.low_sigma, 'radial_bins': self.radial_bins,
+            'azimuth_bins': self.azimuth_bins, 'min_pixels': self.min_pixels,
+            'grow_pixels': self.grow_pixels, 'poisson': self.poisson,
+            'stack': _file_signature(stack_file), 'dataset_path': dataset_path,
+            'persist_fraction': self.persist_fraction, 'dead_value': self.dead_value,
+            'dead_fraction': self.dead_fraction,
+        }
+        self.digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+        self._geometry_key = None
+        self._bins = None
+        self._bin_count = 0
+        self.bad_pixels = None
+        if stack_file is not None:
+            self.bad_pixels = self._load_cached(mask)
+            if self.bad_pixels is None:
+                self.bad_pixels = self._scan_stack(mask)
+                self._store_cached(mask)
+            elif verbose:
+                print(f"✓ Hot/dead pixel mask loaded from cache ({self.cache_dir})")
+
+    def options(self):
+        """Constructor arguments (besides ai and mask), to rebuild the masker in a worker process"""
+        return {'sigma': self.sigma, 'low_sigma': self.low_sigma, 'radial_bins': self.radial_bins,
+                'azimuth_bins': self.azimuth_bins, 'min_pixels': self.min_pixels,
+                'grow_pixels': self.grow_pixels, 'poisson': self.poisson,
+                'stack_file': self.stack_file, 'dataset_path': self.dataset_path,
+                'persist_fraction': self.persist_fraction, 'dead_value': self.dead_value,
+                'dead_fraction': self.dead_fraction, 'cache_dir': self.cache_dir}
+
+    def _geometry(self, shape, mask):
+        """Flat bin index of every pixel (-1 = masked), built once per shape and mask"""
+        key = (tuple(shape), id(mask))
+        if self._geometry_key == key:
+            return self._bins
+        tth = self.ai.center_array(shape, unit='2th_rad')
+        chi = self.ai.center_array(shape, unit='chi_rad')
+        valid = np.isfinite(tth) & np.isfinite(chi)
+        if mask is not None:
+            valid &= ~np.asarray(mask, dtype=bool)
+
+        radial_bins = self.radial_bins
+        if radial_bins is None:
+            radius = self.ai.center_array(shape, unit='r_mm')[valid] / (self.ai.pixel1 * 1e3)
+            radial_bins = max(1, int(np.ceil(radius.max() - radius.min())))
+        t_min, t_max = tth[valid].min(), tth[valid].max()
+        radial = np.floor((tth - t_min) / ((t_max - t_min) or 1.0) * radial_bins)
+        azimuth = np.floor((chi + np.pi) / (2 * np.pi) * self.azimuth_bins)
+        bins = (np.clip(radial, 0, radial_bins - 1) * self.azimuth_bins
+                + np.clip(azimuth, 0, self.azimuth_bins - 1))
+        bins = np.where(valid, bins, -1).astype(np.int32).ravel()
+
+        self._geometry_key = key
+        self._bins = bins
+        self._bin_count = radial_bins * self.azimuth_bins
+        return bins
+
+    def outliers(self, img_data, mask=None, low_sigma=None):
+        """
+        Pixels deviating from the median of their bin
+
+        Args:
+            img_data (numpy.ndarray): Frame
+            mask (numpy.ndarray, optional): Static mask (excluded from the statistics)
+            low_sigma (float, optional): Low-side threshold overriding self.low_sigma
+
+        Returns:
+            tuple: (high, low) boolean frames; low is None without a low threshold
+        """
+        low_sigma = self.low_sigma if low_sigma is None else low_sigma
+        bins = self._geometry(img_data.shape, mask)
+        values = np.asarray(img_data, dtype=np.float64).ravel()
+        valid = bins >= 0
+        valid &= np.isfinite(values)
+        index = np.flatnonzero(valid)
+        bins, values = bins[index], values[index]
+
+        counts = np.bincount(bins, minlength=self._bin_count)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        median = _segment_median(bins, values, counts, starts)
+        deviation = values - median[bins]
+        spread = MAD_SCALE * _segment_median(bins, np.abs(deviation), counts, starts)
+        if self.poisson:
+            spread = np.maximum(spread, np.sqrt(np.clip(median, 1.0, None)))
+        else:
+            spread = np.maximum(spread, np.finfo(np.float32).tiny)
+
+        score = deviation / spread[bins]
+        usable = counts[bins] >= self.min_pixels
+        high = np.zeros(img_data.size, dtype=bool)
+        high[index[usable & (score > self.sigma)]] = True
+        high = high.reshape(img_data.shape)
+        low = None
+        if low_sigma is not None:
+            low = np.zeros(img_data.size, dtype=bool)
+            low[index[usable & (score < -low_sigma)]] = True
+            low = low.reshape(img_data.shape)
+        return high, low
+
+    def frame_mask(self, img_data, mask=None):
+        """
+        Auto mask of one frame (per-frame outliers, grown; static mask not included)
+
+        Args:
+            img_data (numpy.ndarray): Frame
+            mask (numpy.ndarray, optional): Static mask
+
+        Returns:
+            numpy.ndarray: Boolean mask
+        """
+        high, low = self.outliers(img_data, mask)
+        flags = high if low is None else (high | low)
+        if self.grow_pixels > 0:
+            flags = grow(flags, self.grow_pixels)
+        return flags
+
+    def apply(self, img_data, mask=None):
+        """
+        Replace the auto-masked pixels of one frame by DUMMY
+
+        Writeable float32 frames are changed in place; anything else is
+        converted to float32 once. Integrate the result with DUMMY_KWARGS.
+
+        Returns:
+            numpy.ndarray: Frame with the masked pixels set to DUMMY
+        """
+        flags = self.frame_mask(img_data, mask)
+        if not (isinstance(img_data, np.ndarray) and img_data.dtype == np.float32
+                and img_data.flags.writeable):
+            img_data = np.array(img_data, dtype=np.float32)
+        img_data[flags] = DUMMY
+        return img_data
+
+    def _scan_stack(self, mask):
+        """Hot, dead and persistently shadowed pixels of the reference stack"""
+        persistent = dead = None
+        count = 0
+        for block in iter_reference_blocks(self.stack_file, self.dataset_path):
+            for frame in block:
+                frame = np.asarray(frame, dtype=np.float32)
+                if persistent is None:
+                    persistent = np.zeros(frame.shape, dtype=np.uint32)
+                    dead = np.zeros(frame.shape, dtype=np.uint32)
+                high, low = self.outliers(frame, mask, low_sigma=self.low_sigma or self.sigma)
+                persistent += high | low
+                dead += frame <= self.dead_value
+                count += 1
+        if count == 0:
+            raise ValueError(f"Auto-mask stack has no frames: {self.stack_file}")
+
+        hot = persistent >= self.persist_fraction * count
+        dead = dead >= self.dead_fraction * count
+        if self.verbose:
+            print(f"✓ Scanned {count} frame(s) for hot/dead pixels: {self.stack_file}")
+            print(f"  Hot or shadowed: {np.count_nonzero(hot)}, dead: {np.count_nonzero(dead)}")
+        return hot | dead
+
+    def _cache_path(self, mask):
+        # str() of the integrator lists detector and every geometry parameter
+        digest = hashlib.sha1((self.digest + str(self.ai)).encode('utf-8'))
+        if mask is not None:
+            digest.update(np.packbits(np.asarray(mask, dtype=bool)).tobytes())
+        return os.path.join(self.cache_dir, f"automask_{digest.hexdigest()}{COMPACT_EXTENSION}")
+
+    def _load_cached(self, mask):
+        if self.cache_dir is None:
+            return None
+        path = self._cache_path(mask)
+        if not os.path.exists(path):
+            return None
+        try:
+            return load_mask(path)
+        except (OSError, ValueError):
+            return None
+
+    def _store_cached(self, mask):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(mask)
+        tmp_path = f"{path}.{os.getpid()}.tmp{COMPACT_EXTENSION}"
+        save_mask(tmp_path, self.bad_pixels)
+        os.replace(tmp_path, path)
@@ -19,6 +19,7 @@ import pandas as pd
 from scipy.optimize import least_squares
 import warnings
 import re
+from pattern_index import find_pattern_index, lookup
 warnings.filterwarnings('ignore')
 
 
@@ -212,10 +213,14 @@ class LatticeParameterCalculator:
         Read CSV file and extract pressure points and peak positions
         
         CSV Format:
-        - Column 'File': Pressure values (e.g., "10", "10.5", "40 GPa")
+        - Column 'File': Pattern name or pressure value (e.g., "10.5GPa_Bin001_0.0-10.0", "40 GPa")
         - Column 'Center': Peak positions in 2theta (degrees)
         - Empty rows separate different pressure points
         
+        Pattern names are looked up in the pattern index written by the
+        integration (pattern_index.csv next to the CSV or up to two directories
+        above it); only names missing from the index are parsed as numbers.
+        
         Parameters:
             csv_path (str): Path to CSV file
             
@@ -228,6 +233,7 @@ class LatticeParameterCalculator:
             raise ValueError("CSV file must contain 'File' and 'Center' columns")
         
         pressure_data = {}
+        index = find_pattern_index(csv_path)
         
         for idx, row in df.iterrows():
             # Check if this is a blank row
@@ -237,11 +243,15 @@ class LatticeParameterCalculator:
             # Extract pressure value
             try:
                 file_str = str(row['File'])
-                numbers = re.findall(r'[-+]?\d*\.?\d+', file_str)
-                if numbers:
-                    pressure = float(numbers[0])
+                entry = lookup(index, file_str)
+                if entry is not None and entry['pressure'] is not None:
+                    pressure = entry['pressure']
                 else:
-                    pressure = float(file_str)
+                    numbers = re.findall(r'[-+]?\d*\.?\d+', file_str)
+                    if numbers:
+                        pressure = float(numbers[0])
+                    else:
+                        pressure = float(file_str)
             except:
                 print(f"Warning: Cannot parse pressure value: {row['File']}")
                 continue
@@ -11,9 +11,18 @@ Features:
 - Color-coded by pressure range (changes every 10 GPa)
 
 Usage:
-    python batch_integration_advanced.py                    # Use default config file
-    python batch_integration_advanced.py config.ini         # Use specified config file
-    python batch_integration_advanced.py --help             # Show help information
+    python -m batch_integration --config job.ini            # Run the job described by job.ini
+    python -m batch_integration --config job.ini --workers 8 --resume --formats xy,chi
+    python -m batch_integration --watch DIR --poni cal.poni --output OUT   # Live folder mode
+    python -m batch_integration --help                      # Show help information
+
+Config file:
+    [paths]        poni_file, mask_file, input_pattern, output_dir, dataset_path,
+                   dark_file, flat_file, background_file
+    [integration]  npt, unit, correct_solid_angle, polarization_factor,
+                   formats (comma-separated, e.g. xy,chi,h5; default xy)
+    [advanced]     method, safe, normalization_factor
+    [auto_mask]    enabled, sigma, low_sigma, azimuth_bins, grow_pixels, stack_file
 
 Author: Felicity 💕
 """
@@ -24,61 +33,123 @@ import glob
 import h5py
 import numpy as np
 import pyFAI
-import fabio
 import argparse
 import configparser
 import re
+import json
+import hashlib
+import multiprocessing
+import fnmatch
+import threading
+import time
 from pathlib import Path
 from tqdm import tqdm
+from pattern_store import PatternStore, default_store_path, is_pattern_store, stored_sources, merge_stores
+from stacked_renderer import render_stacked, render_waterfall, patterns_from_store, patterns_from_files
+from pattern_writers import write_columns, row_format, gsas_esd
+from integration_pipeline import PipelinedExecutor
+from progress_channel import ProgressReporter
+from sector_engine_cache import SectorEngineCache, mask_digest
+from h5_layout import resolve_layout
+from file_index import FileIndexer, find_files
+from frame_correction import FrameCorrector
+from auto_mask import AutoMasker, DUMMY_KWARGS
+from mask_io import load_mask
+from run_manifest import RunManifest, settings_digest
+from stage_timer import StageTimer, TraceWriter
+from pattern_index import PatternIndex, read_pattern_index, lookup, acquisition_time
 from datetime import datetime
-# Fix Tcl_AsyncDelete threading error: Set non-interactive backend
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend to avoid Tkinter thread conflicts
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
+
+
+# Size limit of the integration cache (see IntegrationCache.prune)
+DEFAULT_CACHE_MAX_GB = 2.0
+
+
+def _pyplot():
+    """
+    Import pyplot on first use with the non-interactive Agg backend
+
+    Headless runs without previews or stacked plots never import matplotlib,
+    which keeps start-up fast on compute nodes.
+    """
+    import matplotlib
+    # Fix Tcl_AsyncDelete threading error: Set non-interactive backend
+    matplotlib.use('Agg')  # Use non-interactive backend to avoid Tkinter thread conflicts
+    import matplotlib.pyplot as plt
+    return plt
 
 
 class BatchIntegrator:
     """Batch integration processor"""
     
-    def __init__(self, poni_file, mask_file=None):
+    def __init__(self, poni_file, mask_file=None, verbose=True, max_engines=16):
         """
         Initialize the integrator
         
         Args:
             poni_file (str): Path to calibration file (.poni)
             mask_file (str, optional): Path to mask file
+            verbose (bool): Print calibration/mask summary (disabled in worker processes)
         """
+        # Keep the source paths so worker processes can rebuild the integrator
+        self.poni_file = poni_file
+        self.mask_file = mask_file
+        self.verbose = verbose
+
         self.ai = pyFAI.load(poni_file)
-        print(f"✓ Successfully loaded calibration file: {poni_file}")
-        print(f"  Detector: {self.ai.detector}")
-        print(f"  Wavelength: {self.ai.wavelength*1e10:.4f} Å")
-        print(f"  Sample-detector distance: {self.ai.dist*1000:.2f} mm")
+        if verbose:
+            print(f"✓ Successfully loaded calibration file: {poni_file}")
+            print(f"  Detector: {self.ai.detector}")
+            print(f"  Wavelength: {self.ai.wavelength*1e10:.4f} Å")
+            print(f"  Sample-detector distance: {self.ai.dist*1000:.2f} mm")
         
         self.mask = None
         if mask_file and os.path.exists(mask_file):
             self.mask = self._load_mask(mask_file)
-            print(f"✓ Successfully loaded mask file: {mask_file}")
-            print(f"  Mask shape: {self.mask.shape}")
-            print(f"  Masked pixels: {np.sum(self.mask)}")
-        elif mask_file:
+            if verbose:
+                print(f"✓ Successfully loaded mask file: {mask_file}")
+                print(f"  Mask shape: {self.mask.shape}")
+                print(f"  Masked pixels: {np.sum(self.mask)}")
+        elif mask_file and verbose:
             print(f"⚠ Warning: Mask file not found: {mask_file}")
+
+        # Fingerprints of geometry and mask, used as part of the integration cache key
+        with open(poni_file, 'rb') as f:
+            self.poni_digest = hashlib.sha1(f.read()).hexdigest()
+        self.mask_digest = mask_digest(self.mask)
+
+        # Integration engines per sector definition, reused across the file series
+        self.engine_cache = SectorEngineCache(self.ai, max_engines)
+
+        # Optional on-disk result cache (see IntegrationCache)
+        self.cache = None
+        # Consolidated HDF5 store receiving patterns of the 'h5' format (see PatternStore)
+        self.pattern_store = None
+        # svg/png previews: one reusable figure (or a render pool), see configure_previews
+        self.preview_options = {'mode': 'full', 'dpi': None}
+        self.preview_pool = None
+        self._preview_renderer = None
+        # The shared figure and pool backlog are not thread-safe; serializes the
+        # writer threads of the pipelined executor (see _render_preview)
+        self._preview_lock = threading.Lock()
+        # Optional dark/flat/background correction applied before integrate1d
+        self.corrector = None
+        # Optional per-frame statistical mask (spots, hot/dead pixels), see AutoMasker
+        self.auto_masker = None
+        # Completed files of the output directory, for resuming interrupted runs (see RunManifest)
+        self.manifest = None
+        # Per-stage time and bytes (open, read, integrate1d, save_<fmt>, ...), see StageTimer
+        self.timer = StageTimer()
+        # Patterns of the current run kept for its stacked plot (None = not collected)
+        self.plot_patterns = None
+        # Sidecar metadata index of the output directory (pressure, frames, azimuth, ...)
+        self.pattern_index = None
+        # Acquisition time of each source file, taken while its frames are read
+        self.acquisition_times = {}
     
     def _load_mask(self, mask_file):
-        """Load mask file"""
-        ext = os.path.splitext(mask_file)[1].lower()
-        
-        if ext == '.npy':
-            mask = np.load(mask_file)
-        elif ext in ['.edf', '.tif', '.tiff', '.png']:
-            mask = fabio.open(mask_file).data
-        else:
-            raise ValueError(f"Unsupported mask file format: {ext}")
-        
-        if mask.dtype != bool:
-            mask = mask.astype(bool)
-        
-        return mask
+        """Load mask file (.npz compact, .npy, .edf, .tif, .png) through the mask cache"""
+        return load_mask(mask_file)
     
     def _read_h5_image(self, h5_file, dataset_path=None, frame_index=0):
         """
@@ -92,6 +163,7 @@ class BatchIntegrator:
         Returns:
             numpy.ndarray: Image data
         """
+        start = time.perf_counter()
         with h5py.File(h5_file, 'r') as f:
             if dataset_path is None:
                 dataset_path = self._find_image_dataset(f)
@@ -100,52 +172,85 @@ class BatchIntegrator:
                 raise ValueError(f"Dataset not found in HDF5 file: {dataset_path}")
             
             data = f[dataset_path]
+            self.acquisition_times[h5_file] = acquisition_time(h5_file, f)
+            self.timer.add('open', time.perf_counter() - start)
             
+            start = time.perf_counter()
             if len(data.shape) == 3:
                 if frame_index >= data.shape[0]:
                     raise ValueError(f"Frame index {frame_index} out of bounds (total frames: {data.shape[0]})")
                 img_data = data[frame_index]
             else:
                 img_data = data[()]
+            self.timer.add('read', time.perf_counter() - start, img_data.nbytes)
         
         return img_data
+
+    def _iter_h5_frames(self, h5_file, dataset_path=None, frames=None, chunk_size=16):
+        """
+        Stream frames of an HDF5 image stack without loading the whole stack
+
+        Frames are read through h5py in slabs of at most chunk_size selected
+        frames, so memory use stays bounded for stacks of any length.
+
+        Args:
+            h5_file (str): Path to HDF5 file
+            dataset_path (str, optional): Dataset path within HDF5
+            frames (slice, optional): Frame selection (start, stop, step); None = all frames
+            chunk_size (int): Number of selected frames read per h5py call
+
+        Yields:
+            tuple: (frame_index, image) for every selected frame
+        """
+        start = time.perf_counter()
+        with h5py.File(h5_file, 'r') as f:
+            if dataset_path is None:
+                dataset_path = self._find_image_dataset(f)
+
+            if dataset_path not in f:
+                raise ValueError(f"Dataset not found in HDF5 file: {dataset_path}")
+
+            data = f[dataset_path]
+            self.acquisition_times[h5_file] = acquisition_time(h5_file, f)
+            self.timer.add('open', time.perf_counter() - start)
+
+            if len(data.shape) != 3:
+                start = time.perf_counter()
+                img_data = data[()]
+                self.timer.add('read', time.perf_counter() - start, img_data.nbytes)
+                yield 0, img_data
+                return
+
+            if frames is None:
+                frames = slice(None)
+            start, stop, step = frames.indices(data.shape[0])
+            if step < 1:
+                raise ValueError(f"Frame step must be positive, got {step}")
+            if not range(start, stop, step):
+                raise ValueError(f"Frame selection {frames.start}:{frames.stop}:{frames.step} "
+                                 f"matches no frame of {h5_file} ({data.shape[0]} frames)")
+
+            span = chunk_size * step
+            for chunk_start in range(start, stop, span):
+                chunk_stop = min(chunk_start + span, stop)
+                read_start = time.perf_counter()
+                block = data[chunk_start:chunk_stop:step]
+                self.timer.add('read', time.perf_counter() - read_start, block.nbytes)
+                for offset, img_data in enumerate(block):
+                    yield chunk_start + offset * step, img_data
     
     def _find_image_dataset(self, h5_file_obj):
-        """Automatically find image dataset path in HDF5"""
-        common_paths = [
-            '/entry/data/data',
-            '/entry/instrument/detector/data',
-            '/entry/data/image',
-            '/data/data',
-            '/data',
-            '/image',
-            'data',
-        ]
-        
-        for path in common_paths:
-            if path in h5_file_obj:
-                return path
-        
-        def find_dataset(obj, path=''):
-            if isinstance(obj, h5py.Dataset):
-                if len(obj.shape) >= 2:
-                    return path
-            elif isinstance(obj, h5py.Group):
-                for key in obj.keys():
-                    result = find_dataset(obj[key], path + '/' + key)
-                    if result:
-                        return result
-            return None
-        
-        result = find_dataset(h5_file_obj)
-        if result:
-            print(f"  Automatically found dataset: {result}")
-            return result
-        else:
-            raise ValueError("No suitable image dataset found in HDF5 file")
+        """
+        Automatically find image dataset path in HDF5
+
+        The layout of the first file of a directory is cached (see h5_layout),
+        later files of the series only get a cheap validation of that path.
+        """
+        return resolve_layout(h5_file_obj).path
     
     def integrate_single(self, h5_file, output_base, npt=2000, unit="2th_deg",
-                        dataset_path=None, frame_index=0, formats=['xy'], bins=None, **kwargs):
+                        dataset_path=None, frame_index=0, formats=['xy'], bins=None,
+                        frames=None, frame_output='separate', **kwargs):
         """
         Integrate a single HDF5 file and save in multiple formats
 
@@ -155,218 +260,647 @@ class BatchIntegrator:
             npt (int): Number of points for integration
             unit (str): Output unit
             dataset_path (str, optional): Dataset path
-            frame_index (int): Frame index (for multi-frame)
-            formats (list): List of output formats ['xy', 'dat', 'chi', 'fxye']
+            frame_index (int): Frame index (for multi-frame, used when frames is None)
+            formats (list): List of output formats ['xy', 'dat', 'chi', 'fxye', 'svg', 'png', 'h5'];
+                            'h5' appends to self.pattern_store when one is open
             bins (list, optional): List of bin configs [{'name': str, 'start': float, 'end': float}, ...]
+            frames (slice, optional): Frame selection of a 3-D stack, see parse_frame_range
+            frame_output (str): 'separate' writes <basename>_f{frame:05d} per frame,
+                                'stacked' writes one <basename>_frames.txt table
             **kwargs: Additional arguments to integrate1d
         """
-        try:
-            img_data = self._read_h5_image(h5_file, dataset_path, frame_index)
-
-            # If bins are provided, integrate each bin separately
-            if bins:
-                import math
-                for bin_data in bins:
-                    # Convert degrees to radians
-                    azim_start_rad = math.radians(bin_data['start'])
-                    azim_end_rad = math.radians(bin_data['end'])
-                    
-                    # Create kwargs for this bin
-                    bin_kwargs = kwargs.copy()
-                    bin_kwargs['azimuth_range'] = (azim_start_rad, azim_end_rad)
-                    
-                    # Perform integration for this bin
-                    result = self.ai.integrate1d(
-                        img_data,
-                        npt=npt,
-                        mask=self.mask,
-                        unit=unit,
-                        **bin_kwargs
-                    )
-                    
-                    # Save with bin name in filename
-                    bin_output_base = f"{output_base}_{bin_data['name']}"
-                    
-                    # Save in multiple formats
-                    for fmt in formats:
-                        output_file = f"{bin_output_base}.{fmt}"
-                        
-                        if fmt == 'xy':
-                            self._save_xy(result, output_file)
-                        elif fmt == 'dat':
-                            self._save_dat(result, output_file)
-                        elif fmt == 'chi':
-                            self._save_chi(result, output_file)
-                        elif fmt == 'fxye':
-                            self._save_fxye(result, output_file)
-                        elif fmt == 'svg':
-                            self._save_svg(result, output_file)
-                        elif fmt == 'png':
-                            self._save_png(result, output_file)
+        success, error_msg, _, records, timings = self._process_file(
+            h5_file, output_base, npt, unit, dataset_path, frame_index, formats, bins,
+            frames, frame_output, **kwargs
+        )
+        self.timer.merge(timings)
+        if success and self.pattern_index is not None:
+            self.pattern_index.record(self._index_rows(h5_file, dict(kwargs, bins=bins), records))
+        return success, error_msg
+
+    def _process_file(self, h5_file, output_base, npt=2000, unit="2th_deg", dataset_path=None,
+                      frame_index=0, formats=['xy'], bins=None, frames=None, frame_output='separate',
+                      return_patterns=False, **kwargs):
+        """
+        Integrate one file, write its outputs and update the cache
+
+        Args:
+            return_patterns (bool): Also return the integrated patterns (used by pool
+                                    workers so the parent can fill the pattern store)
+            Other arguments are the same as for integrate_single
+
+        Returns:
+            tuple: (success, error_msg, patterns or None, output records or None, stage timings),
+                   see _output_records for the records and StageTimer.pop_file for the timings
+        """
+        with self.timer.file(h5_file):
+            try:
+                patterns = self._integrate_file(
+                    h5_file, npt, unit, dataset_path, frame_index, bins, frames, frame_output, **kwargs
+                )
+                records = self._finish_file(h5_file, output_base, patterns, npt, unit, dataset_path,
+                                            frame_index, formats, bins, frames, frame_output, **kwargs)
+                if 'h5' in formats and self.pattern_store is not None:
+                    self._store_patterns(patterns, h5_file, output_base)
+                if self.plot_patterns is not None:
+                    self._collect_plot_patterns(patterns, h5_file, output_base)
+            except Exception as e:
+                self.acquisition_times.pop(h5_file, None)
+                return False, str(e), None, None, self.timer.pop_file(h5_file)
+
+        timings = self.timer.pop_file(h5_file)
+        if not return_patterns:
+            return True, None, None, records, timings
+        # Plain arrays: pyFAI result objects do not pickle across processes
+        return True, None, [(name_suffix, frame, sector, (np.asarray(result[0]), np.asarray(result[1])))
+                            for name_suffix, frame, sector, result in patterns], records, timings
+
+    def _finish_file(self, h5_file, output_base, patterns, npt=2000, unit="2th_deg", dataset_path=None,
+                     frame_index=0, formats=['xy'], bins=None, frames=None, frame_output='separate',
+                     return_patterns=False, **kwargs):
+        """
+        Write the per-file outputs of integrated patterns and store them in the cache
+
+        Returns:
+            list: Output records of the file for the resume manifest, see _output_records,
+                  with the 'acquisition_time' read when the file was opened
+        """
+        stacked = self._is_stacked(frames, frame_output)
+        self._write_patterns(patterns, output_base, formats, stacked=stacked)
+
+        if self.cache is not None:
+            settings = self._cache_settings(npt, unit, dataset_path, frame_index, bins,
+                                            frames, frame_output, kwargs)
+            self.cache.store(self.cache.make_key(h5_file, settings), patterns)
+        records = self._output_records(patterns, output_base, formats, stacked)
+        # Travels with the records (also back from pool workers) to the pattern index
+        acquired = self.acquisition_times.pop(h5_file, None)
+        for record in records:
+            record['acquisition_time'] = acquired
+        return records
+
+    def _output_records(self, patterns, output_base, formats, stacked=False):
+        """
+        Describe the outputs written for the patterns of one file (see RunManifest.record)
+
+        Returns:
+            list: [{'name': str, 'frames': [int], 'sector': str or None, 'outputs': [path, ...]}, ...]
+        """
+        records = {}
+        for name_suffix, frame, sector, _ in patterns:
+            record = records.setdefault(name_suffix, {
+                'name': os.path.basename(output_base + name_suffix), 'frames': [], 'sector': sector,
+                'outputs': [path for _, path in self._pattern_outputs([(name_suffix,)], output_base,
+                                                                       formats, stacked)]})
+            record['frames'].append(int(frame))
+        return list(records.values())
+
+    def _index_rows(self, h5_file, options, records):
+        """
+        Rows of the pattern index for the outputs of one source file
+
+        The source file name is parsed once here; downstream steps read the
+        pressure and azimuth range from the index. The acquisition time comes
+        with the records; only files served from the cache are opened for it.
+        """
+        pressure, is_unload = self._extract_pressure(h5_file)
+        acquired = records[0].get('acquisition_time') if records else None
+        if acquired is None:
+            acquired = acquisition_time(h5_file)
+        bin_ranges = {b['name']: (b['start'], b['end']) for b in options.get('bins') or []}
+        # Sector runs pass pyFAI the azimuth range in radians; the index is in degrees like the bins
+        azimuth = options.get('azimuth_range')
+        azimuth = tuple(float(np.degrees(angle)) for angle in azimuth) if azimuth else (None, None)
+        return [{
+            'name': record['name'],
+            'source_file': os.path.abspath(h5_file),
+            'frames': record['frames'],
+            'pressure': pressure,
+            'is_unload': is_unload,
+            'sector': record['sector'],
+            'azimuth_start': bin_ranges.get(record['sector'], azimuth)[0],
+            'azimuth_end': bin_ranges.get(record['sector'], azimuth)[1],
+            'acquisition_time': acquired,
+        } for record in records]
+
+    def _store_patterns(self, patterns, h5_file, output_base):
+        """Append the patterns of one source file to the consolidated HDF5 store"""
+        with self.timer.stage('save_h5'):
+            self._append_to_store(patterns, h5_file, output_base)
+
+    def _append_to_store(self, patterns, h5_file, output_base):
+        pressure, is_unload = self._extract_pressure(h5_file)
+        name_base = os.path.basename(output_base)
+        for name_suffix, frame, sector, result in patterns:
+            self.pattern_store.append(
+                result[0], result[1],
+                name=name_base + name_suffix,
+                source_file=os.path.abspath(h5_file),
+                frame=frame,
+                sector=sector or '',
+                pressure=pressure,
+                is_unload=is_unload
+            )
+
+    def _is_stacked(self, frames, frame_output):
+        """Whether all frames of a file go into one stacked table"""
+        return frames is not None and frame_output == 'stacked'
+
+    def _integrate_file(self, h5_file, npt, unit, dataset_path=None, frame_index=0, bins=None,
+                        frames=None, frame_output='separate', **kwargs):
+        """
+        Integrate every selected frame (and bin) of one file without writing anything
+
+        Returns:
+            list: [(name_suffix, frame, sector, result), ...] where output_base + name_suffix
+                  is the output base path of the pattern and sector the bin name (or None)
+        """
+        patterns = []
+        for frame, img_data in self._read_frames(h5_file, dataset_path, frame_index, frames):
+            patterns.extend(self._integrate_frame(frame, img_data, npt, unit, bins, frames,
+                                                  frame_output, **kwargs))
+        return patterns
+
+    def _read_frames(self, h5_file, dataset_path=None, frame_index=0, frames=None):
+        """Yield (frame, image) for the selected frames of one file"""
+        if frames is None:
+            yield frame_index, self._read_h5_image(h5_file, dataset_path, frame_index)
+        else:
+            yield from self._iter_h5_frames(h5_file, dataset_path, frames)
+
+    def _integrate_frame(self, frame, img_data, npt, unit, bins=None, frames=None,
+                         frame_output='separate', **kwargs):
+        """
+        Integrate one frame (every bin of it)
+
+        Returns:
+            list: [(name_suffix, frame, sector, result), ...] as in _integrate_file
+        """
+        if self.corrector is not None:
+            with self.timer.stage('correct'):
+                img_data = self.corrector.apply(img_data)
+        if self.auto_masker is not None:
+            # Dummy pixels instead of a per-frame mask keep the cached engines valid
+            with self.timer.stage('auto_mask'):
+                img_data = self.auto_masker.apply(img_data, self.mask)
+            kwargs = dict(kwargs, **DUMMY_KWARGS)
+
+        frame_suffix = ''
+        if frames is not None and frame_output != 'stacked':
+            frame_suffix = f"_f{frame:05d}"
+
+        # Every sector is integrated from the frame already in memory
+        patterns = []
+        for bin_name, result in self._integrate_image(img_data, npt, unit, bins, **kwargs):
+            name_suffix = f"{frame_suffix}_{bin_name}" if bin_name else frame_suffix
+            patterns.append((name_suffix, frame, bin_name, result))
+        return patterns
+
+    def _pattern_outputs(self, patterns, output_base, formats, stacked=False):
+        """List (pattern_base, output file) pairs that _write_patterns will produce"""
+        # 'h5' goes to the shared pattern store, not to a per-pattern file
+        file_formats = [fmt for fmt in formats if fmt != 'h5']
+        outputs = []
+        for name_suffix in dict.fromkeys(pattern[0] for pattern in patterns):
+            pattern_base = output_base + name_suffix
+            if stacked:
+                outputs.append((pattern_base, f"{pattern_base}_frames.txt"))
             else:
-                # Single integration (no binning)
-                result = self.ai.integrate1d(
+                outputs.extend((pattern_base, f"{pattern_base}.{fmt}") for fmt in file_formats)
+        return outputs
+
+    def _write_patterns(self, patterns, output_base, formats, stacked=False, only_missing=False):
+        """
+        Write integrated patterns to disk
+
+        Args:
+            patterns (list): [(name_suffix, frame, sector, result), ...] from _integrate_file
+            output_base (str): Output base path of the source file
+            formats (list): Output formats
+            stacked (bool): Write one <pattern_base>_frames.txt table per pattern
+            only_missing (bool): Skip outputs that already exist
+        """
+        if stacked:
+            stacks = {}
+            for name_suffix, frame, _, result in patterns:
+                stacks.setdefault(output_base + name_suffix, []).append((frame, result))
+            for pattern_base, frame_results in stacks.items():
+                filename = f"{pattern_base}_frames.txt"
+                if not (only_missing and os.path.exists(filename)):
+                    self._save_frame_stack(frame_results, filename)
+            return
+
+        for name_suffix, _, _, result in patterns:
+            pattern_base = output_base + name_suffix
+            pattern_formats = formats
+            if only_missing:
+                pattern_formats = [fmt for fmt in formats if not os.path.exists(f"{pattern_base}.{fmt}")]
+            self._save_outputs(result, pattern_base, pattern_formats)
+
+    def _cache_settings(self, npt, unit, dataset_path, frame_index, bins, frames, frame_output, kwargs):
+        """Everything besides the source file that determines the integrated patterns"""
+        settings = {
+            'poni': self.poni_digest,
+            'mask': self.mask_digest,
+            'npt': npt,
+            'unit': unit,
+            'dataset_path': dataset_path,
+            'frame_index': frame_index,
+            'frames': None if frames is None else [frames.start, frames.stop, frames.step],
+            'frame_output': frame_output,
+            'bins': bins,
+            'integration': kwargs,
+        }
+        if self.corrector is not None:
+            settings['correction'] = self.corrector.digest
+        if self.auto_masker is not None:
+            settings['auto_mask'] = self.auto_masker.digest
+        return settings
+
+    def _restore_from_cache(self, h5_file, output_base, options):
+        """
+        Satisfy one integration task from the cache
+
+        Outputs that are missing (e.g. a newly requested format) are rewritten
+        from the cached patterns, without touching the source file.
+
+        Returns:
+            bool: True on a cache hit
+        """
+        formats = options.get('formats', ['xy'])
+        patterns = self.cache.load(self.cache.make_key(h5_file, self._task_settings(options)))
+        if patterns is None:
+            return False
+
+        stacked = self._is_stacked(options.get('frames'), options.get('frame_output', 'separate'))
+        outputs = self._pattern_outputs(patterns, output_base, formats, stacked)
+        if not all(os.path.exists(path) for _, path in outputs):
+            self._write_patterns(patterns, output_base, formats, stacked, only_missing=True)
+        if 'h5' in formats and self.pattern_store is not None:
+            self._store_patterns(patterns, h5_file, output_base)
+        if self.plot_patterns is not None:
+            self._collect_plot_patterns(patterns, h5_file, output_base)
+        records = self._output_records(patterns, output_base, formats, stacked)
+        if self.manifest is not None:
+            self._record_complete(h5_file, options, records)
+        if self.pattern_index is not None:
+            self.pattern_index.record(self._index_rows(h5_file, options, records))
+        return True
+
+    def _task_settings(self, options):
+        """_cache_settings of the options of one integration task"""
+        options = dict(options)
+        options.pop('formats', None)
+        return self._cache_settings(
+            options.pop('npt', 2000), options.pop('unit', '2th_deg'), options.pop('dataset_path', None),
+            options.pop('frame_index', 0), options.pop('bins', None), options.get('frames'),
+            options.get('frame_output', 'separate'),
+            {k: v for k, v in options.items() if k not in ('frames', 'frame_output', 'return_patterns')}
+        )
+
+    def _manifest_settings(self, options):
+        """Settings fingerprint of a task for the resume manifest (output formats included)"""
+        return settings_digest(dict(self._task_settings(options),
+                                    formats=sorted(options.get('formats', ['xy']))))
+
+    def _record_complete(self, h5_file, options, records):
+        """Record a finished file in the manifest once its store patterns are on disk too"""
+        in_store = 'h5' in options.get('formats', ['xy']) and self.pattern_store is not None
+        if in_store:
+            # The store buffers chunk_rows patterns; a preempted run must not
+            # leave files recorded whose patterns never reached patterns.h5
+            self.pattern_store.flush()
+        self.manifest.record(h5_file, self._manifest_settings(options), records, in_store)
+
+    def _previous_store(self, store_path):
+        """
+        Move the pattern store of an earlier run aside for a resumed run
+
+        A resume that died leaves both the store it carried over (.previous)
+        and the partial store of the files it completed itself; the partial
+        store is merged into .previous so neither set of patterns is lost.
+
+        Returns:
+            str or None: Store holding the patterns of earlier runs
+        """
+        previous_store = store_path + '.previous'
+        if os.path.exists(store_path) and os.path.exists(previous_store):
+            merge_stores([previous_store, store_path], previous_store)
+            os.remove(store_path)
+        elif os.path.exists(store_path):
+            os.replace(store_path, previous_store)
+        return previous_store if os.path.exists(previous_store) else None
+
+    def _integrate_image(self, img_data, npt, unit, bins=None, **kwargs):
+        """
+        Integrate one image, either fully or per azimuthal bin
+
+        Returns:
+            list: [(name_suffix, result), ...]; name_suffix is None without bins
+        """
+        if bins:
+            sectors = self._bins_to_sectors(bins)
+            results = self.integrate_sectors(img_data, sectors, npt=npt, unit=unit, **kwargs)
+            return [(sector['name'], result) for sector, result in zip(sectors, results)]
+
+        # Single integration (no binning)
+        with self.timer.stage('integrate1d'):
+            result = self.engine_cache.integrate1d(
+                img_data,
+                npt=npt,
+                mask=self.mask,
+                mask_digest=self.mask_digest,
+                unit=unit,
+                **kwargs
+            )
+        return [(None, result)]
+
+    def _bins_to_sectors(self, bins):
+        """
+        Convert GUI bin configs into sector definitions for integrate_sectors
+
+        Args:
+            bins (list): [{'name': str, 'start': float, 'end': float}, ...] (degrees)
+
+        Returns:
+            list: [{'name': str, 'azimuth_range': (start, end)}, ...] (radians)
+        """
+        import math
+        return [
+            {
+                'name': bin_data['name'],
+                'azimuth_range': (math.radians(bin_data['start']), math.radians(bin_data['end'])),
+            }
+            for bin_data in bins
+        ]
+
+    def integrate_sectors(self, img_data, sectors, npt=2000, unit="2th_deg", **kwargs):
+        """
+        Integrate several azimuthal sectors of an image that is already in memory
+
+        The detector frame is read once by the caller and all sectors are
+        produced from it in one pass. The integration engine of every sector
+        comes from self.engine_cache, so its sparse matrix is built once and
+        reused across the file series.
+
+        Args:
+            img_data (numpy.ndarray): Detector image
+            sectors (list): [{'name': str, 'azimuth_range': (min, max),
+                              'radial_range': (min, max) (optional)}, ...]
+            npt (int): Number of points for integration
+            unit (str): Output unit
+            **kwargs: Additional arguments to integrate1d
+
+        Returns:
+            list: Integration results, one per sector and in the same order
+        """
+        results = []
+        for sector in sectors:
+            sector_kwargs = kwargs.copy()
+            sector_kwargs['azimuth_range'] = sector['azimuth_range']
+            if sector.get('radial_range'):
+                sector_kwargs['radial_range'] = sector['radial_range']
+
+            with self.timer.stage('integrate1d'):
+                results.append(self.engine_cache.integrate1d(
                     img_data,
                     npt=npt,
                     mask=self.mask,
+                    mask_digest=self.mask_digest,
                     unit=unit,
-                    **kwargs
-                )
-                
-                # Save in multiple formats
-                for fmt in formats:
-                    output_file = f"{output_base}.{fmt}"
-                    
-                    if fmt == 'xy':
-                        self._save_xy(result, output_file)
-                    elif fmt == 'dat':
-                        self._save_dat(result, output_file)
-                    elif fmt == 'chi':
-                        self._save_chi(result, output_file)
-                    elif fmt == 'fxye':
-                        self._save_fxye(result, output_file)
-                    elif fmt == 'svg':
-                        self._save_svg(result, output_file)
-                    elif fmt == 'png':
-                        self._save_png(result, output_file)
-
-            return True, None
-
-        except Exception as e:
-            return False, str(e)
+                    **sector_kwargs
+                ))
+        return results
+
+    def _save_outputs(self, result, output_base, formats):
+        """Save one integration result in every requested format"""
+        for fmt in formats:
+            output_file = f"{output_base}.{fmt}"
+            start = time.perf_counter()
+
+            if fmt == 'xy':
+                self._save_xy(result, output_file)
+            elif fmt == 'dat':
+                self._save_dat(result, output_file)
+            elif fmt == 'chi':
+                self._save_chi(result, output_file)
+            elif fmt == 'fxye':
+                self._save_fxye(result, output_file)
+            elif fmt == 'svg':
+                self._save_svg(result, output_file)
+            elif fmt == 'png':
+                self._save_png(result, output_file)
+            else:
+                continue  # 'h5' goes to the pattern store
+            self.timer.add(f"save_{fmt}", time.perf_counter() - start, self._output_size(output_file))
+
+    def _output_size(self, filename):
+        """Size of a written output (0 while a pooled preview is still rendering)"""
+        try:
+            return os.path.getsize(filename)
+        except OSError:
+            return 0
 
     def _save_xy(self, result, filename):
         """Save result in .xy format"""
-        np.savetxt(filename, np.column_stack(result), fmt='%.6f')
+        write_columns(filename, tuple(result), row_format('%.6f', len(result)))
 
     def _save_dat(self, result, filename):
         """Save result in .dat format (same as .xy)"""
-        np.savetxt(filename, np.column_stack(result), fmt='%.6f')
+        write_columns(filename, tuple(result), row_format('%.6f', len(result)))
 
     def _save_chi(self, result, filename):
         """Save result in .chi format (GSAS-II compatible)"""
-        with open(filename, 'w') as f:
-            f.write(f"# Chi file generated by pyFAI\n")
-            f.write(f"# 2theta (deg) Intensity\n")
-            for x, y in zip(result[0], result[1]):
-                f.write(f"{x:12.6f} {y:16.6f}\n")
+        header = ("# Chi file generated by pyFAI\n"
+                  "# 2theta (deg) Intensity\n")
+        write_columns(filename, result[:2], "%12.6f %16.6f\n", header=header)
 
     def _save_fxye(self, result, filename):
         """Save result in .fxye format (GSAS compatible)"""
-        with open(filename, 'w') as f:
-            f.write("TITLE pyFAI integration\n")
-            f.write(f"BANK 1 {len(result[0])} 1 CONS {result[0][0]:.6f} {(result[0][1]-result[0][0]):.6f} 0 0 FXYE\n")
-            for x, y in zip(result[0], result[1]):
-                esd = np.sqrt(y) if y > 0 else 1.0
-                f.write(f"{x:15.6f} {y:15.6f} {esd:15.6f}\n")
+        header = ("TITLE pyFAI integration\n"
+                  f"BANK 1 {len(result[0])} 1 CONS {result[0][0]:.6f} {(result[0][1]-result[0][0]):.6f} 0 0 FXYE\n")
+        write_columns(filename, (result[0], result[1], gsas_esd(result[1])), "%15.6f %15.6f %15.6f\n",
+                      header=header)
 
     def _save_svg(self, result, filename):
         """Save result as SVG plot"""
-        plt.figure(figsize=(10, 6))
-        plt.plot(result[0], result[1], 'b-', linewidth=1)
-        plt.xlabel('2θ (deg)' if '2th' in str(result) else 'Q (Å⁻¹)')
-        plt.ylabel('Intensity')
-        plt.title('Integrated Diffraction Pattern')
-        plt.grid(True, alpha=0.3)
-        plt.savefig(filename, format='svg')
-        plt.close()
+        self._render_preview(result, filename, 'svg')
 
     def _save_png(self, result, filename):
         """Save result as PNG plot"""
-        plt.figure(figsize=(10, 6))
-        plt.plot(result[0], result[1], 'b-', linewidth=1)
-        plt.xlabel('2θ (deg)' if '2th' in str(result) else 'Q (Å⁻¹)')
-        plt.ylabel('Intensity')
-        plt.title('Integrated Diffraction Pattern')
-        plt.grid(True, alpha=0.3)
-        plt.savefig(filename, format='png', dpi=300)
-        plt.close()
+        self._render_preview(result, filename, 'png')
+
+    def configure_previews(self, mode='full', dpi=None, workers=0):
+        """
+        Configure svg/png preview rendering
+
+        Args:
+            mode (str): 'full' (10x6 in, 300 dpi PNG) or 'thumbnail' (5x3 in, 72 dpi PNG)
+            dpi (int, optional): PNG resolution overriding the mode default
+            workers (int): Render in a pool of this many processes (0 = in-process)
+        """
+        from preview_renderer import PreviewPool, PREVIEW_MODES
+        if mode not in PREVIEW_MODES:
+            raise ValueError(f"Unknown preview mode '{mode}', expected one of {list(PREVIEW_MODES)}")
+        self.preview_options = {'mode': mode, 'dpi': dpi}
+        self._preview_renderer = None
+        if workers > 0:
+            self.preview_pool = PreviewPool(workers, mode, dpi)
+
+    def configure_correction(self, dark=None, flat=None, background=None, background_scale=1.0,
+                             dataset_path=None, cache_dir=None, **options):
+        """
+        Enable dark/flat/background correction of every frame before integration
+
+        The reference stacks are averaged once and cached in cache_dir (see
+        FrameCorrector). Pixels without flat-field signal are added to the mask.
+
+        Args:
+            dark (str, optional): Dark frame (stack) file
+            flat (str, optional): Flat-field frame (stack) file
+            background (str, optional): Background frame (stack) file
+            background_scale (float): Factor applied to the background
+            dataset_path (str, optional): HDF5 dataset path of the reference files
+            cache_dir (str, optional): Directory for the averaged references
+        """
+        self.corrector = FrameCorrector(dark, flat, background, background_scale, dataset_path,
+                                        cache_dir, verbose=self.verbose, **options)
+        bad_pixels = self.corrector.bad_pixels
+        if bad_pixels is not None and bad_pixels.any():
+            self.mask = bad_pixels if self.mask is None else (self.mask | bad_pixels)
+            self.mask_digest = mask_digest(self.mask)
+
+    def configure_auto_mask(self, cache_dir=None, **options):
+        """
+        Enable the statistical auto mask of every frame (after correction)
+
+        Pixels deviating from their radial/azimuthal bin are excluded frame by
+        frame. Hot/dead pixels found in a reference stack are added to the mask
+        once (see AutoMasker).
+
+        Args:
+            cache_dir (str, optional): Directory for the hot/dead pixel mask
+            **options: AutoMasker options (sigma, low_sigma, azimuth_bins, stack_file, ...)
+        """
+        self.auto_masker = AutoMasker(self.ai, cache_dir=cache_dir, mask=self.mask,
+                                      verbose=self.verbose, **options)
+        bad_pixels = self.auto_masker.bad_pixels
+        if bad_pixels is not None and bad_pixels.any():
+            self.mask = bad_pixels if self.mask is None else (self.mask | bad_pixels)
+            self.mask_digest = mask_digest(self.mask)
+
+    def _close_previews(self):
+        """Wait for pooled previews and report failures"""
+        if self.preview_pool is None:
+            return
+        errors = self.preview_pool.close()
+        print(f"  Previews: {self.preview_pool.rendered} rendered in {self.preview_pool.workers} processes")
+        for filename, error in errors[:5]:
+            print(f"  ⚠ Preview failed: {filename}: {error}")
+        self.preview_pool = None
+
+    def _render_preview(self, result, filename, fmt):
+        """
+        Render a png/svg preview with the reusable figure or hand it to the render pool
+
+        Safe to call from several writer threads: creating and drawing the one
+        shared figure (or queueing to the pool) happens under _preview_lock.
+        """
+        xlabel = '2θ (deg)' if '2th' in str(result) else 'Q (Å⁻¹)'
+        with self._preview_lock:
+            if self.preview_pool is not None:
+                self.preview_pool.submit(result[0], result[1], filename, fmt, xlabel)
+                return
+            if self._preview_renderer is None:
+                from preview_renderer import PreviewRenderer
+                self._preview_renderer = PreviewRenderer(**self.preview_options)
+            self._preview_renderer.render(result[0], result[1], filename, fmt, xlabel)
     
+    def _save_frame_stack(self, frame_results, filename):
+        """
+        Save the patterns of all frames of one file as a single table
+
+        Column 1 is the radial axis, followed by one intensity column per frame.
+        """
+        frame_ids = [frame for frame, _ in frame_results]
+        radial = frame_results[0][1][0]
+        intensities = [result[1] for _, result in frame_results]
+        header = "# frames: " + " ".join(str(frame) for frame in frame_ids) + "\n"
+        with self.timer.stage('save_frames'):
+            write_columns(filename, [radial] + intensities, row_format('%.6f', len(intensities) + 1), header=header)
+        self.timer.add_bytes('save_frames', self._output_size(filename))
+
     def batch_integrate(self, input_pattern, output_dir, npt=2000, unit="2th_deg",
                         dataset_path=None, formats=['xy'], create_stacked_plot=False,
-                        stacked_plot_offset='auto', disable_progress_bar=False, bins=None, **kwargs):
+                        stacked_plot_offset='auto', disable_progress_bar=False, bins=None,
+                        workers=1, frames=None, frame_output='separate', use_cache=False,
+                        cache_dir=None, pipeline=False, prefetch=4, writer_threads=2,
+                        preview='full', preview_dpi=None, preview_workers=0, progress=None,
+                        extensions=('.h5',), dark_file=None, flat_file=None, background_file=None,
+                        background_scale=1.0, resume=False, trace_file=None, waterfall_plot=False,
+                        auto_mask=None, index_cache=True, cache_max_gb=DEFAULT_CACHE_MAX_GB, **kwargs):
         """
         Batch integration for multiple HDF5 files
 
         Args:
-            formats (list): Output formats ['xy', 'dat', 'chi', 'svg', 'png', 'fxye']
+            formats (list): Output formats ['xy', 'dat', 'chi', 'svg', 'png', 'fxye', 'h5'];
+                            'h5' collects every pattern in <output_dir>/patterns.h5
             create_stacked_plot (bool): Whether to create stacked plot
             stacked_plot_offset (str or float): Offset for stacked plot ('auto' or float value)
             disable_progress_bar (bool): Disable tqdm progress bar (useful for GUI)
             bins (list, optional): List of bin configs for azimuthal binning
+            workers (int): Number of worker processes (1 = run in this process)
+            frames (slice or str, optional): Frame selection for 3-D stacks, e.g. "::10"
+            frame_output (str): 'separate' (one pattern per frame) or 'stacked'
+            use_cache (bool): Skip files whose results are already in the integration cache
+            cache_dir (str, optional): Cache directory (default: <output_dir>/.integration_cache)
+            cache_max_gb (float, optional): Size limit of the cache; least recently used
+                                            entries beyond it are deleted after the run
+            pipeline (bool): Overlap reading, integration and writing in a single process
+                             (see PipelinedExecutor); ignored when workers > 1
+            prefetch (int): Frames read ahead of the integration in pipeline mode
+            writer_threads (int): Output writer threads in pipeline mode
+            preview (str): svg/png preview mode, 'full' or 'thumbnail'
+            preview_dpi (int, optional): PNG preview resolution overriding the mode default
+            preview_workers (int): Render previews in this many extra processes
+                                   (single worker runs only; 0 = in-process)
+            progress (ProgressReporter, optional): Receives one JSON progress message per
+                                                   file; its cancel command stops the run
+                                                   after the current file
+            extensions (tuple): Input file extensions accepted by the file search
+            dark_file (str, optional): Dark frame (stack) subtracted from every frame
+            flat_file (str, optional): Flat-field frame (stack) every frame is divided by
+            background_file (str, optional): Background frame (stack) subtracted after
+                                             dark/flat correction
+            background_scale (float): Factor applied to the background
+            resume (bool): Skip files recorded as complete in <output_dir>/integration_manifest.jsonl
+                           whose source, settings and outputs are unchanged (see RunManifest);
+                           every completed file is recorded there in any case
+            trace_file (str, optional): CSV file receiving the stage timings of every
+                                        integrated file (see TraceWriter)
+            waterfall_plot (bool): With create_stacked_plot, also render intensity maps
+                                   (waterfall*.png) of the stacked series
+            auto_mask (dict, optional): AutoMasker options; masks spots and hot/dead
+                                        pixels of every frame (see configure_auto_mask)
+            index_cache (bool): Reuse cached directory listings of the input search
+                                (see FileIndexer); False rescans every directory
         """
-        # Enhanced file search with multiple attempts and detailed debugging
-        h5_files = []
-        
+        # Single-pass indexed search (directory listings cached with their mtimes)
         print(f"🔍 Starting file search with input: {input_pattern}")
-        print(f"   Input type: {type(input_pattern)}")
         print(f"   Is directory: {os.path.isdir(input_pattern)}")
         print(f"   Exists: {os.path.exists(input_pattern)}")
-        
-        # Method 1: Try the pattern as-is with recursive search
-        print(f"📂 Method 1: Trying pattern as-is with recursive=True...")
-        h5_files = sorted(glob.glob(input_pattern, recursive=True))
-        # Filter out the directory itself and only keep .h5 files
-        h5_files = [f for f in h5_files if f.endswith('.h5') and os.path.isfile(f)]
-        print(f"   Result: Found {len(h5_files)} files")
+
+        indexer = FileIndexer(use_cache=index_cache)
+        h5_files, search = find_files(input_pattern, extensions, indexer)
+        print(f"   Indexed {indexer.scanned_dirs + indexer.cached_dirs} directories "
+              f"({indexer.cached_dirs} unchanged since the last scan)")
         if h5_files:
-            print(f"   ✓ Success! Sample files: {h5_files[:3]}")
-        
-        # Method 2: If no files and it's a directory path, search for **/*.h5 recursively
-        if not h5_files and os.path.isdir(input_pattern):
-            print(f"📂 Method 2: Directory detected, searching recursively for **/*.h5...")
-            pattern = os.path.join(input_pattern, '**', '*.h5')
-            print(f"   Pattern: {pattern}")
-            h5_files = sorted(glob.glob(pattern, recursive=True))
-            print(f"   Result: Found {len(h5_files)} files")
-            if h5_files:
-                print(f"   ✓ Success! Found {len(h5_files)} .h5 files in directory: {input_pattern}")
-                print(f"   Sample files: {h5_files[:3]}")
-        
-        # Method 3: If pattern contains *.h5 but no **, try recursive search
-        if not h5_files and '*.h5' in input_pattern and '**' not in input_pattern:
-            print(f"📂 Method 3: Converting *.h5 pattern to recursive **/*.h5...")
-            # Extract directory part
-            if input_pattern.endswith('*.h5'):
-                base_dir = input_pattern[:-len('*.h5')].rstrip('/\\')
-                if not base_dir:
-                    base_dir = '.'
-                recursive_pattern = os.path.join(base_dir, '**', '*.h5')
-            else:
-                recursive_pattern = input_pattern.replace('*.h5', '**/*.h5')
-            print(f"   Pattern: {recursive_pattern}")
-            h5_files = sorted(glob.glob(recursive_pattern, recursive=True))
-            print(f"   Result: Found {len(h5_files)} files")
-            if h5_files:
-                print(f"   ✓ Success! Using recursive pattern")
-                print(f"   Sample files: {h5_files[:3]}")
-        
-        # Method 4: Try as directory with recursive **/*.h5
-        if not h5_files:
-            print(f"📂 Method 4: Trying to interpret as directory with recursive search...")
-            # Strip trailing wildcards if any
-            clean_path = input_pattern.rstrip('/*')
-            if os.path.isdir(clean_path):
-                recursive_pattern = os.path.join(clean_path, '**', '*.h5')
-                print(f"   Pattern: {recursive_pattern}")
-                h5_files = sorted(glob.glob(recursive_pattern, recursive=True))
-                print(f"   Result: Found {len(h5_files)} files")
-                if h5_files:
-                    print(f"   ✓ Success! Found files in cleaned directory path")
-                    print(f"   Sample files: {h5_files[:3]}")
-        
-        # Method 5: Try parent directory if path looks like it might be incomplete
-        if not h5_files and os.path.sep in input_pattern:
-            print(f"📂 Method 5: Trying parent directory...")
-            parent_dir = os.path.dirname(input_pattern)
-            if parent_dir and os.path.isdir(parent_dir):
-                recursive_pattern = os.path.join(parent_dir, '**', '*.h5')
-                print(f"   Pattern: {recursive_pattern}")
-                h5_files = sorted(glob.glob(recursive_pattern, recursive=True))
-                print(f"   Result: Found {len(h5_files)} files")
-                if h5_files:
-                    print(f"   ✓ Success! Found files in parent directory: {parent_dir}")
-                    print(f"   Sample files: {h5_files[:3]}")
+            print(f"   ✓ Matched by {search}: {len(h5_files)} files")
+            print(f"   Sample files: {h5_files[:3]}")
+
+        # Never integrate the consolidated pattern store of this run
+        store_path = os.path.abspath(default_store_path(output_dir))
+        h5_files = [f for f in h5_files if os.path.abspath(f) != store_path]
 
         if not h5_files:
             print(f"\n⚠ ERROR: No matching .h5 files found!")
@@ -405,34 +939,195 @@ class BatchIntegrator:
         print(f"Output formats: {', '.join(formats)}")
         if bins:
             print(f"Bin mode: {len(bins)} azimuthal bins configured")
+        frames = parse_frame_range(frames)
+        if frames is not None:
+            print(f"Frame mode: {frames.start or 0}:{'' if frames.stop is None else frames.stop}:{frames.step or 1} ({frame_output} output)")
         print()
 
         os.makedirs(output_dir, exist_ok=True)
 
+        # Averaged once, cached next to the integration cache; also part of its key
+        if dark_file or flat_file or background_file:
+            self.configure_correction(
+                dark_file, flat_file, background_file, background_scale, dataset_path,
+                os.path.join(cache_dir or os.path.join(output_dir, '.integration_cache'), 'references'))
+            print(f"Frame correction: " + ", ".join(
+                label for label, path in (('dark', dark_file), ('flat', flat_file),
+                                          ('background', background_file)) if path))
+
+        # After the correction: its bad pixels are left out of the statistics
+        if auto_mask is not None:
+            self.configure_auto_mask(
+                os.path.join(cache_dir or os.path.join(output_dir, '.integration_cache'), 'references'),
+                **auto_mask)
+            print(f"Auto mask: {self.auto_masker.sigma:g} sigma, "
+                  f"{self.auto_masker.azimuth_bins} azimuthal sectors"
+                  + (f", hot/dead pixels from {self.auto_masker.stack_file}"
+                     if self.auto_masker.stack_file else ""))
+
         success_count = 0
         failed_files = []
 
-        # Use tqdm only if not disabled (disable for GUI to prevent hanging)
-        iterator = h5_files if disable_progress_bar else tqdm(h5_files, desc="Processing")
-        
-        for h5_file in iterator:
+        options = dict(kwargs, npt=npt, unit=unit, dataset_path=dataset_path, formats=formats,
+                       bins=bins, frames=frames, frame_output=frame_output)
+        tasks = []
+        for h5_file in h5_files:
             basename = os.path.splitext(os.path.basename(h5_file))[0]
             output_base = os.path.join(output_dir, basename)
+            tasks.append((h5_file, output_base, options))
+
+        # One consolidated HDF5 store per run instead of one text file per pattern;
+        # a resumed run carries over the patterns of the files it skips (see below)
+        previous_store = None
+        if 'h5' in formats:
+            store_path = default_store_path(output_dir)
+            if resume:
+                previous_store = self._previous_store(store_path)
+            self.pattern_store = PatternStore(store_path, mode='w', unit=unit)
+
+        # Configured before the cache pass, which may re-render missing previews
+        if 'svg' in formats or 'png' in formats:
+            self.configure_previews(preview, preview_dpi, preview_workers if int(workers or 1) <= 1 else 0)
+            print(f"Previews: {preview} mode"
+                  + (f", {preview_workers} render processes" if self.preview_pool is not None else ""))
+
+        # The stacked plot is drawn from the patterns of this run, not re-read from disk
+        self.plot_patterns = [] if create_stacked_plot else None
+
+        progress = progress or ProgressReporter()
+        total = len(tasks)
+        completed = 0
+        run_start = time.perf_counter()
+        progress.start(total)
+        self.timer.reset()
+        trace = TraceWriter(trace_file) if trace_file else None
+
+        # Skip files a previous (interrupted) run completed; partial outputs are redone
+        self.manifest = RunManifest(output_dir)
+        self.pattern_index = PatternIndex(output_dir)
+        if resume:
+            # Files recorded with store patterns are complete only if the carried-over store has them
+            stored = stored_sources(previous_store) if previous_store is not None else None
+            pending = []
+            for task in tasks:
+                if self.manifest.is_complete(task[0], self._manifest_settings(task[2]), stored):
+                    success_count += 1
+                    progress.file(task[0], completed, total, 0.0, 'skipped')
+                    completed += 1
+                else:
+                    pending.append(task)
+            print(f"Resume: {self.manifest.skipped} files already complete, "
+                  f"{self.manifest.redone} incomplete or changed ({self.manifest.path})")
+            if previous_store is not None:
+                pending_files = {os.path.abspath(task[0]) for task in pending}
+                skipped_files = {os.path.abspath(task[0]) for task in tasks} - pending_files
+                copied = self.pattern_store.copy_from(previous_store, skipped_files) if skipped_files else 0
+                self.pattern_store.flush()
+                print(f"  Pattern store: {copied} patterns of skipped files carried over")
+            if len(pending) < len(tasks):
+                # Skipped files are not in memory: plot from the store or text outputs
+                self.plot_patterns = None
+            tasks = pending
+
+        # Serve unchanged files from the cache; only misses and stale entries are integrated
+        if use_cache:
+            self.cache = IntegrationCache(cache_dir or os.path.join(output_dir, '.integration_cache'),
+                                          cache_max_gb)
+            pending = []
+            for task in tasks:
+                start = time.perf_counter()
+                if self._restore_from_cache(*task):
+                    success_count += 1
+                    progress.file(task[0], completed, total, time.perf_counter() - start, 'cached')
+                    completed += 1
+                else:
+                    pending.append(task)
+            print(f"Integration cache: {self.cache.hits} hits, {self.cache.misses} misses "
+                  f"({self.cache.cache_dir})")
+            tasks = pending
+
+        workers = max(1, min(int(workers or 1), len(tasks) or 1))
+        if workers > 1:
+            print(f"Parallel mode: {workers} worker processes")
+
+        executor = None
+        if pipeline and workers > 1:
+            print("⚠ Pipeline mode is only used with a single worker, running the process pool")
+        elif pipeline:
+            executor = PipelinedExecutor(self, prefetch=prefetch, writer_threads=writer_threads)
+            print(f"Pipeline mode: prefetch {executor.prefetch} frames, {executor.writer_threads} writer threads")
 
-            success, error_msg = self.integrate_single(
-                h5_file, output_base, npt, unit, dataset_path, formats=formats, bins=bins, **kwargs
-            )
-
+        # Use tqdm only if not disabled (disable for GUI to prevent hanging)
+        task_results = executor.run(tasks) if executor else self._run_tasks(tasks, workers)
+        results = task_results
+        if not disable_progress_bar:
+            results = tqdm(results, total=len(tasks), desc="Processing")
+
+        # Results arrive in input order, regardless of which worker finished first
+        cancelled = False
+        last_time = time.perf_counter()
+        for (h5_file, output_base, options), (success, error_msg, patterns, records, timings) in zip(tasks, results):
+            if patterns and self.plot_patterns is not None:
+                self._collect_plot_patterns(patterns, h5_file, output_base)
+            if patterns and self.pattern_store is not None:
+                # Workers and pipeline writers hand the store writes back to this process
+                self.timer.merge(timings, h5_file)
+                with self.timer.file(h5_file):
+                    self._store_patterns(patterns, h5_file, output_base)
+                timings = self.timer.pop_file(h5_file)
+            self.timer.merge(timings)
+            if trace is not None:
+                trace.write(h5_file, 'ok' if success else 'failed', timings)
             if success:
+                # Recorded only once every output of the file is on disk
+                self._record_complete(h5_file, options, records)
+                self.pattern_index.record(self._index_rows(h5_file, options, records))
                 success_count += 1
                 print(f"✓ Success: {h5_file} -> {output_base}.[{','.join(formats)}]")
             else:
                 failed_files.append((h5_file, error_msg))
                 print(f"✗ Failed: {h5_file}\n  Error: {error_msg}")
 
-        print(f"\n✓ Batch processing complete!")
+            now = time.perf_counter()
+            progress.file(h5_file, completed, total, now - last_time, 'ok' if success else 'failed', error_msg)
+            completed += 1
+            last_time = now
+
+            if progress.cancelled:
+                cancelled = True
+                print(f"\n⚠ Cancelled: {total - completed} files not processed")
+                break
+        # Shuts the process pool / pipeline threads down when the loop ended early
+        task_results.close()
+
+        print(f"\n✓ Batch processing {'cancelled' if cancelled else 'complete'}!")
         print(f"  Success: {success_count}/{len(h5_files)}")
         print(f"  Failed: {len(failed_files)}/{len(h5_files)}")
+        if use_cache:
+            removed, freed = self.cache.prune()
+            print(f"  Cache: {self.cache.hits} hits, {self.cache.misses} misses"
+                  + (f", {removed} old entries removed ({freed / 1024 ** 2:.0f} MB)" if removed else ""))
+        if self.engine_cache.hits or self.engine_cache.misses:
+            stats = self.engine_cache.stats()
+            print(f"  Engine cache: {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['engines']}/{stats['max_engines']} engines")
+        if executor is not None:
+            executor.report()
+        self._close_previews()
+        if self.pattern_store is not None:
+            print(f"  Pattern store: {self.pattern_store.filename} ({len(self.pattern_store)} patterns)")
+            self.pattern_store.close()
+            self.pattern_store = None
+            # The new store is complete only once closed
+            if previous_store is not None:
+                os.remove(previous_store)
+        self.manifest.close()
+        self.manifest = None
+        self.pattern_index.close()
+        self.pattern_index = None
+        if trace is not None:
+            trace.close()
+            print(f"  Stage trace: {trace_file}")
 
         if failed_files:
             print(f"\n⚠ Failed files preview:")
@@ -441,10 +1136,199 @@ class BatchIntegrator:
             if len(failed_files) > 5:
                 print(f"  ...and {len(failed_files)-5} more failed files not shown")
 
+        progress.done(success_count, len(failed_files), cancelled, time.perf_counter() - run_start)
+
         # Create stacked plot if requested
-        if create_stacked_plot and success_count > 0:
+        if create_stacked_plot and success_count > 0 and not cancelled:
             print(f"\nGenerating stacked plot...")
-            self.create_stacked_plot(output_dir, offset=stacked_plot_offset)
+            with self.timer.stage('plot_stacked'):
+                self.create_stacked_plot(output_dir, offset=stacked_plot_offset, patterns=self.plot_patterns,
+                                         waterfall=waterfall_plot)
+        self.plot_patterns = None
+
+        print()
+        self.timer.report(time.perf_counter() - run_start)
+
+    def _run_tasks(self, tasks, workers):
+        """
+        Yield (success, error_msg, patterns, output records, stage timings) for each task, in task order
+
+        With workers > 1 the tasks are served from the shared queue of a process
+        pool; every worker loads the PONI/mask once in its initializer. Workers
+        cannot share the HDF5 pattern store, so they return their patterns and
+        the caller appends them.
+        """
+        cache_dir = self.cache.cache_dir if self.cache is not None else None
+
+        if workers <= 1:
+            for h5_file, output_base, options in tasks:
+                yield self._process_file(h5_file, output_base, **options)
+            return
+
+        return_patterns = self.pattern_store is not None or self.plot_patterns is not None
+        pool_tasks = [(h5_file, output_base, dict(options, return_patterns=return_patterns))
+                      for h5_file, output_base, options in tasks]
+        with multiprocessing.Pool(processes=workers, initializer=_init_worker,
+                                  initargs=(self.poni_file, self.mask_file, cache_dir,
+                                            self.preview_options,
+                                            self.corrector.options() if self.corrector else None,
+                                            self.auto_masker.options() if self.auto_masker else None)) as pool:
+            # imap keeps input order; chunksize=1 lets idle workers pull the next file
+            for result in pool.imap(_integrate_task, pool_tasks, chunksize=1):
+                yield result
+
+    def _is_file_complete(self, h5_file, dataset_path=None):
+        """Check that a freshly written HDF5 file can be opened and holds an image dataset"""
+        try:
+            with h5py.File(h5_file, 'r') as f:
+                path = dataset_path if dataset_path is not None else self._find_image_dataset(f)
+                return path in f and len(f[path].shape) >= 2
+        except Exception:
+            return False
+
+    def watch_folder(self, watch_dir, output_dir, npt=2000, unit="2th_deg", dataset_path=None,
+                     formats=['xy'], create_stacked_plot=False, stacked_plot_offset='auto',
+                     bins=None, file_pattern='*.h5', poll_interval=0.5, settle_time=1.0,
+                     process_existing=True, stop_event=None, max_attempts=10, use_cache=False,
+                     cache_dir=None, cache_max_gb=DEFAULT_CACHE_MAX_GB, **kwargs):
+        """
+        Watch a directory and integrate every new HDF5 file as soon as it is complete
+
+        The integrator, geometry and mask stay loaded for the whole session, so
+        each new file only costs one read + integration. A file is considered
+        complete once its size has been stable for settle_time seconds and it
+        can be opened as a valid HDF5 image file. The stacked plot is refreshed
+        from patterns kept in memory, so only the new files are added per refresh.
+
+        Args:
+            watch_dir (str): Directory receiving detector files
+            output_dir (str): Output directory
+            file_pattern (str): Filename pattern of files to integrate
+            poll_interval (float): Seconds between directory scans
+            settle_time (float): Seconds a file size must stay unchanged
+            process_existing (bool): Also integrate files already present at start
+            stop_event (threading.Event, optional): Set to end the session cleanly
+            max_attempts (int): Polls a settled file may fail the HDF5 check before
+                                it is counted as failed and no longer opened
+            use_cache (bool): Restore files already in the integration cache (e.g. when a
+                              session is restarted) instead of integrating them again
+            Other arguments are the same as for batch_integrate
+
+        Returns:
+            int: Number of files integrated in this session
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        stop_event = stop_event or threading.Event()
+
+        processed = set()
+        pending = {}  # path -> (size, time the size was last seen changing)
+        attempts = {}  # path -> failed completeness checks of a settled file
+        processed.add(default_store_path(output_dir))  # never pick up our own pattern store
+
+        if not process_existing:
+            processed.update(
+                entry.path for entry in os.scandir(watch_dir)
+                if entry.is_file() and fnmatch.fnmatch(entry.name, file_pattern)
+            )
+
+        print(f"👀 Watching folder: {watch_dir} ({file_pattern})")
+        print(f"   Output directory: {output_dir}")
+        print(f"   Already present and skipped: {len(processed)} files")
+        print(f"   Stop with Ctrl+C", flush=True)
+
+        if 'h5' in formats:
+            self.pattern_store = PatternStore(default_store_path(output_dir), mode='a', unit=unit)
+        self.pattern_index = PatternIndex(output_dir)
+        self.cache = None
+        if use_cache:
+            self.cache = IntegrationCache(cache_dir or os.path.join(output_dir, '.integration_cache'),
+                                          cache_max_gb)
+        options = dict(kwargs, npt=npt, unit=unit, dataset_path=dataset_path, formats=formats, bins=bins)
+        # Outputs already in output_dir are read once; new files are appended by integrate_single
+        self.plot_patterns = self._load_plot_patterns(output_dir) if create_stacked_plot else None
+
+        success_count = 0
+        failed_count = 0
+        try:
+            while not stop_event.is_set():
+                now = time.monotonic()
+                ready = []
+                for entry in os.scandir(watch_dir):
+                    if entry.path in processed or not entry.is_file():
+                        continue
+                    if not fnmatch.fnmatch(entry.name, file_pattern):
+                        continue
+
+                    size = entry.stat().st_size
+                    last_size, changed_at = pending.get(entry.path, (None, now))
+                    if size != last_size:
+                        pending[entry.path] = (size, now)
+                        attempts.pop(entry.path, None)
+                    elif now - changed_at >= settle_time:
+                        if self._is_file_complete(entry.path, dataset_path):
+                            ready.append(entry.path)
+                            continue
+                        attempts[entry.path] = attempts.get(entry.path, 0) + 1
+                        if attempts[entry.path] >= max_attempts:
+                            # Truncated or corrupt: stop reopening it on every poll
+                            pending.pop(entry.path, None)
+                            attempts.pop(entry.path)
+                            processed.add(entry.path)
+                            failed_count += 1
+                            print(f"✗ Failed: {entry.path}\n  Error: not a readable HDF5 image "
+                                  f"after {max_attempts} checks", flush=True)
+
+                for h5_file in sorted(ready):
+                    pending.pop(h5_file, None)
+                    attempts.pop(h5_file, None)
+                    processed.add(h5_file)
+
+                    basename = os.path.splitext(os.path.basename(h5_file))[0]
+                    output_base = os.path.join(output_dir, basename)
+                    start = time.perf_counter()
+                    if self.cache is not None and self._restore_from_cache(h5_file, output_base, options):
+                        success, error_msg = True, None
+                    else:
+                        success, error_msg = self.integrate_single(
+                            h5_file, output_base, npt, unit, dataset_path, formats=formats, bins=bins, **kwargs
+                        )
+                    elapsed = time.perf_counter() - start
+
+                    if success:
+                        success_count += 1
+                        print(f"✓ Success: {h5_file} -> {output_base}.[{','.join(formats)}] ({elapsed:.2f} s)",
+                              flush=True)
+                    else:
+                        failed_count += 1
+                        print(f"✗ Failed: {h5_file}\n  Error: {error_msg}", flush=True)
+
+                if ready and self.pattern_store is not None:
+                    self.pattern_store.flush()
+
+                # Refresh the stacked plot once per batch of new files
+                if ready and create_stacked_plot and success_count > 0:
+                    self._dedupe_plot_patterns()
+                    self.create_stacked_plot(output_dir, offset=stacked_plot_offset,
+                                             patterns=self.plot_patterns)
+
+                stop_event.wait(poll_interval)
+        except KeyboardInterrupt:
+            print("\nWatch interrupted by user")
+        finally:
+            if self.pattern_store is not None:
+                self.pattern_store.close()
+                self.pattern_store = None
+            self.pattern_index.close()
+            self.pattern_index = None
+            self.plot_patterns = None
+            if self.cache is not None:
+                self.cache.prune()
+                self.cache = None
+
+        print(f"\n✓ Watch session ended")
+        print(f"  Integrated: {success_count}, Failed: {failed_count}", flush=True)
+        self.timer.report()
+        return success_count
 
     def _extract_pressure(self, filename):
         """
@@ -498,7 +1382,8 @@ class BatchIntegrator:
 
         # Match pattern: underscore followed by "number-number" before file extension
         # This ensures we get the last angle range, not other numbers in filename
-        pattern = r'_(\d+\.?\d*)-(\d+\.?\d*)\.\w+$'
+        # (pattern names of the store or of memory have no extension)
+        pattern = r'_(\d+\.?\d*)-(\d+\.?\d*)(?:\.[A-Za-z]\w*)?$'
         match = re.search(pattern, basename)
 
         if match:
@@ -509,57 +1394,69 @@ class BatchIntegrator:
 
         return None
 
-    def create_stacked_plot(self, output_dir, offset='auto', output_name='stacked_plot.png'):
+    def create_stacked_plot(self, output_dir, offset='auto', output_name='stacked_plot.png',
+                            patterns=None, waterfall=False, decimate=True):
         """
         Create stacked diffraction pattern plot
         Supports two modes:
         1. If same pressure has more than 2 data files (e.g., 0.72_Bin001_0.0-10.0.xy), create separate stacked plot for each pressure
         2. Otherwise, use original logic to create one stacked plot for all pressures
 
+        Patterns are taken from memory when given, else from the consolidated
+        pattern store of output_dir, else from its .xy/.dat files.
+
         Args:
-            output_dir (str): Directory containing .xy or .dat files
+            output_dir (str): Output directory (and source of stored patterns)
             offset (str or float): Offset between curves ('auto' or specific value)
             output_name (str): Output filename
+            patterns (list, optional): In-memory patterns [{'name', 'x', 'y', 'pressure',
+                                       'is_unload'}, ...], see _collect_plot_patterns
+            waterfall (bool): Also render an intensity map (waterfall_*.png) per plot
+            decimate (bool): Reduce curves to min/max per output pixel column
         """
-        # Find all .xy or .dat files
-        xy_files = glob.glob(os.path.join(output_dir, '*.xy'))
-        if not xy_files:
-            xy_files = glob.glob(os.path.join(output_dir, '*.dat'))
-
-        if not xy_files:
+        if patterns is None:
+            patterns = self._load_plot_patterns(output_dir)
+        if not patterns:
             print("⚠ No .xy or .dat files found for stacked plot")
             return
 
-        # Group files by pressure
+        # Group patterns by pressure; metadata comes from the pattern index, file
+        # names are only parsed for outputs written before the index existed
         from collections import defaultdict
         pressure_groups = defaultdict(list)
+        index = read_pattern_index(output_dir)
 
-        for f in xy_files:
-            pressure, is_unload = self._extract_pressure(f)
-            range_avg = self._extract_range_average(f)
-            pressure_groups[pressure].append((f, range_avg))
+        for pattern in patterns:
+            row = lookup(index, pattern['name'])
+            if row is not None:
+                pattern['pressure'], pattern['is_unload'] = row['pressure'], row['is_unload']
+                pattern['range_avg'] = (None if row['azimuth_start'] is None
+                                        else (row['azimuth_start'] + row['azimuth_end']) / 2.0)
+            else:
+                if 'pressure' not in pattern:
+                    pattern['pressure'], pattern['is_unload'] = self._extract_pressure(pattern['name'])
+                pattern['range_avg'] = self._extract_range_average(pattern['name'])
+            pressure_groups[pattern['pressure']].append(pattern)
 
         # Check if any pressure group contains more than 1 file (i.e., multiple bins at same pressure)
-        has_multi_file_groups = any(len(files) > 1 for files in pressure_groups.values())
+        has_multi_file_groups = any(len(group) > 1 for group in pressure_groups.values())
 
         if has_multi_file_groups:
             # Mode 1: Generate separate stacked plot for each pressure group with multiple files
             print(f"Detected multiple data files at same pressure, generating separate stacked plot for each pressure point")
 
             generated_count = 0
-            for pressure, file_list in sorted(pressure_groups.items()):
-                if len(file_list) <= 1:
-                    print(f"  Pressure {pressure:.2f} GPa has only {len(file_list)} file, skipping")
+            for pressure, group in sorted(pressure_groups.items()):
+                if len(group) <= 1:
+                    print(f"  Pressure {pressure:.2f} GPa has only {len(group)} file, skipping")
                     continue
 
-                print(f"  Generating stacked plot for pressure {pressure:.2f} GPa ({len(file_list)} files)...")
+                print(f"  Generating stacked plot for pressure {pressure:.2f} GPa ({len(group)} files)...")
                 # Determine if this is unloading data based on first file
-                first_file = file_list[0][0]
-                _, is_unload = self._extract_pressure(first_file)
-                prefix = 'd' if is_unload else ''
+                prefix = 'd' if group[0]['is_unload'] else ''
                 self._create_single_pressure_stacked_plot(
-                    pressure, file_list, output_dir, offset,
-                    f'stacked_plot_{prefix}{pressure:.3f}GPa.png'
+                    pressure, group, output_dir, offset,
+                    f'stacked_plot_{prefix}{pressure:.3f}GPa.png', waterfall, decimate
                 )
                 generated_count += 1
             
@@ -573,96 +1470,97 @@ class BatchIntegrator:
         else:
             # Mode 2: Original logic - all pressures in one plot
             print(f"Using original logic to generate stacked plot for all pressures")
-            self._create_all_pressure_stacked_plot(xy_files, output_dir, offset, output_name)
+            self._create_all_pressure_stacked_plot(patterns, output_dir, offset, output_name,
+                                                   waterfall, decimate)
             print()
             print("="*70)
             print(f"✓ Stacked plot generation completed!")
             print(f"  Output directory: {output_dir}")
             print("="*70)
 
-    def _create_single_pressure_stacked_plot(self, pressure, file_list, output_dir, offset, output_name):
+    def _load_plot_patterns(self, output_dir):
+        """Patterns of an output directory: pattern store first, text outputs otherwise"""
+        store_path = default_store_path(output_dir)
+        if is_pattern_store(store_path):
+            print(f"  Reading patterns from {store_path}")
+            return patterns_from_store(store_path)
+
+        xy_files = glob.glob(os.path.join(output_dir, '*.xy'))
+        if not xy_files:
+            xy_files = glob.glob(os.path.join(output_dir, '*.dat'))
+        return patterns_from_files(xy_files)
+
+    def _dedupe_plot_patterns(self):
+        """Keep only the latest plot pattern of every output name (files integrated again)"""
+        def key(pattern):
+            # Patterns read from text outputs are named with their extension
+            base, ext = os.path.splitext(pattern['name'])
+            return base if ext.lower() in ('.xy', '.dat') else pattern['name']
+        self.plot_patterns[:] = {key(pattern): pattern for pattern in self.plot_patterns}.values()
+
+    def _collect_plot_patterns(self, patterns, h5_file, output_base):
+        """Keep the patterns of one file in memory for the stacked plot of the run"""
+        pressure, is_unload = self._extract_pressure(h5_file)
+        name_base = os.path.basename(output_base)
+        for name_suffix, frame, sector, result in patterns:
+            self.plot_patterns.append({
+                'name': name_base + name_suffix,
+                'x': np.asarray(result[0]),
+                'y': np.asarray(result[1], dtype=np.float32),
+                'pressure': pressure,
+                'is_unload': is_unload,
+            })
+
+    def _create_single_pressure_stacked_plot(self, pressure, patterns, output_dir, offset, output_name,
+                                             waterfall=False, decimate=True):
         """
         Create stacked plot for multiple data files at a single pressure point
 
         Args:
             pressure (float): Pressure value
-            file_list (list): [(file_path, range_average), ...] List of files and their range averages
+            patterns (list): Patterns of this pressure with their 'range_avg'
             output_dir (str): Output directory
             offset (str or float): Offset value
             output_name (str): Output filename
+            waterfall (bool): Also render the group as an intensity map
+            decimate (bool): Reduce curves to the output pixel width
         """
+        plt = _pyplot()
         # Sort by range average
-        file_list_sorted = sorted(file_list, key=lambda x: x[1] if x[1] is not None else 0)
-
-        # Load data
-        data_list = []
-        range_avgs = []
-        for file_path, range_avg in file_list_sorted:
-            try:
-                data = np.loadtxt(file_path)
-                data_list.append(data)
-                range_avgs.append(range_avg if range_avg is not None else 0)
-            except Exception as e:
-                print(f"    Warning: Could not load {file_path}: {e}")
-
-        if not data_list:
-            print(f"    ⚠ No valid data files for pressure {pressure:.2f} GPa")
-            return
-
-        # Calculate offset
-        if offset == 'auto':
-            max_intensities = [np.max(data[:, 1]) for data in data_list]
-            calc_offset = np.mean(max_intensities) * 1.2
-        else:
-            calc_offset = float(offset)
-
-        # Create figure
-        plt.figure(figsize=(12, 10))
+        patterns = sorted(patterns, key=lambda p: p['range_avg'] if p['range_avg'] is not None else 0)
+        range_avgs = [p['range_avg'] if p['range_avg'] is not None else 0 for p in patterns]
+        curves = [(p['x'], p['y']) for p in patterns]
 
         # Use color map that cycles every 90 (e.g., 0-90, 90-180,...)
         base_colors = plt.cm.tab20(np.linspace(0, 1, 20))
+        colors = [base_colors[int(avg // 90) % len(base_colors)] for avg in range_avgs]
+        labels = [f'{avg:.1f}°' for avg in range_avgs]
 
-        for idx, (data, range_avg) in enumerate(zip(data_list, range_avgs)):
-            # Plot curve with offset
-            y_offset = idx * calc_offset
-            color_idx = int(range_avg // 90) if range_avg is not None else idx
-            color = base_colors[color_idx % len(base_colors)]
-            label = f'{range_avg:.1f}°' if range_avg is not None else f'Data {idx+1}'
-            plt.plot(data[:, 0], data[:, 1] + y_offset,
-                    color=color, linewidth=1.2, label=label)
-
-            # Add label near the curve baseline (just above the curve start)
-            # Position label at left side of the curve, slightly above the baseline
-            x_pos = data[0, 0] + (data[-1, 0] - data[0, 0]) * 0.02
-            # Get the intensity value at the label position
-            # Find the closest data point to x_pos
-            x_data = data[:, 0]
-            idx_closest = np.argmin(np.abs(x_data - x_pos))
-            y_at_label = data[idx_closest, 1]
-            # Place label just above the actual curve at this position
-            y_pos = y_offset + y_at_label + calc_offset * 0.05  # 5% of offset above the curve
-            
-            plt.text(x_pos, y_pos, label,
-                    fontsize=9, verticalalignment='bottom',
-                    color='black', fontname='Arial', fontweight='bold')
-
-        plt.xlabel('2θ (degrees)', fontsize=12)
-        plt.ylabel('Intensity (offset)', fontsize=12)
-        plt.title(f'Stacked Diffraction Patterns at {pressure:.2f} GPa',
-                 fontsize=14, fontweight='bold')
-        plt.grid(True, alpha=0.3)
+        def label_height(idx, x, y, calc_offset):
+            # Just above the curve at the label position
+            x_pos = x[0] + (x[-1] - x[0]) * 0.02
+            return y[np.argmin(np.abs(x - x_pos))] + calc_offset * 0.05
 
-        # Save figure
         output_path = os.path.join(output_dir, output_name)
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-        plt.close()
+        calc_offset = render_stacked(
+            curves, output_path, offset, colors=colors, labels=labels, label_y=label_height,
+            title=f'Stacked Diffraction Patterns at {pressure:.2f} GPa', decimate=decimate,
+            label_style={'fontsize': 9, 'fontname': 'Arial', 'fontweight': 'bold'}
+        )
 
         print(f"    ✓ Stacked plot saved: {output_path}")
-        print(f"      Number of data files: {len(data_list)}")
+        print(f"      Number of data files: {len(curves)}")
         print(f"      Offset: {calc_offset:.2f}")
         print(f"      Azimuthal angles: {', '.join([f'{avg:.1f}°' for avg in range_avgs])}")
 
-    def _create_all_pressure_stacked_plot(self, xy_files, output_dir, offset, output_name):
+        if waterfall:
+            waterfall_path = os.path.join(output_dir, output_name.replace('stacked_plot', 'waterfall', 1))
+            render_waterfall(curves, waterfall_path, labels, ylabel='Azimuth',
+                             title=f'Intensity Map at {pressure:.2f} GPa')
+            print(f"    ✓ Waterfall plot saved: {waterfall_path}")
+
+    def _create_all_pressure_stacked_plot(self, patterns, output_dir, offset, output_name,
+                                          waterfall=False, decimate=True):
         """
         Create overall stacked plot for all pressures
 
@@ -674,102 +1572,230 @@ class BatchIntegrator:
                  the stacking order will be: ...38, 39, 40, d38.2, d30, d20
 
         Args:
-            xy_files (list): List of all .xy or .dat files
+            patterns (list): Patterns with 'pressure' and 'is_unload'
             output_dir (str): Output directory
             offset (str or float): Offset value
             output_name (str): Output filename
+            waterfall (bool): Also render the series as an intensity map (waterfall.png)
+            decimate (bool): Reduce curves to the output pixel width
         """
-        # Extract pressure, is_unload and sort
-        file_info_list = []
-        for f in xy_files:
-            pressure, is_unload = self._extract_pressure(f)
-            file_info_list.append((f, pressure, is_unload))
+        plt = _pyplot()
+        # Loading data low to high pressure, then unloading data high to low
+        loading_data = sorted((p for p in patterns if not p['is_unload']), key=lambda p: p['pressure'])
+        unloading_data = sorted((p for p in patterns if p['is_unload']), key=lambda p: p['pressure'],
+                                reverse=True)
+        ordered = loading_data + unloading_data
+        pressures = [p['pressure'] for p in ordered]
+        curves = [(p['x'], p['y']) for p in ordered]
 
-        # Separate loading and unloading data
-        loading_data = [(f, p) for f, p, u in file_info_list if not u]
-        unloading_data = [(f, p) for f, p, u in file_info_list if u]
+        # Create color map (change color every 10 GPa)
+        colors = plt.cm.tab10(np.arange(10))
+        # Add 'd' prefix to label if it's unloading data
+        labels = [f"d{p['pressure']:.1f} GPa" if p['is_unload'] else f"{p['pressure']:.1f} GPa"
+                  for p in ordered]
 
-        # Sort loading data: low to high pressure
-        loading_data.sort(key=lambda x: x[1])
+        # Labels at 75% between the baseline of a curve and the next one
+        output_path = os.path.join(output_dir, output_name)
+        calc_offset = render_stacked(
+            curves, output_path, offset, colors=[colors[int(p // 10) % 10] for p in pressures],
+            labels=labels, label_y=0.75, decimate=decimate, label_style={'fontname': 'Arial'},
+            title='Stacked Diffraction Patterns (Loading + Unloading)'
+        )
 
-        # Sort unloading data: high to low pressure
-        unloading_data.sort(key=lambda x: x[1], reverse=True)
+        print(f"✓ Stacked plot saved: {output_path}")
+        print(f"  Total patterns: {len(curves)}")
+        print(f"  Loading data: {len(loading_data)}, Unloading data: {len(unloading_data)}")
+        print(f"  Pressure range: {min(pressures):.1f} - {max(pressures):.1f} GPa")
+        print(f"  Offset: {calc_offset:.2f}")
 
-        # Combine: loading first, then unloading
-        file_pressure_pairs = loading_data + unloading_data
+        if waterfall:
+            waterfall_path = os.path.join(output_dir, 'waterfall.png')
+            render_waterfall(curves, waterfall_path, labels, ylabel='Pressure',
+                             title='Intensity Map (Loading + Unloading)')
+            print(f"✓ Waterfall plot saved: {waterfall_path}")
 
-        # Load data
-        data_list = []
-        pressures = []
-        is_unload_list = []
-        for file_path, pressure in file_pressure_pairs:
-            try:
-                data = np.loadtxt(file_path)
-                data_list.append(data)
-                pressures.append(pressure)
-                # Determine if this is unload data
-                _, is_unload = self._extract_pressure(file_path)
-                is_unload_list.append(is_unload)
-            except Exception as e:
-                print(f"Warning: Could not load {file_path}: {e}")
 
-        if not data_list:
-            print("⚠ No valid data files for stacked plot")
-            return
+class IntegrationCache:
+    """
+    Content-addressed on-disk cache of integration results
 
-        # Calculate offset
-        if offset == 'auto':
-            # Auto-calculate based on max intensity
-            max_intensities = [np.max(data[:, 1]) for data in data_list]
-            calc_offset = np.mean(max_intensities) * 1.2
-        else:
-            calc_offset = float(offset)
+    Entries are keyed by the source file (absolute path, size, mtime) together
+    with every integration setting (PONI and mask fingerprints, npt, unit,
+    azimuth/radial ranges, bins, frames, method ...). A changed source file or
+    setting produces a different key, so stale entries are never reused.
 
-        # Create color map (change color every 10 GPa)
-        colors = plt.cm.tab10(np.arange(10))
+    The cache is bounded by max_size_gb: prune() (called at the end of every
+    cached batch run) deletes the least recently used entries beyond it.
+    Deleting the cache directory is always safe; it only costs a re-integration.
+    """
 
-        # Create plot
-        plt.figure(figsize=(12, 10))
+    def __init__(self, cache_dir, max_size_gb=DEFAULT_CACHE_MAX_GB):
+        """
+        Args:
+            cache_dir (str): Directory holding one .npz file per entry
+            max_size_gb (float, optional): Size limit of the entries (None = unbounded)
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = None if max_size_gb is None else int(max_size_gb * 1024 ** 3)
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, h5_file, settings):
+        """Build the cache key for a source file and integration settings"""
+        stat = os.stat(h5_file)
+        payload = {
+            'file': os.path.abspath(h5_file),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'settings': settings,
+        }
+        text = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, key):
+        """
+        Load cached patterns
 
-        for idx, (data, pressure, is_unload) in enumerate(zip(data_list, pressures, is_unload_list)):
-            # Determine color based on pressure range
-            color_idx = int(pressure // 10) % 10
+        Returns:
+            list or None: [(name_suffix, frame, sector, (radial, intensity)), ...] or None on a miss
+        """
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
 
-            # Plot with offset
-            y_offset = idx * calc_offset
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                names = json.loads(str(entry['names']))
+                sectors = json.loads(str(entry['sectors']))
+                frames = entry['frames']
+                radial = entry['radial']
+                intensity = entry['intensity']
+        except Exception:
+            # Unreadable/partial entry: treat as a miss, it will be rewritten
+            self.misses += 1
+            return None
 
-            # Add 'd' prefix to label if it's unloading data
-            label = f'd{pressure:.1f} GPa' if is_unload else f'{pressure:.1f} GPa'
+        # Marks the entry as recently used for prune()
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return [(name, int(frame), sector, (radial[i], intensity[i]))
+                for i, (name, frame, sector) in enumerate(zip(names, frames, sectors))]
+
+    def store(self, key, patterns):
+        """
+        Store integrated patterns
 
-            plt.plot(data[:, 0], data[:, 1] + y_offset,
-                    color=colors[color_idx], linewidth=1.2, label=label)
+        Args:
+            patterns (list): [(name_suffix, frame, sector, result), ...]
+        """
+        names = [name for name, _, _, _ in patterns]
+        sectors = [sector for _, _, sector, _ in patterns]
+        frames = np.array([frame for _, frame, _, _ in patterns], dtype=np.int64)
+        radial = np.array([np.asarray(result[0]) for _, _, _, result in patterns])
+        intensity = np.array([np.asarray(result[1]) for _, _, _, result in patterns])
+
+        # Write to a temporary file first so an interrupted run never leaves a half entry
+        tmp_path = self._entry_path(key) + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, names=json.dumps(names), sectors=json.dumps(sectors), frames=frames,
+                     radial=radial, intensity=intensity)
+        os.replace(tmp_path, self._entry_path(key))
+
+    def prune(self):
+        """
+        Delete the least recently used entries until the cache fits in max_size_gb
 
-            # Add pressure label between current baseline and next baseline
-            x_pos = data[0, 0] + (data[-1, 0] - data[0, 0]) * 0.02
-            # Position at 75% between current and next baseline to avoid overlap
-            # y_offset is current baseline (idx * calc_offset)
-            # Next baseline is (idx + 1) * calc_offset = y_offset + calc_offset
-            y_pos = y_offset + calc_offset * 0.75
+        Returns:
+            tuple: (removed entries, freed bytes)
+        """
+        if self.max_bytes is None:
+            return 0, 0
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        removed, freed = 0, 0
+        for _, size, path in sorted(entries):
+            if total - freed <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += size
+        return removed, freed
+
+
+# Integrator owned by each pool worker process (created once by _init_worker)
+_worker_integrator = None
+
+
+def _init_worker(poni_file, mask_file, cache_dir=None, preview_options=None, correction_options=None,
+                 auto_mask_options=None):
+    """Pool initializer: load calibration and mask once per worker process"""
+    global _worker_integrator
+    _worker_integrator = BatchIntegrator(poni_file, mask_file, verbose=False)
+    if cache_dir:
+        _worker_integrator.cache = IntegrationCache(cache_dir)
+    if preview_options:
+        # Validated by the parent; the renderer (and matplotlib) loads on the first preview
+        _worker_integrator.preview_options = dict(preview_options)
+    if correction_options:
+        # The main process already averaged the references: this only loads the cache
+        _worker_integrator.configure_correction(**correction_options)
+    if auto_mask_options:
+        # Same mask as the main process, so the hot/dead pixel scan comes from the cache
+        _worker_integrator.configure_auto_mask(**auto_mask_options)
+
+
+def _integrate_task(task):
+    """Pool task: integrate one file with the worker's integrator"""
+    h5_file, output_base, options = task
+    return _worker_integrator._process_file(h5_file, output_base, **options)
+
+
+def parse_frame_range(spec):
+    """
+    Parse a frame selection for multi-frame HDF5 stacks
 
-            plt.text(x_pos, y_pos, label,
-                    fontsize=8, verticalalignment='bottom',
-                    color='black', fontname='Arial')
+    Accepts None/'' (no frame iteration, first frame only), 'all', a single
+    index ('5'), a Python-style range 'start:stop:step' ('::10', '100:500:5'),
+    a slice, or a (start, stop, step) tuple.
 
-        plt.xlabel('2θ (degrees)', fontsize=12)
-        plt.ylabel('Intensity (offset)', fontsize=12)
-        plt.title('Stacked Diffraction Patterns (Loading + Unloading)', fontsize=14, fontweight='bold')
-        plt.grid(True, alpha=0.3)
+    Returns:
+        slice or None
+    """
+    if spec is None or isinstance(spec, slice):
+        return spec
+    if isinstance(spec, (tuple, list)):
+        return slice(*spec)
 
-        # Save plot
-        output_path = os.path.join(output_dir, output_name)
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-        plt.close()
+    spec = str(spec).strip()
+    if not spec:
+        return None
+    if spec.lower() == 'all':
+        return slice(None)
+    if ':' not in spec:
+        index = int(spec)
+        # index + 1 is 0 for the last frame (-1): an open stop keeps it non-empty
+        return slice(index, index + 1 or None)
 
-        print(f"✓ Stacked plot saved: {output_path}")
-        print(f"  Total patterns: {len(data_list)}")
-        print(f"  Loading data: {len(loading_data)}, Unloading data: {len(unloading_data)}")
-        print(f"  Pressure range: {min(pressures):.1f} - {max(pressures):.1f} GPa")
-        print(f"  Offset: {calc_offset:.2f}")
+    parts = spec.split(':')
+    if len(parts) > 3:
+        raise ValueError(f"Invalid frame range: {spec}")
+    values = [int(p) if p.strip() else None for p in parts]
+    return slice(*values)
 
 
 def load_config(config_file):
@@ -782,19 +1808,22 @@ def load_config(config_file):
         'mask_file': config.get('paths', 'mask_file', fallback=None),
         'input_pattern': config.get('paths', 'input_pattern'),
         'output_dir': config.get('paths', 'output_dir'),
-        'dataset_path': config.get('paths', 'dataset_path', fallback=None)
+        'dataset_path': config.get('paths', 'dataset_path', fallback=None),
+        'dark_file': config.get('paths', 'dark_file', fallback=None),
+        'flat_file': config.get('paths', 'flat_file', fallback=None),
+        'background_file': config.get('paths', 'background_file', fallback=None)
     }
     
-    if paths['mask_file'] == '':
-        paths['mask_file'] = None
-    if paths['dataset_path'] == '':
-        paths['dataset_path'] = None
+    for key in ('mask_file', 'dataset_path', 'dark_file', 'flat_file', 'background_file'):
+        if paths[key] == '':
+            paths[key] = None
     
     integration = {
         'npt': config.getint('integration', 'npt', fallback=2000),
         'unit': config.get('integration', 'unit', fallback='2th_deg'),
         'correctSolidAngle': config.getboolean('integration', 'correct_solid_angle', fallback=True),
-        'polarization_factor': config.get('integration', 'polarization_factor', fallback='None')
+        'polarization_factor': config.get('integration', 'polarization_factor', fallback='None'),
+        'formats': config.get('integration', 'formats', fallback='xy')
     }
     
     if integration['polarization_factor'] == 'None':
@@ -808,7 +1837,46 @@ def load_config(config_file):
         'normalization_factor': config.getfloat('advanced', 'normalization_factor', fallback=1.0)
     }
     
-    return paths, integration, advanced
+    # Statistical auto mask (None unless enabled)
+    auto_mask = None
+    if config.getboolean('auto_mask', 'enabled', fallback=False):
+        auto_mask = {
+            'sigma': config.getfloat('auto_mask', 'sigma', fallback=5.0),
+            'azimuth_bins': config.getint('auto_mask', 'azimuth_bins', fallback=36),
+            'grow_pixels': config.getint('auto_mask', 'grow_pixels', fallback=1),
+        }
+        low_sigma = config.get('auto_mask', 'low_sigma', fallback='')
+        if low_sigma not in ('', 'None'):
+            auto_mask['low_sigma'] = float(low_sigma)
+        stack_file = config.get('auto_mask', 'stack_file', fallback='')
+        if stack_file:
+            auto_mask['stack_file'] = stack_file
+            auto_mask['dataset_path'] = paths['dataset_path']
+
+    return paths, integration, advanced, auto_mask
+
+
+def load_bins_file(bins_file):
+    """
+    Load azimuthal bin definitions from a JSON file
+
+    The file holds a list of bins (or {"bins": [...]}), each
+    {"name": str, "start": float, "end": float} with angles in degrees,
+    as produced by the bin configuration dialog.
+
+    Returns:
+        list: Bin configs for batch_integrate
+    """
+    with open(bins_file, 'r', encoding='utf-8') as f:
+        bins = json.load(f)
+    if isinstance(bins, dict):
+        bins = bins.get('bins', [])
+    for i, bin_data in enumerate(bins):
+        missing = [key for key in ('name', 'start', 'end') if key not in bin_data]
+        if missing:
+            raise ValueError(f"Bin {i} in {bins_file} is missing {', '.join(missing)}")
+    return bins
+
 
 def run_batch_integration(
     poni_file,
@@ -823,7 +1891,29 @@ def run_batch_integration(
     stacked_plot_offset='auto',
     disable_progress_bar=False,
     sector_kwargs=None,
-    bins=None
+    bins=None,
+    workers=1,
+    frames=None,
+    frame_output='separate',
+    use_cache=False,
+    pipeline=False,
+    prefetch=4,
+    writer_threads=2,
+    preview='full',
+    preview_dpi=None,
+    preview_workers=0,
+    progress_port=None,
+    dark_file=None,
+    flat_file=None,
+    background_file=None,
+    background_scale=1.0,
+    integration_options=None,
+    resume=False,
+    trace_file=None,
+    waterfall_plot=False,
+    auto_mask=None,
+    index_cache=True,
+    cache_max_gb=DEFAULT_CACHE_MAX_GB
 ):
     """
     Run batch 1D integration using pyFAI
@@ -842,6 +1932,32 @@ def run_batch_integration(
         disable_progress_bar (bool): Disable tqdm progress bar (useful for GUI)
         sector_kwargs (dict): Sector integration parameters (e.g., {'azimuth_range': (min, max)})
         bins (list): List of bin configs for azimuthal binning [{'name': str, 'start': float, 'end': float}, ...]
+        workers (int): Number of worker processes for parallel integration
+        frames (str or slice): Frame selection for multi-frame files, e.g. 'all' or '0:500:10'
+        frame_output (str): 'separate' (<basename>_f00000...) or 'stacked' (one table per file)
+        use_cache (bool): Reuse cached results for unchanged files (incremental re-runs)
+        cache_max_gb (float, optional): Size limit of the integration cache (None = unbounded)
+        pipeline (bool): Overlap reads, integration and writes (single worker only)
+        prefetch (int): Frames read ahead in pipeline mode
+        writer_threads (int): Output writer threads in pipeline mode
+        preview (str): svg/png preview mode, 'full' (300 dpi) or 'thumbnail' (72 dpi)
+        preview_dpi (int, optional): PNG preview resolution overriding the mode default
+        preview_workers (int): Processes rendering previews (0 = in-process)
+        progress_port (int, optional): Localhost port of a ProgressServer receiving
+                                       JSON-lines progress and sending cancel
+        dark_file (str, optional): Dark frame (stack) subtracted before integration
+        flat_file (str, optional): Flat-field frame (stack) for flat-field correction
+        background_file (str, optional): Background frame (stack) subtracted after correction
+        background_scale (float): Factor applied to the background
+        integration_options (dict, optional): integrate1d options overriding the defaults
+                                              (correctSolidAngle, polarization_factor,
+                                              method, safe, normalization_factor)
+        resume (bool): Skip files completed by a previous (interrupted) run, see RunManifest
+        trace_file (str, optional): CSV file with the stage timings of every file
+        waterfall_plot (bool): Also render intensity maps next to the stacked plots
+        auto_mask (dict, optional): Per-frame statistical masking options, e.g.
+                                    {'sigma': 5.0, 'stack_file': 'dark.h5'} (see AutoMasker)
+        index_cache (bool): Reuse cached directory listings of the input search
     """
 
     integration_kwargs = {
@@ -851,6 +1967,8 @@ def run_batch_integration(
         'safe': True,
         'normalization_factor': 1.0
     }
+    if integration_options:
+        integration_kwargs.update(integration_options)
     
     # Add sector parameters if provided (only if bins are not used)
     if sector_kwargs and not bins:
@@ -865,43 +1983,254 @@ def run_batch_integration(
         raise FileNotFoundError(f"Calibration file not found: {poni_file}")
 
     integrator = BatchIntegrator(poni_file, mask_file)
+    progress = ProgressReporter(progress_port)
+
+    try:
+        integrator.batch_integrate(
+            input_pattern=input_pattern,
+            output_dir=output_dir,
+            npt=npt,
+            unit=unit,
+            dataset_path=dataset_path,
+            formats=formats,
+            create_stacked_plot=create_stacked_plot,
+            stacked_plot_offset=stacked_plot_offset,
+            disable_progress_bar=disable_progress_bar,
+            bins=bins,
+            workers=workers,
+            frames=frames,
+            frame_output=frame_output,
+            use_cache=use_cache,
+            pipeline=pipeline,
+            prefetch=prefetch,
+            writer_threads=writer_threads,
+            preview=preview,
+            preview_dpi=preview_dpi,
+            preview_workers=preview_workers,
+            progress=progress,
+            dark_file=dark_file,
+            flat_file=flat_file,
+            background_file=background_file,
+            background_scale=background_scale,
+            resume=resume,
+            trace_file=trace_file,
+            waterfall_plot=waterfall_plot,
+            auto_mask=auto_mask,
+            index_cache=index_cache,
+            cache_max_gb=cache_max_gb,
+            **integration_kwargs
+        )
+    finally:
+        progress.close()
+
+
+def run_watch_integration(
+    poni_file,
+    mask_file,
+    watch_dir,
+    output_dir,
+    dataset_path=None,
+    npt=2000,
+    unit='2th_deg',
+    formats=['xy'],
+    create_stacked_plot=True,
+    stacked_plot_offset='auto',
+    sector_kwargs=None,
+    bins=None,
+    file_pattern='*.h5',
+    poll_interval=0.5,
+    settle_time=1.0,
+    process_existing=True,
+    stop_event=None,
+    stop_on_stdin=False,
+    use_cache=False,
+    index_cache=True,
+    cache_max_gb=DEFAULT_CACHE_MAX_GB
+):
+    """
+    Run live integration of a folder that receives new HDF5 files (beamtime mode)
+
+    Args:
+        watch_dir (str): Directory to watch
+        file_pattern (str): Filename pattern of detector files
+        poll_interval (float): Seconds between directory scans
+        settle_time (float): Seconds a file size must stay unchanged before reading
+        process_existing (bool): Integrate files already present at start
+        stop_event (threading.Event, optional): Set to end the session
+        stop_on_stdin (bool): End the session when 'stop' (or EOF) is read on stdin,
+                              used when running as a GUI subprocess
+        use_cache (bool): Restore files already in the integration cache instead of
+                          integrating them again
+        index_cache (bool): Accepted so the GUI settings of a batch run carry over; the
+                            watch loop always lists watch_dir directly and never uses
+                            the file index
+        Other arguments are the same as for run_batch_integration
+    """
+    integration_kwargs = {
+        'correctSolidAngle': True,
+        'polarization_factor': None,
+        'method': 'csr',
+        'safe': True,
+        'normalization_factor': 1.0
+    }
+    if sector_kwargs and not bins:
+        integration_kwargs.update(sector_kwargs)
+
+    if not os.path.exists(poni_file):
+        raise FileNotFoundError(f"Calibration file not found: {poni_file}")
+    if not os.path.isdir(watch_dir):
+        raise FileNotFoundError(f"Watch directory not found: {watch_dir}")
+
+    stop_event = stop_event or threading.Event()
+    if stop_on_stdin:
+        def wait_for_stop():
+            for line in sys.stdin:
+                if line.strip().lower() == 'stop':
+                    break
+            stop_event.set()
+        threading.Thread(target=wait_for_stop, daemon=True).start()
 
-    integrator.batch_integrate(
-        input_pattern=input_pattern,
-        output_dir=output_dir,
+    integrator = BatchIntegrator(poni_file, mask_file)
+    return integrator.watch_folder(
+        watch_dir,
+        output_dir,
         npt=npt,
         unit=unit,
         dataset_path=dataset_path,
         formats=formats,
         create_stacked_plot=create_stacked_plot,
         stacked_plot_offset=stacked_plot_offset,
-        disable_progress_bar=disable_progress_bar,
         bins=bins,
+        file_pattern=file_pattern,
+        poll_interval=poll_interval,
+        settle_time=settle_time,
+        process_existing=process_existing,
+        stop_event=stop_event,
+        use_cache=use_cache,
+        cache_max_gb=cache_max_gb,
         **integration_kwargs
     )
-def main():
-    """Main function: hardcoded version"""
-    print("=" * 80)
-    print("HDF5 Diffraction Image Batch Integration Script - Enhanced Version")
-    print("Multiple Output Formats + Stacked Pressure Plot")
-    print("=" * 80)
 
 
-    # : 'xy', 'dat', 'chi', 'fxye', 'svg', 'png'
+def main():
+    """Command line entry point: config-driven batch run, or live folder watching with --watch"""
+    parser = argparse.ArgumentParser(
+        description="HDF5 diffraction image batch integration",
+        epilog="Example: python -m batch_integration --config job.ini --workers 8 --resume")
+    parser.add_argument('config_file', nargs='?', help="INI config file (same as --config)")
+    parser.add_argument('--config', help="INI config file with [paths], [integration] and [advanced] sections")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for parallel integration")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip files completed by a previous (interrupted) run of this job")
+    parser.add_argument('--cache', action='store_true',
+                        help="Reuse cached results of unchanged files (incremental re-runs)")
+    parser.add_argument('--cache-max-gb', type=float, default=DEFAULT_CACHE_MAX_GB,
+                        help="Size limit of the integration cache; least recently used "
+                             f"entries beyond it are deleted (default: {DEFAULT_CACHE_MAX_GB:g})")
+    parser.add_argument('--no-index-cache', action='store_true',
+                        help="Rescan every input directory instead of reusing cached listings")
+    parser.add_argument('--bins-file', help="JSON file with azimuthal bins [{name, start, end}, ...] (degrees)")
+    parser.add_argument('--frames', default=None, help="Frame selection of 3-D stacks, e.g. 'all' or '0:500:10'")
+    parser.add_argument('--frame-output', choices=['separate', 'stacked'], default='separate',
+                        help="One pattern per frame, or one table per file")
+    parser.add_argument('--pipeline', action='store_true', help="Overlap reads, integration and writes (single worker)")
+    parser.add_argument('--auto-mask', action='store_true',
+                        help="Mask single-crystal spots and outlier pixels of every frame")
+    parser.add_argument('--auto-mask-sigma', type=float, default=None,
+                        help="Auto mask threshold in MAD sigmas (default 5, implies --auto-mask)")
+    parser.add_argument('--trace', metavar='CSV', help="Write per-file stage timings (open, read, integrate1d, ...) to CSV")
+    parser.add_argument('--watch', metavar='DIR', help="Watch DIR and integrate new .h5 files as they arrive")
+    parser.add_argument('--poni', help="Calibration file (.poni)")
+    parser.add_argument('--mask', default=None, help="Mask file")
+    parser.add_argument('--output', help="Output directory")
+    parser.add_argument('--dataset', default=None, help="HDF5 dataset path (autodetect if omitted)")
+    parser.add_argument('--npt', type=int, default=None, help="Number of integration points")
+    parser.add_argument('--unit', default=None, help="Output unit")
+    parser.add_argument('--formats',
+                        help="Comma-separated output formats (default: [integration] formats of the "
+                             "config, else xy)")
+    parser.add_argument('--pattern', default='*.h5', help="Filename pattern to watch for")
+    parser.add_argument('--interval', type=float, default=0.5, help="Seconds between folder scans")
+    parser.add_argument('--stacked-plot', action='store_true', help="Create (or refresh) the stacked plot")
+    parser.add_argument('--waterfall', action='store_true',
+                        help="With --stacked-plot, also render an intensity map (waterfall.png)")
+    parser.add_argument('--skip-existing', action='store_true', help="Ignore files present before watching starts")
+    args = parser.parse_args()
+
+    def split_formats(text):
+        return [fmt.strip() for fmt in text.split(',') if fmt.strip()]
+
+    bins = load_bins_file(args.bins_file) if args.bins_file else None
+
+    if args.watch:
+        if not args.poni or not args.output:
+            parser.error("--watch requires --poni and --output")
+        run_watch_integration(
+            poni_file=args.poni,
+            mask_file=args.mask,
+            watch_dir=args.watch,
+            output_dir=args.output,
+            dataset_path=args.dataset,
+            npt=args.npt or 2000,
+            unit=args.unit or '2th_deg',
+            formats=split_formats(args.formats or 'xy'),
+            create_stacked_plot=args.stacked_plot,
+            bins=bins,
+            file_pattern=args.pattern,
+            poll_interval=args.interval,
+            process_existing=not args.skip_existing
+        )
+        return
+
+    config_file = args.config or args.config_file
+    if not config_file:
+        parser.error("a config file is required (--config job.ini), or --watch DIR")
+    if not os.path.exists(config_file):
+        parser.error(f"config file not found: {config_file}")
+    paths, integration, advanced, auto_mask = load_config(config_file)
+    if args.auto_mask or args.auto_mask_sigma is not None:
+        auto_mask = auto_mask or {}
+        if args.auto_mask_sigma is not None:
+            auto_mask['sigma'] = args.auto_mask_sigma
 
-    # 
-    output_formats = ['xy']
+    print("=" * 80)
+    print("HDF5 Diffraction Image Batch Integration")
+    print(f"Config: {config_file}")
+    print("=" * 80)
 
     run_batch_integration(
-        poni_file=r'D:\HEPS\ID31\test\using.poni',
-        mask_file=r'D:\HEPS\ID31\test\use.edf',
-        input_pattern=r'D:\HEPS\ID31\test\input_dir\*.h5',
-        output_dir=r'D:\HEPS\ID31\test\out_dir',
-        dataset_path=None,
-        npt=2000,
-        unit='2th_deg',
-        formats=output_formats, create_stacked_plot=True,  #
-        stacked_plot_offset='auto'  #
+        poni_file=args.poni or paths['poni_file'],
+        mask_file=args.mask or paths['mask_file'],
+        input_pattern=paths['input_pattern'],
+        output_dir=args.output or paths['output_dir'],
+        dataset_path=args.dataset or paths['dataset_path'],
+        npt=args.npt or integration['npt'],
+        unit=args.unit or integration['unit'],
+        formats=split_formats(args.formats or integration['formats'] or 'xy'),
+        create_stacked_plot=args.stacked_plot,
+        waterfall_plot=args.waterfall,
+        disable_progress_bar=not sys.stdout.isatty(),
+        bins=bins,
+        workers=args.workers,
+        frames=args.frames,
+        frame_output=args.frame_output,
+        use_cache=args.cache,
+        cache_max_gb=args.cache_max_gb,
+        resume=args.resume,
+        pipeline=args.pipeline,
+        trace_file=args.trace,
+        dark_file=paths['dark_file'],
+        flat_file=paths['flat_file'],
+        background_file=paths['background_file'],
+        auto_mask=auto_mask,
+        index_cache=not args.no_index_cache,
+        integration_options={
+            'correctSolidAngle': integration['correctSolidAngle'],
+            'polarization_factor': integration['polarization_factor'],
+            'method': advanced['method'],
+            'safe': advanced['safe'],
+            'normalization_factor': advanced['normalization_factor'],
+        }
     )
 
 
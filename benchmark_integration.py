@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Synthetic Benchmark Suite for Batch Integration
+Generates powder-ring detector images for a PONI geometry (an existing .poni
+file or a synthetic flat detector), writes them as single-frame and
+multi-frame HDF5 files and times BatchIntegrator.batch_integrate on them.
+No beamline data is needed.
+
+Scenarios (select with --scenarios, default: all):
+    full        full azimuthal integration (csr, xy)
+    bins        N equal azimuthal bins (--bins)
+    methods     each pyFAI method: csr, splitpixel, bbox
+    formats     each output format: xy, dat, chi, fxye, h5, png, svg
+    workers     1..N worker processes (--max-workers)
+    frames      every frame of the multi-frame files
+
+Results are written as JSON (with the run settings and library versions) and
+CSV, so runs before and after a change can be compared:
+
+    python benchmark_integration.py --output bench_before
+    python benchmark_integration.py --shape 2048 2048 --files 20 --scenarios full workers
+"""
+
+import os
+import io
+import sys
+import csv
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import multiprocessing
+from datetime import datetime
+
+import numpy as np
+import h5py
+import pyFAI
+from pyFAI.detectors import Detector
+try:
+    from pyFAI.azimuthalIntegrator import AzimuthalIntegrator
+except ImportError:  # only the new location is left in later pyFAI releases
+    from pyFAI.integrator.azimuthal import AzimuthalIntegrator
+
+from batch_integration import BatchIntegrator
+
+
+SCENARIOS = ['full', 'bins', 'methods', 'formats', 'workers', 'frames']
+METHODS = ['csr', 'splitpixel', 'bbox']
+FORMATS = ['xy', 'dat', 'chi', 'fxye', 'h5', 'png', 'svg']
+
+# CeO2-like fcc reflections: (h, k, l)
+_REFLECTIONS = [(1, 1, 1), (2, 0, 0), (2, 2, 0), (3, 1, 1), (2, 2, 2), (4, 0, 0),
+                (3, 3, 1), (4, 2, 0), (4, 2, 2), (5, 1, 1), (4, 4, 0), (5, 3, 1)]
+_LATTICE = 5.411  # Å
+
+
+def make_geometry(shape=(1024, 1024), pixel_size=172e-6, distance=0.2, wavelength=0.4133e-10):
+    """
+    Synthetic flat-detector geometry with the beam centre in the middle of the detector
+
+    Returns:
+        AzimuthalIntegrator
+    """
+    detector = Detector(pixel_size, pixel_size, max_shape=shape)
+    return AzimuthalIntegrator(dist=distance, poni1=shape[0] * pixel_size / 2,
+                               poni2=shape[1] * pixel_size / 2, detector=detector,
+                               wavelength=wavelength)
+
+
+def ring_positions(wavelength, max_tth):
+    """2θ (degrees) of the reference reflections visible below max_tth"""
+    wavelength_a = wavelength * 1e10
+    positions = []
+    for h, k, l in _REFLECTIONS:
+        d = _LATTICE / np.sqrt(h * h + k * k + l * l)
+        if wavelength_a / (2 * d) < 1:
+            tth = np.degrees(2 * np.arcsin(wavelength_a / (2 * d)))
+            if tth < max_tth:
+                positions.append(tth)
+    return positions
+
+
+def synthetic_image(tth, rings, rng, background=50.0, amplitude=2000.0, width=0.03):
+    """
+    Poisson-noisy powder pattern image
+
+    Args:
+        tth (numpy.ndarray): 2θ (degrees) of every pixel
+        rings (list): Ring positions (degrees)
+        rng (numpy.random.Generator): Random source
+        background (float): Flat background counts
+        amplitude (float): Peak counts of the strongest ring
+        width (float): Gaussian ring width (degrees)
+
+    Returns:
+        numpy.ndarray: uint32 image
+    """
+    expected = np.full(tth.shape, background, dtype=np.float64)
+    for i, position in enumerate(rings):
+        expected += amplitude / (1 + i) * np.exp(-0.5 * ((tth - position) / width) ** 2)
+    return rng.poisson(expected).astype(np.uint32)
+
+
+def generate_dataset(directory, ai, shape, n_files=8, n_frames=10, seed=0):
+    """
+    Write single-frame and multi-frame HDF5 files of synthetic images
+
+    Files are named like pressure series (1.0GPa.h5, 2.5GPa.h5, ...) so the
+    pressure-based features of the integrator see realistic names.
+
+    Returns:
+        tuple: (single-frame glob pattern, multi-frame glob pattern)
+    """
+    rng = np.random.default_rng(seed)
+    tth = ai.center_array(shape, unit='2th_deg')
+    rings = ring_positions(ai.wavelength, tth.max())
+
+    single_dir = os.path.join(directory, 'single')
+    multi_dir = os.path.join(directory, 'multi')
+    os.makedirs(single_dir, exist_ok=True)
+    os.makedirs(multi_dir, exist_ok=True)
+
+    for i in range(n_files):
+        name = f"{1.0 + 1.5 * i:.1f}GPa.h5"
+        with h5py.File(os.path.join(single_dir, name), 'w') as f:
+            f.create_dataset('entry/data/data', data=synthetic_image(tth, rings, rng))
+        with h5py.File(os.path.join(multi_dir, name), 'w') as f:
+            stack = np.stack([synthetic_image(tth, rings, rng) for _ in range(n_frames)])
+            f.create_dataset('entry/data/data', data=stack, chunks=(1,) + tuple(shape))
+
+    return os.path.join(single_dir, '*.h5'), os.path.join(multi_dir, '*.h5')
+
+
+def build_scenarios(selected, n_bins=8, max_workers=None):
+    """
+    Expand scenario groups into individual runs
+
+    Returns:
+        list: [(group, label, batch_integrate overrides, uses multi-frame files), ...]
+    """
+    max_workers = max_workers or multiprocessing.cpu_count()
+    runs = []
+    if 'full' in selected:
+        runs.append(('full', 'full', {}, False))
+    if 'bins' in selected:
+        step = 360.0 / n_bins
+        bins = [{'name': f"Bin{i + 1:03d}", 'start': -180 + i * step, 'end': -180 + (i + 1) * step}
+                for i in range(n_bins)]
+        runs.append(('bins', f"{n_bins} bins", {'bins': bins}, False))
+    if 'methods' in selected:
+        runs.extend(('methods', method, {'method': method}, False) for method in METHODS)
+    if 'formats' in selected:
+        runs.extend(('formats', fmt, {'formats': [fmt]}, False) for fmt in FORMATS)
+    if 'workers' in selected:
+        runs.extend(('workers', f"{n} workers", {'workers': n}, False) for n in range(1, max_workers + 1))
+    if 'frames' in selected:
+        runs.append(('frames', 'all frames', {'frames': 'all'}, True))
+    return runs
+
+
+def count_frames(pattern):
+    """Total frames of the files matching a dataset pattern"""
+    total = 0
+    for filename in glob.glob(pattern):
+        with h5py.File(filename, 'r') as f:
+            shape = f['entry/data/data'].shape
+            total += shape[0] if len(shape) == 3 else 1
+    return total
+
+
+def run_scenario(poni_file, input_pattern, output_dir, overrides, npt=2000, repeat=1, verbose=False):
+    """
+    Time batch_integrate for one scenario
+
+    Returns:
+        float: Best wall time of the repeats (seconds)
+    """
+    options = dict(npt=npt, unit='2th_deg', formats=['xy'], disable_progress_bar=True,
+                   correctSolidAngle=True, method='csr')
+    options.update(overrides)
+    best = None
+    for _ in range(repeat):
+        shutil.rmtree(output_dir, ignore_errors=True)
+        log = sys.stdout if verbose else io.StringIO()
+        with contextlib.redirect_stdout(log):
+            # Geometry loading is part of every real run, so it is timed too
+            start = time.perf_counter()
+            integrator = BatchIntegrator(poni_file, verbose=False)
+            integrator.batch_integrate(input_pattern, output_dir, **options)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def write_results(results, settings, output_prefix):
+    """Write results as <prefix>.json (with settings) and <prefix>.csv"""
+    with open(f"{output_prefix}.json", 'w', encoding='utf-8') as f:
+        json.dump({'settings': settings, 'results': results}, f, indent=2)
+    with open(f"{output_prefix}.csv", 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic benchmark of the batch integration path")
+    parser.add_argument('--poni', help="Use this geometry (and its detector shape) instead of a synthetic one")
+    parser.add_argument('--shape', type=int, nargs=2, default=[1024, 1024], metavar=('ROWS', 'COLS'),
+                        help="Detector size of the synthetic geometry")
+    parser.add_argument('--files', type=int, default=8, help="Files per dataset")
+    parser.add_argument('--frames', type=int, default=10, help="Frames per multi-frame file")
+    parser.add_argument('--npt', type=int, default=2000, help="Integration points")
+    parser.add_argument('--bins', type=int, default=8, help="Azimuthal bins of the 'bins' scenario")
+    parser.add_argument('--max-workers', type=int, default=None, help="Largest worker count (default: CPU count)")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--repeat', type=int, default=1, help="Repeats per scenario (best time is kept)")
+    parser.add_argument('--output', default='benchmark_results', help="Prefix of the .json/.csv results")
+    parser.add_argument('--workdir', help="Keep generated data here (default: temporary directory)")
+    parser.add_argument('--verbose', action='store_true', help="Show the integrator log")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='xrd_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        if args.poni:
+            poni_file = args.poni
+            ai = pyFAI.load(poni_file)
+            shape = tuple(ai.detector.max_shape)
+        else:
+            shape = tuple(args.shape)
+            ai = make_geometry(shape)
+            poni_file = os.path.join(workdir, 'synthetic.poni')
+            ai.write(poni_file)
+
+        print(f"📂 Generating {args.files} single-frame and {args.files} x {args.frames}-frame "
+              f"files of {shape[0]}x{shape[1]} pixels in {workdir}")
+        single_pattern, multi_pattern = generate_dataset(workdir, ai, shape, args.files, args.frames)
+        frame_counts = {False: count_frames(single_pattern), True: count_frames(multi_pattern)}
+
+        results = []
+        print(f"\n{'scenario':<10}{'run':<16}{'seconds':>10}{'frames/s':>10}")
+        for group, label, overrides, multi in build_scenarios(args.scenarios, args.bins, args.max_workers):
+            seconds = run_scenario(poni_file, multi_pattern if multi else single_pattern,
+                                   os.path.join(workdir, 'out'), overrides, args.npt,
+                                   args.repeat, args.verbose)
+            frames = frame_counts[multi]
+            results.append({
+                'scenario': group,
+                'run': label,
+                'method': overrides.get('method', 'csr'),
+                'bins': len(overrides.get('bins') or []),
+                'formats': ','.join(overrides.get('formats', ['xy'])),
+                'workers': overrides.get('workers', 1),
+                'files': args.files,
+                'frames': frames,
+                'seconds': round(seconds, 4),
+                'frames_per_s': round(frames / seconds, 3),
+            })
+            print(f"{group:<10}{label:<16}{seconds:>10.3f}{frames / seconds:>10.1f}")
+
+        settings = {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'shape': list(shape),
+            'poni': args.poni or 'synthetic',
+            'files': args.files,
+            'frames_per_file': args.frames,
+            'npt': args.npt,
+            'repeat': args.repeat,
+            'cpu_count': multiprocessing.cpu_count(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pyFAI': pyFAI.version,
+            'h5py': h5py.__version__,
+        }
+        write_results(results, settings, args.output)
+        print(f"\n✓ Results written to {args.output}.json and {args.output}.csv")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -33,6 +33,7 @@ import numpy as np
 from gui_base import GUIBase
 from theme_module import ModernButton
 from custom_widgets import CustomSpinbox
+from mask_io import load_mask, MASK_EXTENSIONS, MASK_FILE_FILTER
 
 # Import Canvas classes (moved to separate file) with error handling
 try:
@@ -2238,35 +2239,28 @@ class CalibrateModule(GUIBase):
             if image_path.lower().endswith(('.h5', '.hdf5')):
                 try:
                     import h5py
+                    from h5_layout import resolve_layout
                     # Use 'r' mode with swmr=True for better performance if available
                     with h5py.File(image_path, 'r', swmr=False, rdcc_nbytes=1024**3) as f:
-                        # Try common HDF5 dataset paths
-                        dataset_paths = [
-                            'entry/data/data',
-                            'entry/instrument/detector/data',
-                            'data',
-                            'image',
-                        ]
+                        # Layout is discovered once per directory, later files are only validated
+                        try:
+                            layout = resolve_layout(f)
+                        except ValueError:
+                            layout = None
                         
-                        # Find first available dataset
-                        for path in dataset_paths:
-                            try:
-                                data = f[path]
-                                if len(data.shape) >= 2:
-                                    # Get first image if 3D stack, use direct array read for speed
-                                    if len(data.shape) == 3:
-                                        # Read only the first frame directly into numpy array
-                                        self.current_image = np.array(data[0, :, :], dtype=np.float32)
-                                    else:
-                                        # Read entire 2D array at once
-                                        self.current_image = np.array(data[:], dtype=np.float32)
-                                    self.log(f"Loaded HDF5 dataset: {path} (shape: {self.current_image.shape})")
-                                    break
-                            except KeyError:
-                                continue
+                        if layout is not None:
+                            data = f[layout.path]
+                            # Get first image if 3D stack, use direct array read for speed
+                            if len(layout.shape) == 3:
+                                # Read only the first frame directly into numpy array
+                                self.current_image = np.array(data[0, :, :], dtype=np.float32)
+                            else:
+                                # Read entire 2D array at once
+                                self.current_image = np.array(data[:], dtype=np.float32)
+                            self.log(f"Loaded HDF5 dataset: {layout.path} (shape: {self.current_image.shape})")
                         else:
-                            # If no standard path found, list available datasets
-                            self.log("Standard dataset paths not found. Available datasets:")
+                            # If no image dataset found, list available datasets
+                            self.log("No 2D image dataset found. Available datasets:")
                             def print_structure(name, obj):
                                 if isinstance(obj, h5py.Dataset):
                                     self.log(f"  {name}: {obj.shape}")
@@ -2591,19 +2585,16 @@ class CalibrateModule(GUIBase):
         """Load mask from file as fallback"""
         filename, _ = QFileDialog.getOpenFileName(
             None, "Load Mask", "",
-            "Mask Files (*.edf *.npy);;All Files (*.*)"
+            f"{MASK_FILE_FILTER};;All Files (*.*)"
         )
         
         if filename:
             try:
-                if filename.endswith('.npy'):
-                    mask = np.load(filename)
-                elif filename.endswith('.edf') and FABIO_AVAILABLE:
-                    mask_img = fabio.open(filename)
-                    mask = mask_img.data.astype(bool)
-                else:
+                ext = os.path.splitext(filename)[1].lower()
+                if ext not in MASK_EXTENSIONS or (ext not in ('.npz', '.npy') and not FABIO_AVAILABLE):
                     QMessageBox.warning(None, "Error", "Unsupported mask format")
                     return
+                mask = load_mask(filename)
                 
                 self.imported_mask = mask
                 masked_pixels = np.sum(mask)
@@ -7,6 +7,8 @@ Split from calibrate_module.py for better maintainability
 """
 
 import numpy as np
+from mask_shapes import rasterize_circle, rasterize_rectangle, rasterize_annulus, apply_region
+import mask_io
 
 # PyQt imports
 from PyQt6.QtCore import Qt
@@ -296,21 +298,12 @@ class MaskCanvas(FigureCanvas):
         if self.mask_data is None:
             return
         
-        x0, y0 = start
-        x1, y1 = end
-        
-        # Ensure correct order
-        x_min, x_max = sorted([int(x0), int(x1)])
-        y_min, y_max = sorted([int(y0), int(y1)])
-        
-        # Clip to image boundaries
-        x_min = max(0, x_min)
-        x_max = min(self.mask_data.shape[1] - 1, x_max)
-        y_min = max(0, y_min)
-        y_max = min(self.mask_data.shape[0] - 1, y_max)
+        # Corners in whole pixels, clipped to image boundaries
+        region = rasterize_rectangle((int(start[0]), int(start[1])), (int(end[0]), int(end[1])),
+                                     self.mask_data.shape)
         
         # Apply mask
-        self.mask_data[y_min:y_max+1, x_min:x_max+1] = self.mask_value
+        apply_region(self.mask_data, region, self.mask_value)
     
     def apply_circle_mask(self, center, edge):
         """Apply circular mask"""
@@ -321,14 +314,9 @@ class MaskCanvas(FigureCanvas):
         ex, ey = edge
         radius = np.sqrt((ex - cx)**2 + (ey - cy)**2)
         
-        # Create coordinate arrays
-        y, x = np.ogrid[:self.mask_data.shape[0], :self.mask_data.shape[1]]
-        
-        # Calculate distance from center
-        distance = np.sqrt((x - cx)**2 + (y - cy)**2)
-        
-        # Apply mask
-        self.mask_data[distance <= radius] = self.mask_value
+        # Apply mask within the circle's bounding box
+        region = rasterize_circle(cx, cy, radius, self.mask_data.shape)
+        apply_region(self.mask_data, region, self.mask_value)
     
     def reset_zoom(self):
         """Reset zoom to original view"""
@@ -359,14 +347,14 @@ class MaskCanvas(FigureCanvas):
     def save_mask(self, filename):
         """Save mask to file"""
         if self.mask_data is not None:
-            np.save(filename, self.mask_data)
+            mask_io.save_mask(filename, self.mask_data)
             return True
         return False
     
     def load_mask(self, filename):
         """Load mask from file"""
         try:
-            self.mask_data = np.load(filename)
+            self.mask_data = mask_io.load_mask(filename)
             self.display_image()
             return True
         except:
@@ -820,21 +808,12 @@ class CalibrationCanvas(FigureCanvas):
         if self.mask_data is None:
             return
         
-        x0, y0 = start
-        x1, y1 = end
-        
-        # Ensure correct order
-        x_min, x_max = sorted([int(x0), int(x1)])
-        y_min, y_max = sorted([int(y0), int(y1)])
-        
-        # Clip to image boundaries
-        x_min = max(0, x_min)
-        x_max = min(self.mask_data.shape[1] - 1, x_max)
-        y_min = max(0, y_min)
-        y_max = min(self.mask_data.shape[0] - 1, y_max)
+        # Corners in whole pixels, clipped to image boundaries
+        region = rasterize_rectangle((int(start[0]), int(start[1])), (int(end[0]), int(end[1])),
+                                     self.mask_data.shape)
         
         # Apply mask
-        self.mask_data[y_min:y_max+1, x_min:x_max+1] = self.mask_value
+        apply_region(self.mask_data, region, self.mask_value)
     
     def apply_circle_mask(self, center, edge):
         """Apply circular mask"""
@@ -845,14 +824,9 @@ class CalibrationCanvas(FigureCanvas):
         ex, ey = edge
         radius = np.sqrt((ex - cx)**2 + (ey - cy)**2)
         
-        # Create coordinate arrays
-        y, x = np.ogrid[:self.mask_data.shape[0], :self.mask_data.shape[1]]
-        
-        # Calculate distance from center
-        distance = np.sqrt((x - cx)**2 + (y - cy)**2)
-        
-        # Apply mask
-        self.mask_data[distance <= radius] = self.mask_value
+        # Apply mask within the circle's bounding box
+        region = rasterize_circle(cx, cy, radius, self.mask_data.shape)
+        apply_region(self.mask_data, region, self.mask_value)
     
     def get_mask(self):
         """Get current mask data"""
@@ -938,24 +912,23 @@ class CalibrationCanvas(FigureCanvas):
             # Define ring width (tolerance) - typically 2-5% of radius
             ring_width = max(5, radius * 0.03)  # At least 5 pixels
             
-            # Create polar coordinate arrays
-            y_coords, x_coords = np.ogrid[:self.image_data.shape[0], :self.image_data.shape[1]]
-            distances = np.sqrt((x_coords - center_x)**2 + (y_coords - center_y)**2)
-            
-            # Create ring mask
-            ring_mask = (distances >= radius - ring_width) & (distances <= radius + ring_width)
+            # Ring mask, restricted to the ring's bounding box
+            ring = rasterize_annulus(center_x, center_y, max(0.0, radius - ring_width),
+                                     radius + ring_width, self.image_data.shape)
+            if ring is None:
+                return []
             
             # Get intensities in ring region
-            ring_data = self.image_data.copy()
-            ring_data[~ring_mask] = 0
+            ring_data = np.zeros(ring.pixels.shape, dtype=self.image_data.dtype)
+            ring_data[ring.pixels] = self.image_data[ring.slices][ring.pixels]
             
             # Apply maximum filter to find local maxima
             footprint_size = 5  # Size of local region
             local_max = maximum_filter(ring_data, size=footprint_size)
             peaks_mask = (ring_data == local_max) & (ring_data > 0)
             
-            # Get peak coordinates
-            peak_coords = np.argwhere(peaks_mask)
+            # Get peak coordinates (image indices)
+            peak_coords = np.argwhere(peaks_mask) + (ring.slices[0].start, ring.slices[1].start)
             
             if len(peak_coords) == 0:
                 return []
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Input File Indexer
+Single-pass os.scandir walk replacing the repeated recursive glob passes of the
+batch integrators. Directory listings are cached on disk together with each
+directory's mtime, so a re-run only rescans directories whose content changed
+(one stat per unchanged directory instead of listing all of its entries).
+
+As in git's racy-timestamp rule, a listing is only reused when the directory
+mtime is at least RACY_SECONDS older than the scan that produced it: with
+coarse timestamps or NFS attribute caching a file added in the same tick as
+the scan leaves the mtime unchanged and would otherwise be missed until the
+directory changes again (e.g. during live acquisition).
+
+find_files() keeps the fallbacks of the old glob search:
+    1. the pattern as given ('dir/*.h5', 'dir/**/*.h5', 'dir/run_*')
+    2. the file name part searched recursively ('dir/*.h5' -> 'dir/**/*.h5')
+    3. every file with an accepted extension below the pattern's directory
+Results are sorted naturally (2GPa < 10GPa < 10.5GPa, run_9 < run_10).
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import fnmatch
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'xrd_file_index')
+
+# A listing scanned less than this long after the directory's last change is rescanned
+RACY_SECONDS = 2.0
+
+_MAGIC = re.compile(r'[*?[]')
+_NUMBER = re.compile(r'(\d+(?:\.\d+)?)')
+
+
+def natural_key(path):
+    """Sort key comparing embedded numbers by value, e.g. 9.5GPa < 10GPa < 10.5GPa"""
+    key = []
+    for i, part in enumerate(_NUMBER.split(path)):
+        if not part:
+            continue
+        # Numbers and text never compare against each other directly
+        key.append((0, float(part), '') if i % 2 else (1, 0.0, part.lower()))
+    return tuple(key)
+
+
+def split_pattern(pattern):
+    """
+    Split a user pattern into the directory to index and the relative glob
+
+    Returns:
+        tuple: (root directory, relative glob or None for "everything below root")
+    """
+    if os.path.isdir(pattern):
+        return pattern, None
+
+    parts = re.split(r'[\\/]+', pattern)
+    root_parts = []
+    for part in parts[:-1]:
+        if _MAGIC.search(part):
+            break
+        root_parts.append(part)
+    rel_parts = parts[len(root_parts):]
+
+    if not root_parts:
+        root = '.'
+    elif root_parts == ['']:
+        root = os.sep
+    else:
+        root = os.sep.join(root_parts) or os.sep
+        if re.fullmatch(r'[A-Za-z]:', root):
+            root += os.sep  # bare Windows drive
+    return root, '/'.join(rel_parts)
+
+
+def _match_parts(pattern_parts, path_parts):
+    """Match path components against glob components; '**' spans any number of directories"""
+    if not pattern_parts:
+        return not path_parts
+    head = pattern_parts[0]
+    if head == '**':
+        return any(_match_parts(pattern_parts[1:], path_parts[i:]) for i in range(len(path_parts) + 1))
+    return (bool(path_parts) and fnmatch.fnmatchcase(path_parts[0], head)
+            and _match_parts(pattern_parts[1:], path_parts[1:]))
+
+
+class FileIndexer:
+    """Directory listings cached with their mtimes"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+        """
+        Args:
+            cache_dir (str): Where listing caches are kept (one JSON file per root)
+            use_cache (bool): Read and write the on-disk listing cache
+        """
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.scanned_dirs = 0
+        self.cached_dirs = 0
+
+    def _cache_file(self, root):
+        digest = hashlib.sha1(os.path.abspath(root).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _load(self, root):
+        if not self.use_cache:
+            return {}
+        try:
+            with open(self._cache_file(root), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, root, listing):
+        if not self.use_cache:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._cache_file(root)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(listing, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # the cache is an optimization only
+
+    def scan(self, root, max_depth=None):
+        """
+        List every (non-hidden) file below root
+
+        Args:
+            root (str): Directory to index
+            max_depth (int, optional): Directory levels below root to descend (None = all)
+
+        Returns:
+            list: Relative paths ('sub/dir/file.h5', '/' separated)
+        """
+        listing = self._load(root)
+        changed = False
+        files = []
+        visited = set()
+        stack = [('', 0)]
+
+        while stack:
+            rel_dir, depth = stack.pop()
+            directory = os.path.join(root, rel_dir) if rel_dir else root
+            try:
+                stat = os.stat(directory)
+            except OSError:
+                continue
+            real = os.path.realpath(directory)
+            if real in visited:
+                continue  # symlink loop
+            visited.add(real)
+
+            entry = listing.get(rel_dir)
+            if (entry is not None and entry['mtime'] == stat.st_mtime_ns
+                    and entry.get('scanned', 0) - stat.st_mtime_ns >= RACY_SECONDS * 1e9):
+                self.cached_dirs += 1
+            else:
+                # Taken before listing: a file added during the scan makes the entry racy
+                scanned = time.time_ns()
+                names, subdirs = [], []
+                try:
+                    with os.scandir(directory) as it:
+                        for item in it:
+                            if item.name.startswith('.'):
+                                continue
+                            try:
+                                if item.is_dir():
+                                    subdirs.append(item.name)
+                                elif item.is_file():
+                                    names.append(item.name)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                entry = listing[rel_dir] = {'mtime': stat.st_mtime_ns, 'scanned': scanned,
+                                            'files': names, 'dirs': subdirs}
+                changed = True
+                self.scanned_dirs += 1
+
+            prefix = f"{rel_dir}/" if rel_dir else ''
+            files.extend(prefix + name for name in entry['files'])
+            if max_depth is None or depth < max_depth:
+                stack.extend((prefix + name, depth + 1) for name in entry['dirs'])
+
+        if changed:
+            self._save(root, listing)
+        return files
+
+
+def find_files(pattern, extensions=('.h5',), indexer=None):
+    """
+    Find input files for a user pattern (file glob or directory)
+
+    Args:
+        pattern (str): Directory, or glob such as /data/*.h5 or /data/**/run_*.h5
+        extensions (tuple): Accepted file extensions (case-insensitive)
+        indexer (FileIndexer, optional): Indexer to use (default: cached on disk)
+
+    Returns:
+        tuple: (naturally sorted list of paths, description of the search that matched)
+    """
+    indexer = indexer or FileIndexer()
+    extensions = tuple(ext.lower() for ext in extensions)
+    root, rel = split_pattern(pattern)
+
+    attempts = []
+    if rel is not None:
+        attempts.append(('pattern', rel))
+        name_pattern = rel.split('/')[-1]
+        if '**' not in rel:
+            attempts.append(('recursive pattern', f"**/{name_pattern}"))
+    attempts.append(('directory (recursive)', None))
+
+    for description, glob_pattern in attempts:
+        if glob_pattern is None:
+            rel_files = indexer.scan(root)
+            matched = rel_files
+        else:
+            # Split before normcase: ntpath.normcase turns '/' into '\\'
+            pattern_parts = [os.path.normcase(p) for p in glob_pattern.split('/') if p]
+            max_depth = None if '**' in pattern_parts else len(pattern_parts) - 1
+            rel_files = indexer.scan(root, max_depth)
+            matched = [f for f in rel_files
+                       if _match_parts(pattern_parts, [os.path.normcase(p) for p in f.split('/')])]
+
+        matched = [f for f in matched if f.lower().endswith(extensions)]
+        if matched:
+            paths = [os.path.join(root, *f.split('/')) for f in matched]
+            return sorted(paths, key=natural_key), description
+
+    return [], None
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Dark / Flat / Background Frame Correction
+Corrects detector frames in memory right before integration, instead of writing
+a corrected copy of every image first:
+
+    corrected = (raw - dark) / flat_norm - scale * background_corrected
+
+flat_norm is the dark-subtracted flat normalized to a mean of 1, and the
+background frame (e.g. an empty cell) is itself dark/flat corrected. The dark,
+flat and background stacks are averaged once; the correction is folded into a
+float32 gain and offset, so each frame costs one multiply and one subtract:
+
+    corrected = raw * gain - offset
+
+The gain/offset pair is cached as .npy files keyed by the reference files
+(path, size, mtime) and settings, and memory-mapped when large, so re-runs and
+worker processes never average the stacks again.
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+import h5py
+import fabio
+
+from h5_layout import resolve_layout
+
+
+# Cached arrays above this size are memory-mapped instead of loaded
+REFERENCE_MMAP_BYTES = 64 * 1024 ** 2
+
+
+def iter_reference_blocks(filename, dataset_path=None, chunk_size=16):
+    """
+    Yield the frames of a reference file as (n, rows, cols) blocks
+
+    Args:
+        filename (str): HDF5 (.h5/.hdf5/.nxs), .npy, or any fabio image (EDF, TIFF, ...)
+        dataset_path (str, optional): HDF5 dataset path (autodetected if None)
+        chunk_size (int): Frames per block for HDF5 stacks
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.h5', '.hdf5', '.nxs'):
+        with h5py.File(filename, 'r') as f:
+            data = f[dataset_path or resolve_layout(f).path]
+            if data.ndim == 2:
+                yield data[()][np.newaxis]
+                return
+            for start in range(0, data.shape[0], chunk_size):
+                yield data[start:start + chunk_size]
+    elif ext == '.npy':
+        data = np.load(filename, mmap_mode='r')
+        if data.ndim == 2:
+            yield data[np.newaxis]
+            return
+        for start in range(0, data.shape[0], chunk_size):
+            yield data[start:start + chunk_size]
+    else:
+        image = fabio.open(filename)
+        for index in range(image.nframes):
+            frame = image.data if image.nframes == 1 else image.getframe(index).data
+            yield np.asarray(frame)[np.newaxis]
+
+
+def average_frames(filename, dataset_path=None):
+    """
+    Average every frame of a reference file
+
+    Sums are accumulated in float64 block by block, so stacks of any length
+    are averaged with bounded memory.
+
+    Returns:
+        tuple: (float32 average image, number of frames)
+    """
+    total = None
+    count = 0
+    for block in iter_reference_blocks(filename, dataset_path):
+        block_sum = np.sum(block, axis=0, dtype=np.float64)
+        if total is None:
+            total = block_sum
+        else:
+            total += block_sum
+        count += len(block)
+    if not count:
+        raise ValueError(f"No frames found in reference file: {filename}")
+    return (total / count).astype(np.float32), count
+
+
+def _file_signature(filename):
+    if filename is None:
+        return None
+    stat = os.stat(filename)
+    return [os.path.abspath(filename), stat.st_size, stat.st_mtime_ns]
+
+
+class FrameCorrector:
+    """Dark, flat-field and background correction applied to frames in memory"""
+
+    def __init__(self, dark=None, flat=None, background=None, background_scale=1.0,
+                 dataset_path=None, cache_dir=None, mmap_bytes=REFERENCE_MMAP_BYTES, verbose=True):
+        """
+        Args:
+            dark (str, optional): Dark frame (stack) file
+            flat (str, optional): Flat-field frame (stack) file
+            background (str, optional): Background frame (stack) file, e.g. an empty cell
+            background_scale (float): Factor applied to the corrected background
+            dataset_path (str, optional): HDF5 dataset path of the reference files
+            cache_dir (str, optional): Directory of the cached gain/offset (None = no disk cache)
+            mmap_bytes (int): Cached arrays larger than this are memory-mapped
+            verbose (bool): Print a summary of the references
+        """
+        if dark is None and flat is None and background is None:
+            raise ValueError("FrameCorrector needs at least one of dark, flat or background")
+        for label, filename in (('Dark', dark), ('Flat', flat), ('Background', background)):
+            if filename is not None and not os.path.exists(filename):
+                raise FileNotFoundError(f"{label} file not found: {filename}")
+
+        self.dark_file = dark
+        self.flat_file = flat
+        self.background_file = background
+        self.background_scale = float(background_scale)
+        self.dataset_path = dataset_path
+        self.cache_dir = cache_dir
+        self.mmap_bytes = mmap_bytes
+        self.verbose = verbose
+
+        settings = {
+            'dark': _file_signature(dark),
+            'flat': _file_signature(flat),
+            'background': _file_signature(background),
+            'background_scale': self.background_scale,
+            'dataset_path': dataset_path,
+        }
+        self.digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+        self.gain, self.offset = self._load_cached()
+        if self.offset is None:
+            self.gain, self.offset = self._build()
+            self._store_cached()
+        elif verbose:
+            print(f"✓ Frame correction loaded from cache ({self.cache_dir})")
+
+    def options(self):
+        """Constructor arguments, to rebuild the corrector in a worker process"""
+        return {'dark': self.dark_file, 'flat': self.flat_file, 'background': self.background_file,
+                'background_scale': self.background_scale, 'dataset_path': self.dataset_path,
+                'cache_dir': self.cache_dir, 'mmap_bytes': self.mmap_bytes}
+
+    @property
+    def shape(self):
+        return self.offset.shape
+
+    @property
+    def bad_pixels(self):
+        """Pixels without a usable flat-field value (None without flat)"""
+        return None if self.gain is None else self.gain == 0
+
+    def _build(self):
+        """Average the reference stacks and fold them into gain and offset"""
+        references = {}
+        for label, filename in (('dark', self.dark_file), ('flat', self.flat_file),
+                                ('background', self.background_file)):
+            if filename is None:
+                continue
+            references[label], count = average_frames(filename, self.dataset_path)
+            if self.verbose:
+                print(f"✓ Averaged {count} {label} frame(s): {filename}")
+
+        shapes = {image.shape for image in references.values()}
+        if len(shapes) > 1:
+            raise ValueError(f"Reference frames have different shapes: {sorted(shapes)}")
+        shape = shapes.pop()
+
+        dark = references.get('dark')
+        gain = None
+        if 'flat' in references:
+            flat = references['flat']
+            if dark is not None:
+                flat -= dark
+            valid = np.isfinite(flat) & (flat > 0)
+            if not valid.any():
+                raise ValueError("Flat field has no positive pixels after dark subtraction")
+            gain = np.zeros(shape, dtype=np.float32)
+            gain[valid] = flat[valid].mean() / flat[valid]
+            if self.verbose and not valid.all():
+                print(f"⚠ Flat field: {np.count_nonzero(~valid)} pixels without signal will be masked")
+
+        # offset = dark * gain + scale * (background - dark) * gain
+        offset = np.zeros(shape, dtype=np.float32) if dark is None else dark.copy()
+        if 'background' in references:
+            background = references['background']
+            if dark is not None:
+                background -= dark
+            offset += self.background_scale * background
+        if gain is not None:
+            offset *= gain
+        return gain, offset
+
+    def _cache_path(self, name):
+        return os.path.join(self.cache_dir, f"correction_{self.digest}_{name}.npy")
+
+    def _load_cached(self):
+        if self.cache_dir is None or not os.path.exists(self._cache_path('offset')):
+            return None, None
+        try:
+            arrays = []
+            for name in ('gain', 'offset'):
+                path = self._cache_path(name)
+                if not os.path.exists(path):
+                    arrays.append(None)
+                    continue
+                mmap_mode = 'r' if os.path.getsize(path) > self.mmap_bytes else None
+                arrays.append(np.load(path, mmap_mode=mmap_mode))
+            return tuple(arrays)
+        except (OSError, ValueError):
+            return None, None
+
+    def _store_cached(self):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # offset is written last: its presence marks a complete entry
+        for name, array in (('gain', self.gain), ('offset', self.offset)):
+            if array is None:
+                continue
+            path = self._cache_path(name)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+
+    def apply(self, img_data):
+        """
+        Correct one frame
+
+        Writeable float32 frames are corrected in place; anything else is
+        converted to float32 once and corrected in that copy.
+
+        Args:
+            img_data (numpy.ndarray): Raw detector frame
+
+        Returns:
+            numpy.ndarray: Corrected float32 frame
+        """
+        if img_data.shape != self.offset.shape:
+            raise ValueError(f"Frame shape {img_data.shape} does not match the correction "
+                             f"references {self.offset.shape}")
+        if img_data.dtype == np.float32 and img_data.flags.writeable:
+            corrected = img_data
+        else:
+            corrected = img_data.astype(np.float32)
+        if self.gain is not None:
+            np.multiply(corrected, self.gain, out=corrected)
+        np.subtract(corrected, self.offset, out=corrected)
+        return corrected
@@ -5,7 +5,7 @@ Contains shared UI elements, color schemes, and utility methods
 """
 
 from PyQt6.QtWidgets import (QWidget, QLabel, QLineEdit, QVBoxLayout,
-                              QHBoxLayout, QFrame, QFileDialog, QDialog, QGroupBox)
+                              QHBoxLayout, QFrame, QFileDialog, QDialog, QGroupBox, QCheckBox)
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFont
 from batch_appearance import ModernButton
@@ -118,6 +118,44 @@ class GUIBase:
         """)
         return group
 
+    def create_option_checkbox(self, layout, text, attribute, invert=False):
+        """
+        Add a small checkbox bound to a boolean attribute of the module
+
+        Args:
+            layout: Layout receiving the checkbox
+            text (str): Checkbox label
+            attribute (str): Name of the boolean attribute kept in sync
+            invert (bool): Checking the box sets the attribute to False
+                           (e.g. "Rescan ..." turning a cache off)
+        """
+        checkbox = QCheckBox(text)
+        checkbox.setChecked(bool(getattr(self, attribute)) != invert)
+        checkbox.setFont(QFont('Arial', 9))
+        checkbox.setStyleSheet(f"""
+            QCheckBox {{
+                color: #666666;
+                background-color: {self.colors['card_bg']};
+            }}
+            QCheckBox::indicator {{
+                width: 10px;
+                height: 10px;
+                border: 1.5px solid #999999;
+                border-radius: 2px;
+                background-color: {self.colors['primary']};
+            }}
+            QCheckBox::indicator:checked {{
+                background-color: {self.colors['primary']};
+                border: 1.5px solid #999999;
+                border-radius: 2px;
+                image:url(check.png);
+            }}
+        """)
+        checkbox.stateChanged.connect(
+            lambda state: setattr(self, attribute, (state == Qt.CheckState.Checked.value) != invert))
+        layout.addWidget(checkbox)
+        return checkbox
+
     def create_file_picker(self, parent, label, variable, filetypes, pattern=False):
         """Create a file picker widget with browse button"""
         container = QWidget(parent)
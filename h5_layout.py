@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+HDF5 Layout Resolver
+Finds the detector image dataset of an HDF5 file. Every file of a beamtime
+series shares one layout, so the first file of a directory is inspected (common
+paths, then a full tree walk) and its dataset path, shape, dtype and chunking are
+cached. Later files of the same directory only get a cheap check of the cached
+path; the full discovery runs again only when that check fails.
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+import h5py
+
+
+# Probed in order before walking the whole tree
+COMMON_PATHS = [
+    '/entry/data/data',
+    '/entry/instrument/detector/data',
+    '/entry/data/image',
+    '/data/data',
+    '/data',
+    '/image',
+    'data',
+]
+
+H5Layout = namedtuple('H5Layout', ['path', 'shape', 'dtype', 'chunks'])
+
+
+def _is_image_dataset(obj):
+    return isinstance(obj, h5py.Dataset) and len(obj.shape) >= 2
+
+
+def find_image_dataset(h5_file_obj, candidate_paths=COMMON_PATHS):
+    """
+    Full discovery: probe the common paths, then walk the tree
+
+    Returns:
+        tuple: (path or None, walked) where walked tells whether the tree walk was needed
+    """
+    for path in candidate_paths:
+        if _is_image_dataset(h5_file_obj.get(path)):
+            return path, False
+
+    def walk(obj, path=''):
+        if _is_image_dataset(obj):
+            return path
+        if isinstance(obj, h5py.Group):
+            for key in obj.keys():
+                result = walk(obj[key], path + '/' + key)
+                if result:
+                    return result
+        return None
+
+    return walk(h5_file_obj), True
+
+
+class H5LayoutResolver:
+    """Per-directory cache of HDF5 image layouts"""
+
+    def __init__(self, candidate_paths=COMMON_PATHS, verbose=True):
+        """
+        Args:
+            candidate_paths (list): Dataset paths probed before a full tree walk
+            verbose (bool): Report layouts found by walking the tree
+        """
+        self.candidate_paths = candidate_paths
+        self.verbose = verbose
+        self.hits = 0
+        self.discoveries = 0
+        self._layouts = {}
+        self._lock = threading.Lock()
+
+    def _matches(self, h5_file_obj, layout):
+        """Cheap check that a file still has the cached layout"""
+        obj = h5_file_obj.get(layout.path)
+        # Frame counts differ between files of a series, detector size and dtype do not
+        return (_is_image_dataset(obj) and obj.shape[-2:] == layout.shape[-2:]
+                and obj.dtype == layout.dtype)
+
+    def resolve(self, h5_file_obj):
+        """
+        Layout of the image dataset of an open HDF5 file
+
+        Args:
+            h5_file_obj (h5py.File): Open file
+
+        Returns:
+            H5Layout: (path, shape, dtype, chunks) of this file's image dataset
+        """
+        directory = os.path.dirname(os.path.abspath(h5_file_obj.filename))
+        with self._lock:
+            cached = self._layouts.get(directory)
+        if cached is not None and self._matches(h5_file_obj, cached):
+            self.hits += 1
+            dataset = h5_file_obj[cached.path]
+            if dataset.shape == cached.shape:
+                return cached
+            return H5Layout(cached.path, dataset.shape, dataset.dtype, dataset.chunks)
+
+        path, walked = find_image_dataset(h5_file_obj, self.candidate_paths)
+        if path is None:
+            raise ValueError("No suitable image dataset found in HDF5 file")
+        if walked and self.verbose:
+            print(f"  Automatically found dataset: {path}")
+
+        dataset = h5_file_obj[path]
+        layout = H5Layout(path, dataset.shape, dataset.dtype, dataset.chunks)
+        with self._lock:
+            self._layouts[directory] = layout
+        self.discoveries += 1
+        return layout
+
+    def dataset_path(self, h5_file_obj):
+        """Path of the image dataset of an open HDF5 file"""
+        return self.resolve(h5_file_obj).path
+
+    def invalidate(self, directory=None):
+        """Forget the layout of one directory (or of all directories)"""
+        with self._lock:
+            if directory is None:
+                self._layouts.clear()
+            else:
+                self._layouts.pop(os.path.abspath(directory), None)
+
+
+# Shared by the integrators and dialogs of one process
+default_resolver = H5LayoutResolver()
+
+
+def resolve_layout(h5_file_obj):
+    """Resolve the image layout of an open file with the shared resolver"""
+    return default_resolver.resolve(h5_file_obj)
@@ -13,6 +13,7 @@ from PyQt6.QtGui import QFont
 import numpy as np
 import h5py
 import os
+from h5_layout import resolve_layout
 
 # Import matplotlib for image display
 try:
@@ -400,47 +401,21 @@ class H5PreviewDialog(QDialog):
 
         try:
             with h5py.File(file_path, 'r') as h5f:
-                # Try common dataset paths
-                dataset_paths = [
-                    'entry/data/data',
-                    'entry/instrument/detector/data',
-                    'data',
-                    'image'
-                ]
-
-                image_data = None
-                used_path = None
-
-                for path in dataset_paths:
-                    try:
-                        dataset = h5f[path]
-                        if len(dataset.shape) >= 2:
-                            # Handle multi-frame data (take first frame)
-                            if len(dataset.shape) == 3:
-                                image_data = dataset[0, :, :]
-                            else:
-                                image_data = dataset[:, :]
-                            used_path = path
-                            break
-                    except KeyError:
-                        continue
-
-                if image_data is None:
-                    # Try to find any 2D dataset
-                    for name in h5f:
-                        obj = h5f[name]
-                        if isinstance(obj, h5py.Dataset) and len(obj.shape) >= 2:
-                            if len(obj.shape) == 3:
-                                image_data = obj[0, :, :]
-                            else:
-                                image_data = obj[:, :]
-                            used_path = name
-                            break
-
-                if image_data is None:
+                # Layout is discovered once per directory, later files are only validated
+                try:
+                    layout = resolve_layout(h5f)
+                except ValueError:
                     QMessageBox.warning(self, "Error", "No valid 2D image dataset found in H5 file")
                     return
 
+                dataset = h5f[layout.path]
+                # Handle multi-frame data (take first frame)
+                if len(layout.shape) == 3:
+                    image_data = dataset[0, :, :]
+                else:
+                    image_data = dataset[:, :]
+                used_path = layout.path
+
                 self.current_image = np.array(image_data)
                 self.h5_file_path = file_path
 
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Pipelined Batch Integration
+Overlaps disk reads, pyFAI integration and output writing of a batch run:
+
+    reader thread --(frames)--> integrate thread --(files)--> writer threads
+
+Stages are joined by bounded queues, so at most `prefetch` frames and
+`write_queue_size` integrated files are held in memory at any time. Busy
+and idle time of every stage is collected and reported at the end of a run.
+When the run ends, also early (cancel, close()), every stage thread stops
+after its current item and is joined before run() returns.
+"""
+
+import time
+import queue
+import threading
+
+
+# Options of a batch task that are not integrate1d/bin settings
+_FILE_OPTIONS = ('dataset_path', 'frame_index', 'formats', 'return_patterns')
+
+# Queue sentinel: no more items
+_DONE = object()
+
+
+class StageStats:
+    """Busy/idle bookkeeping of one pipeline stage"""
+
+    def __init__(self, name, threads=1):
+        self.name = name
+        self.threads = threads
+        self.items = 0
+        self.busy = 0.0
+        self.idle = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, idle=0.0, items=0):
+        with self._lock:
+            self.busy += busy
+            self.idle += idle
+            self.items += items
+
+    def utilization(self):
+        total = self.busy + self.idle
+        return self.busy / total if total > 0 else 0.0
+
+
+class PipelinedExecutor:
+    """
+    Run integration tasks through read -> integrate -> write stages
+
+    The integrator's per-file building blocks are reused (_read_frames,
+    _integrate_frame, _finish_file), so outputs are identical to the serial
+    path. Results are yielded in task order like BatchIntegrator._run_tasks.
+    """
+
+    def __init__(self, integrator, prefetch=4, writer_threads=2, write_queue_size=None):
+        """
+        Args:
+            integrator (BatchIntegrator): Loaded integrator
+            prefetch (int): Frames the reader may read ahead of the integration
+            writer_threads (int): Threads running the output writers
+            write_queue_size (int, optional): Integrated files waiting for a writer
+                                              (default: 2 * writer_threads)
+        """
+        self.integrator = integrator
+        self.prefetch = max(1, int(prefetch))
+        self.writer_threads = max(1, int(writer_threads))
+        self.write_queue_size = write_queue_size or 2 * self.writer_threads
+        self.stats = [
+            StageStats('read'),
+            StageStats('integrate'),
+            StageStats('write', self.writer_threads),
+        ]
+        self.wall_time = 0.0
+
+    def run(self, tasks):
+        """
+        Integrate tasks [(h5_file, output_base, options), ...]
+
+        Yields:
+            tuple: (success, error_msg, patterns, output records, stage timings) per
+                   task, in task order; patterns are returned when the integrator has
+                   an open pattern store or collects patterns for the stacked plot
+        """
+        read_stats, integrate_stats, write_stats = self.stats
+        frame_queue = queue.Queue(maxsize=self.prefetch)
+        write_queue = queue.Queue(maxsize=self.write_queue_size)
+        results = {}
+        results_ready = threading.Condition()
+        stop_event = threading.Event()
+
+        def put(q, item, stats):
+            # Blocking put that gives up once the run is abandoned
+            start = time.perf_counter()
+            while not stop_event.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            stats.add(idle=time.perf_counter() - start)
+
+        def get(q, stats):
+            # Blocking get that returns _DONE once the run is abandoned: an early
+            # close() stops put() before the sentinel is queued
+            start = time.perf_counter()
+            item = _DONE
+            while not stop_event.is_set():
+                try:
+                    item = q.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    continue
+            stats.add(idle=time.perf_counter() - start)
+            return item
+
+        def publish(index, result):
+            with results_ready:
+                results[index] = result
+                results_ready.notify_all()
+
+        timer = self.integrator.timer
+
+        def reader():
+            for index, (h5_file, _, options) in enumerate(tasks):
+                frame_iter = self.integrator._read_frames(
+                    h5_file, options.get('dataset_path'), options.get('frame_index', 0), options.get('frames')
+                )
+                try:
+                    while not stop_event.is_set():
+                        start = time.perf_counter()
+                        try:
+                            with timer.file(h5_file):
+                                frame, img_data = next(frame_iter)
+                        except StopIteration:
+                            break
+                        finally:
+                            read_stats.add(busy=time.perf_counter() - start)
+                        read_stats.add(items=1)
+                        put(frame_queue, ('frame', index, frame, img_data), read_stats)
+                    put(frame_queue, ('end', index, None, None), read_stats)
+                except Exception as e:
+                    put(frame_queue, ('error', index, str(e), None), read_stats)
+                finally:
+                    # Closes the source file of a run stopped mid-file
+                    frame_iter.close()
+                if stop_event.is_set():
+                    break
+            put(frame_queue, _DONE, read_stats)
+
+        def integrate():
+            patterns, failed = {}, {}
+            while True:
+                item = get(frame_queue, integrate_stats)
+                if item is _DONE or stop_event.is_set():
+                    break
+                kind, index, frame, img_data = item
+                if kind == 'error':
+                    failed.setdefault(index, frame)
+                if index in failed:
+                    if kind != 'frame':
+                        patterns.pop(index, None)
+                        put(write_queue, (index, None, failed.pop(index)), integrate_stats)
+                    continue
+                if kind == 'end':
+                    put(write_queue, (index, patterns.pop(index, []), None), integrate_stats)
+                    continue
+
+                h5_file, _, options = tasks[index]
+                frame_options = {k: v for k, v in options.items() if k not in _FILE_OPTIONS}
+                start = time.perf_counter()
+                try:
+                    with timer.file(h5_file):
+                        patterns.setdefault(index, []).extend(
+                            self.integrator._integrate_frame(frame, img_data, **frame_options)
+                        )
+                except Exception as e:
+                    failed[index] = str(e)
+                integrate_stats.add(busy=time.perf_counter() - start, items=1)
+            for _ in range(self.writer_threads):
+                put(write_queue, _DONE, integrate_stats)
+
+        def writer():
+            return_patterns = (self.integrator.pattern_store is not None
+                               or self.integrator.plot_patterns is not None)
+            while True:
+                item = get(write_queue, write_stats)
+                if item is _DONE or stop_event.is_set():
+                    break
+                index, patterns, error_msg = item
+                h5_file, output_base, options = tasks[index]
+                if error_msg is not None:
+                    publish(index, (False, error_msg, None, None, timer.pop_file(h5_file)))
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    with timer.file(h5_file):
+                        records = self.integrator._finish_file(h5_file, output_base, patterns, **options)
+                    result = (True, None, patterns if return_patterns else None, records)
+                except Exception as e:
+                    result = (False, str(e), None, None)
+                write_stats.add(busy=time.perf_counter() - start, items=1)
+                # Reading and integration of the file are done once it reaches the writer
+                publish(index, result + (timer.pop_file(h5_file),))
+
+        threads = [threading.Thread(target=reader, name='pipeline-read', daemon=True),
+                   threading.Thread(target=integrate, name='pipeline-integrate', daemon=True)]
+        threads += [threading.Thread(target=writer, name=f'pipeline-write-{i}', daemon=True)
+                    for i in range(self.writer_threads)]
+
+        run_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            for index in range(len(tasks)):
+                with results_ready:
+                    while index not in results:
+                        results_ready.wait()
+                    result = results.pop(index)
+                self.wall_time = time.perf_counter() - run_start
+                yield result
+        finally:
+            stop_event.set()
+            # No stage may outlive the run: a writer still in _finish_file would
+            # write outputs after batch_integrate returned
+            for thread in threads:
+                thread.join()
+
+    def report(self):
+        """Print busy/idle time of every stage"""
+        print(f"\nPipeline stages (wall time {self.wall_time:.2f} s):")
+        print(f"  {'stage':<10}{'threads':>8}{'items':>8}{'busy (s)':>10}{'idle (s)':>10}{'busy %':>8}")
+        for stats in self.stats:
+            print(f"  {stats.name:<10}{stats.threads:>8}{stats.items:>8}{stats.busy:>10.2f}"
+                  f"{stats.idle:>10.2f}{stats.utilization() * 100:>7.0f}%")
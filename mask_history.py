@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Diff-Based Mask Undo History
+Undo/redo for the mask editor that stores each edit as the bounding box of
+the pixels it changed plus the XOR of old and new values in that box, packed
+to one bit per pixel. A brush stroke on a 16-Mpixel detector then costs a few
+bytes of history instead of a full 16 MB copy.
+
+The history keeps one reference copy of the mask (the state at the last
+checkpoint). checkpoint() is called before every edit, as update_deque was:
+it records whatever changed since the previous checkpoint as one step. Undo
+and redo XOR a step back into the mask and only touch its box.
+"""
+
+from collections import deque, namedtuple
+
+import numpy as np
+
+
+# Default memory budget of the undo + redo steps (bytes)
+DEFAULT_BUDGET = 64 * 1024 * 1024
+
+Delta = namedtuple('Delta', ['slices', 'shape', 'bits'])
+
+
+def _changed_box(old, new):
+    """(row slice, column slice) of the pixels that differ, or None"""
+    changed = old != new
+    rows = np.flatnonzero(changed.any(axis=1))
+    if rows.size == 0:
+        return None, None
+    cols = np.flatnonzero(changed[rows[0]:rows[-1] + 1].any(axis=0))
+    slices = slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1)
+    return slices, changed[slices]
+
+
+def _apply(mask, delta):
+    """Toggle the pixels of a delta (XOR), in place"""
+    region = mask[delta.slices]
+    flip = np.unpackbits(delta.bits, count=region.size).reshape(delta.shape).view(bool)
+    region[flip] = np.logical_not(region[flip])
+
+
+class MaskHistory:
+    """Undo/redo steps of one mask, within a memory budget"""
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        """
+        Args:
+            budget (int): Maximum bytes kept in undo + redo steps; the oldest
+                          undo steps are dropped first (the newest step is
+                          always kept)
+        """
+        self.budget = budget
+        self._undo = deque()
+        self._redo = deque()
+        self._bytes = 0
+        self._reference = None
+
+    @property
+    def nbytes(self):
+        """Bytes held by the steps (the reference copy not included)"""
+        return self._bytes
+
+    def clear(self):
+        """Forget all steps (new image or mask loaded)"""
+        self._undo.clear()
+        self._redo.clear()
+        self._bytes = 0
+        self._reference = None
+
+    def checkpoint(self, mask):
+        """
+        Record the changes made to mask since the last checkpoint as one step
+
+        Call before each edit.
+
+        Args:
+            mask (numpy.ndarray): Current mask
+        """
+        if mask is None:
+            return
+        if self._reference is None or self._reference.shape != mask.shape:
+            # No comparable state yet: start from here
+            self._reference = np.array(mask, dtype=bool)
+            return
+        slices, changed = _changed_box(self._reference, mask)
+        if slices is None:
+            return
+        self._push(self._undo, Delta(slices, changed.shape, np.packbits(changed, axis=None)))
+        self._clear_redo()
+        self._reference[slices] = mask[slices]
+
+    def undo(self, mask):
+        """
+        Revert the last step, in place
+
+        Returns:
+            tuple or None: (row slice, column slice) of the changed box, None
+                           when there is nothing to undo
+        """
+        return self._step(mask, self._undo, self._redo)
+
+    def redo(self, mask):
+        """
+        Re-apply the last undone step, in place
+
+        Returns:
+            tuple or None: Changed box, None when there is nothing to redo
+        """
+        return self._step(mask, self._redo, self._undo)
+
+    def _step(self, mask, source, target):
+        if mask is None:
+            return None
+        # Edits since the last checkpoint become a step of their own
+        self.checkpoint(mask)
+        if not source:
+            return None
+        delta = source.pop()
+        self._bytes -= delta.bits.nbytes
+        _apply(mask, delta)
+        self._reference[delta.slices] = mask[delta.slices]
+        self._push(target, delta, trim=False)
+        return delta.slices
+
+    def _push(self, steps, delta, trim=True):
+        steps.append(delta)
+        self._bytes += delta.bits.nbytes
+        if trim:
+            while self._bytes > self.budget and len(self._undo) > 1:
+                self._bytes -= self._undo.popleft().bits.nbytes
+
+    def _clear_redo(self):
+        self._bytes -= sum(delta.bits.nbytes for delta in self._redo)
+        self._redo.clear()
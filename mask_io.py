@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Mask File Input/Output
+One place that reads and writes mask files for the batch integrators, the
+mask editor and the calibration canvases.
+
+Besides .npy and fabio images (.edf, .tif, .png) masks can be stored in a
+compact format: a .npz archive holding the mask bit-packed (one bit per
+pixel) and deflate-compressed, together with its shape. A 4-Mpixel mask of a
+few beamstop/gap regions takes kilobytes instead of 4 MB and decodes with one
+np.unpackbits call.
+
+Decoded masks are cached per file (path, size and modification time), so a
+mask shared by hundreds of pressure points or pool workers is read and
+decoded once. Every caller gets its own copy: editors change masks in place
+and pyFAI rejects read-only mask buffers.
+"""
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Extension of the compact (bit-packed, compressed) mask format
+COMPACT_EXTENSION = '.npz'
+
+# Extensions accepted by load_mask / save_mask
+MASK_EXTENSIONS = ('.npz', '.npy', '.edf', '.tif', '.tiff', '.png')
+
+# File dialog filter listing every readable mask format
+MASK_FILE_FILTER = "Mask Files (*.npz *.npy *.edf *.tif *.tiff *.png)"
+
+# Decoded masks kept in memory
+CACHE_SIZE = 8
+
+_cache = OrderedDict()
+
+
+def encode_mask(mask):
+    """
+    Bit-pack a mask
+
+    Args:
+        mask (numpy.ndarray): Mask (nonzero = masked)
+
+    Returns:
+        tuple: (shape, packed bits as uint8)
+    """
+    mask = np.asarray(mask)
+    if mask.dtype != bool:
+        mask = mask != 0
+    return mask.shape, np.packbits(mask, axis=None)
+
+
+def decode_mask(shape, bits):
+    """Inverse of encode_mask: boolean mask of the given shape"""
+    shape = tuple(int(n) for n in shape)
+    count = int(np.prod(shape))
+    return np.unpackbits(bits, count=count).reshape(shape).view(bool)
+
+
+def _signature(filename):
+    stat = os.stat(filename)
+    return os.path.abspath(filename), stat.st_size, stat.st_mtime_ns
+
+
+def _read(filename):
+    """Decode a mask file (no cache)"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == COMPACT_EXTENSION:
+        with np.load(filename, allow_pickle=False) as archive:
+            if 'bits' in archive:
+                return decode_mask(archive['shape'], archive['bits'])
+            # Plain array archive (np.savez): use its first array
+            mask = archive[archive.files[0]]
+    elif ext == '.npy':
+        mask = np.load(filename, allow_pickle=False)
+    elif ext in ('.edf', '.tif', '.tiff', '.png'):
+        import fabio
+        mask = fabio.open(filename).data
+    else:
+        raise ValueError(f"Unsupported mask file format: {ext}")
+
+    if mask.dtype != bool:
+        mask = mask.astype(bool)
+    return mask
+
+
+def load_mask(filename):
+    """
+    Load a mask file of any supported format
+
+    Args:
+        filename (str): Mask file (.npz compact, .npy, .edf, .tif, .tiff, .png)
+
+    Returns:
+        numpy.ndarray: Boolean mask (True = masked), a copy of the cached one
+    """
+    key = _signature(filename)
+    mask = _cache.get(key)
+    if mask is None:
+        mask = _read(filename)
+        mask.setflags(write=False)
+        _cache[key] = mask
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(key)
+    return mask.copy()
+
+
+def save_mask(filename, mask):
+    """
+    Write a mask in the format given by the file extension
+
+    .npz is the compact format; .npy stores the boolean array; .edf and .tif
+    store it as uint8 images.
+
+    Args:
+        filename (str): Output file
+        mask (numpy.ndarray): Mask (nonzero = masked)
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == COMPACT_EXTENSION:
+        shape, bits = encode_mask(mask)
+        np.savez_compressed(filename, shape=np.asarray(shape, dtype=np.int64), bits=bits)
+    elif ext == '.npy':
+        np.save(filename, np.asarray(mask, dtype=bool))
+    elif ext in ('.edf', '.tif', '.tiff'):
+        import fabio
+        image_class = fabio.edfimage.edfimage if ext == '.edf' else fabio.tifimage.tifimage
+        image_class(data=np.asarray(mask).astype(np.uint8)).write(filename)
+    else:
+        raise ValueError(f"Unsupported mask file format: {ext}")
@@ -14,7 +14,11 @@ from PyQt6.QtGui import QFont
 import numpy as np
 import os
 from gui_base import GUIBase
-from collections import deque
+from mask_history import MaskHistory
+from mask_io import load_mask, save_mask, MASK_FILE_FILTER, COMPACT_EXTENSION
+from mask_overlay import MaskOverlay
+from mask_shapes import (rasterize_circle, rasterize_rectangle, rasterize_polygon,
+                         apply_region)
 
 # Import matplotlib for image display
 try:
@@ -48,9 +52,8 @@ class MaskModule(GUIBase):
         self.mask_file_path = None
         self.image_data = None
         
-        # Undo/Redo functionality (from Dioptas)
-        self._undo_deque = deque(maxlen=50)
-        self._redo_deque = deque(maxlen=50)
+        # Undo/Redo functionality (from Dioptas), stored as changed-region diffs
+        self.mask_history = MaskHistory()
         
         # Drawing mode and state
         self.draw_mode = 'circle'  # 'circle', 'rectangle', 'polygon', 'point'
@@ -60,6 +63,7 @@ class MaskModule(GUIBase):
         self.polygon_points = []
         self.temp_shape = None  # Temporary shape being drawn
         self.preview_artists = []  # Store preview shapes for faster update
+        self.polygon_artists = []  # Polygon vertices drawn so far
         
         # Performance optimization - cache computed image
         self.cached_image = None
@@ -68,7 +72,7 @@ class MaskModule(GUIBase):
         self.cached_vmax = None
         self.last_preview_update = 0  # Throttle preview updates
         self.display_downsample = 1  # Downsample factor for display
-        self.mask_artist = None  # Cache mask overlay artist for fast update
+        self.overlay = None  # Persistent image and mask overlay artists (MaskOverlay)
 
     def setup_ui(self):
         """Setup UI components"""
@@ -332,6 +336,7 @@ class MaskModule(GUIBase):
 
         # Initial plot
         self.ax = self.figure.add_subplot(111)
+        self.overlay = MaskOverlay(self.canvas, self.ax)
         self.ax.text(0.5, 0.5, 'Load an image to create mask\nUse drawing tools to mark regions',
                      ha='center', va='center', fontsize=14, color='gray')
         self.ax.set_xlim(0, 1)
@@ -703,34 +708,28 @@ class MaskModule(GUIBase):
 
     def update_deque(self):
         """
-        Saves the current mask data into a deque for undo/redo functionality
-        (From Dioptas implementation)
+        Records the mask edits since the last call as one undo step; call
+        before each edit (From Dioptas implementation)
         """
-        if self.current_mask is not None:
-            self._undo_deque.append(np.copy(self.current_mask))
-            self._redo_deque.clear()
+        self.mask_history.checkpoint(self.current_mask)
 
     def undo_mask(self):
         """Undo last mask operation (from Dioptas)"""
-        try:
-            old_data = self._undo_deque.pop()
-            self._redo_deque.append(np.copy(self.current_mask))
-            self.current_mask = old_data
-            self.update_display()
-            self.update_mask_statistics()
-        except IndexError:
+        dirty = self.mask_history.undo(self.current_mask)
+        if dirty is None:
             QMessageBox.information(self.root, "Info", "No more undo steps available")
+            return
+        self.update_mask_only(dirty)
+        self.update_mask_statistics()
 
     def redo_mask(self):
         """Redo last undone mask operation (from Dioptas)"""
-        try:
-            new_data = self._redo_deque.pop()
-            self._undo_deque.append(np.copy(self.current_mask))
-            self.current_mask = new_data
-            self.update_display()
-            self.update_mask_statistics()
-        except IndexError:
+        dirty = self.mask_history.redo(self.current_mask)
+        if dirty is None:
             QMessageBox.information(self.root, "Info", "No more redo steps available")
+            return
+        self.update_mask_only(dirty)
+        self.update_mask_statistics()
 
     def load_image(self):
         """Load diffraction image for mask creation - Optimized for h5"""
@@ -786,9 +785,8 @@ class MaskModule(GUIBase):
             # Initialize mask if not exists
             if self.current_mask is None or self.current_mask.shape != self.image_data.shape:
                 self.current_mask = np.zeros(self.image_data.shape, dtype=bool)
-                # Reset undo/redo deques on new image
-                self._undo_deque.clear()
-                self._redo_deque.clear()
+                # Reset undo/redo history on new image
+                self.mask_history.clear()
 
             # Clear cache on new image
             self.cached_image = None
@@ -824,25 +822,17 @@ class MaskModule(GUIBase):
             self.root,
             "Select Mask File",
             "",
-            "Mask Files (*.npy *.edf *.tif *.tiff);;All Files (*)"
+            f"{MASK_FILE_FILTER};;All Files (*)"
         )
 
         if not file_path:
             return
 
         try:
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == '.npy':
-                self.current_mask = np.load(file_path)
-            else:
-                import fabio
-                mask_img = fabio.open(file_path)
-                self.current_mask = mask_img.data.astype(bool)
+            self.current_mask = load_mask(file_path)
 
             # Reset undo/redo on mask load
-            self._undo_deque.clear()
-            self._redo_deque.clear()
+            self.mask_history.clear()
 
             self.mask_file_path = file_path
             self.mask_status_label.setText(f"Mask: {os.path.basename(file_path)}")
@@ -864,21 +854,16 @@ class MaskModule(GUIBase):
             self.root,
             "Save Mask",
             "",
-            "NumPy Array (*.npy);;EDF File (*.edf);;TIFF File (*.tif)"
+            "Compact Mask (*.npz);;NumPy Array (*.npy);;EDF File (*.edf);;TIFF File (*.tif)"
         )
 
         if not file_path:
             return
 
         try:
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == '.npy':
-                np.save(file_path, self.current_mask)
-            else:
-                import fabio
-                mask_img = fabio.edfimage.edfimage(data=self.current_mask.astype(np.uint8))
-                mask_img.write(file_path)
+            if not os.path.splitext(file_path)[1]:
+                file_path += COMPACT_EXTENSION
+            save_mask(file_path, self.current_mask)
 
             self.mask_file_path = file_path
             QMessageBox.information(self.root, "Success", f"Mask saved to:\n{file_path}")
@@ -1043,11 +1028,13 @@ class MaskModule(GUIBase):
         self.canvas.draw_idle()
 
     def update_display(self, force_recalc=False):
-        """Update image and mask display - Full redraw with caching and optimization"""
+        """Update image and mask display - persistent artists, full canvas redraw"""
         if self.image_data is None:
             return
 
-        self.ax.clear()
+        # Shapes drawn by the previous update
+        self._remove_artists(self.preview_artists)
+        self._remove_artists(self.polygon_artists)
         
         current_contrast = self.contrast_slider.value()
         
@@ -1093,28 +1080,18 @@ class MaskModule(GUIBase):
             self.cached_vmax = vmax
             self.display_downsample = downsample
         
-        # Display image with interpolation for smooth viewing
-        self.ax.imshow(img_display, cmap='viridis', origin='lower',
-                      interpolation='bilinear', vmin=vmin, vmax=vmax,
-                      extent=[0, self.image_data.shape[1],
-                             0, self.image_data.shape[0]])
+        # Image and mask overlay artists are created once per image, then updated in place
+        if self.overlay.set_image(img_display, vmin, vmax, self.image_data.shape,
+                                  self.display_downsample):
+            self.ax.set_xlim(0, self.image_data.shape[1])
+            self.ax.set_ylim(0, self.image_data.shape[0])
+            self.ax.set_xlabel('X (pixels)', fontsize=8)
+            self.ax.set_ylabel('Y (pixels)', fontsize=8)
+            self.ax.tick_params(axis='both', which='major', labelsize=5)
+            self.ax.grid(True, alpha=0.3, linestyle='--', linewidth=0.5)
 
-        # Overlay mask if exists - Pure red #FF0000 for better visibility
-        if self.current_mask is not None and np.any(self.current_mask):
-            from matplotlib.colors import ListedColormap
-            # Create pure red colormap #FF0000
-            # Index 0 = transparent (False), Index 1 = red (True)
-            pure_red = ListedColormap([(0, 0, 0, 0), (1, 0, 0, 1)])  # RGBA
-            
-            # Use mask directly as image data (0=False=transparent, 1=True=red)
-            mask_display = self.current_mask.astype(np.uint8)
-            self.mask_artist = self.ax.imshow(mask_display, cmap=pure_red, alpha=0.7, 
-                                             origin='lower',
-                                             extent=[0, self.image_data.shape[1],
-                                                    0, self.image_data.shape[0]], 
-                                             interpolation='nearest', 
-                                             vmin=0, vmax=1,  # Map 0->transparent, 1->red
-                                             zorder=10)
+        # Overlay mask - Pure red #FF0000 for better visibility
+        self.overlay.set_mask(self.current_mask)
 
         # Draw temporary shape being drawn
         self._draw_preview_shapes()
@@ -1122,21 +1099,22 @@ class MaskModule(GUIBase):
         # Draw polygon points
         if self.draw_mode == 'polygon' and len(self.polygon_points) > 0:
             points = np.array(self.polygon_points)
-            self.ax.plot(points[:, 0], points[:, 1], 'yo-', linewidth=2, markersize=8)
+            self.polygon_artists += self.ax.plot(points[:, 0], points[:, 1], 'yo-',
+                                                 linewidth=2, markersize=8)
             # Close polygon preview if more than 2 points
             if len(self.polygon_points) > 2:
-                self.ax.plot([points[-1, 0], points[0, 0]], 
-                           [points[-1, 1], points[0, 1]], 'y--', linewidth=2)
-
-        self.ax.set_xlim(0, self.image_data.shape[1])
-        self.ax.set_ylim(0, self.image_data.shape[0])
-        self.ax.set_xlabel('X (pixels)', fontsize=8)
-        self.ax.set_ylabel('Y (pixels)', fontsize=8)
-        self.ax.tick_params(axis='both', which='major', labelsize=5)
-        self.ax.grid(True, alpha=0.3, linestyle='--', linewidth=0.5)
+                self.polygon_artists += self.ax.plot([points[-1, 0], points[0, 0]],
+                                                     [points[-1, 1], points[0, 1]], 'y--', linewidth=2)
 
         self.canvas.draw_idle()
     
+    def _remove_artists(self, artists):
+        """Remove temporary artists from the axes and empty the list"""
+        while artists:
+            artist = artists.pop()
+            if artist.axes is not None:
+                artist.remove()
+    
     def _draw_preview_shapes(self):
         """Draw temporary preview shapes"""
         if self.drawing and self.draw_start and self.draw_current:
@@ -1146,6 +1124,7 @@ class MaskModule(GUIBase):
                 circle = Circle(self.draw_start, radius, fill=False, 
                               edgecolor='yellow', linewidth=2, linestyle='--')
                 self.ax.add_patch(circle)
+                self.preview_artists.append(circle)
             
             elif self.draw_mode == 'rectangle':
                 x1, y1 = self.draw_start
@@ -1155,35 +1134,25 @@ class MaskModule(GUIBase):
                 rect = Rectangle((x1, y1), width, height, fill=False,
                                edgecolor='yellow', linewidth=2, linestyle='--')
                 self.ax.add_patch(rect)
+                self.preview_artists.append(rect)
     
-    def update_mask_only(self):
-        """Ultra-fast mask overlay update without redrawing image"""
+    def update_mask_only(self, dirty=None):
+        """
+        Ultra-fast mask overlay update without redrawing image
+        
+        Args:
+            dirty (tuple, optional): (row slice, column slice) changed by the edit;
+                                     the whole mask if None
+        """
         if self.image_data is None or self.current_mask is None:
             return
+        if self.overlay.image_artist is None:
+            self.update_display()
+            return
         
-        # Remove old mask overlay artist if exists
-        if hasattr(self, 'mask_artist') and self.mask_artist:
-            try:
-                self.mask_artist.remove()
-            except:
-                pass
-        
-        # Draw only mask overlay with pure red #FF0000
-        from matplotlib.colors import ListedColormap
-        pure_red = ListedColormap([(0, 0, 0, 0), (1, 0, 0, 1)])  # RGBA
-        
-        # Use mask directly as image data (0=False=transparent, 1=True=red)
-        mask_display = self.current_mask.astype(np.uint8)
-        self.mask_artist = self.ax.imshow(mask_display, cmap=pure_red, alpha=0.7, 
-                                          origin='lower',
-                                          extent=[0, self.image_data.shape[1],
-                                                 0, self.image_data.shape[0]],
-                                          interpolation='nearest',
-                                          vmin=0, vmax=1,  # Map 0->transparent, 1->red
-                                          zorder=10)
-        
-        # Very fast update
-        self.canvas.draw_idle()
+        # Refresh the overlay over the changed pixels only, then blit
+        self.overlay.set_mask(self.current_mask, dirty)
+        self.overlay.blit(self.preview_artists)
     
     def update_preview_only(self):
         """Fast preview update without full redraw - for mouse move"""
@@ -1191,9 +1160,7 @@ class MaskModule(GUIBase):
             return
         
         # Remove old preview artists efficiently
-        while self.preview_artists:
-            artist = self.preview_artists.pop()
-            artist.remove()
+        self._remove_artists(self.preview_artists)
         
         # Draw new preview shapes
         if self.drawing and self.draw_start and self.draw_current:
@@ -1215,8 +1182,8 @@ class MaskModule(GUIBase):
                 self.ax.add_patch(rect)
                 self.preview_artists.append(rect)
         
-        # Use draw_idle for efficient update
-        self.canvas.draw_idle()
+        # Blit the previews over the cached background
+        self.overlay.blit(self.preview_artists)
 
     def on_mouse_move(self, event):
         """Handle mouse move event - optimized with throttling"""
@@ -1288,16 +1255,21 @@ class MaskModule(GUIBase):
         self.draw_current = (x, y)
         
         # Apply the shape
+        dirty = None
         if self.draw_mode == 'circle':
-            self.apply_circle_mask(self.draw_start, self.draw_current)
+            dirty = self.apply_circle_mask(self.draw_start, self.draw_current)
         elif self.draw_mode == 'rectangle':
-            self.apply_rectangle_mask(self.draw_start, self.draw_current)
+            dirty = self.apply_rectangle_mask(self.draw_start, self.draw_current)
         
         # Reset drawing state
         self.drawing = False
         self.draw_start = None
         self.draw_current = None
-        self.update_display()
+        self._remove_artists(self.preview_artists)
+        if dirty is not None:
+            self.update_mask_only(dirty)
+        else:
+            self.overlay.blit()
         self.update_mask_statistics()
     
     def apply_point_mask(self, x, y, radius=5):
@@ -1307,25 +1279,13 @@ class MaskModule(GUIBase):
         
         self.update_deque()
         
-        # Optimized: only check region around point
-        y_min = max(0, int(y - radius - 1))
-        y_max = min(self.current_mask.shape[0], int(y + radius + 2))
-        x_min = max(0, int(x - radius - 1))
-        x_max = min(self.current_mask.shape[1], int(x + radius + 2))
-        
-        # Create local grid
-        yy, xx = np.ogrid[y_min:y_max, x_min:x_max]
-        dist = np.sqrt((xx - x)**2 + (yy - y)**2)
-        mask_region = dist <= radius
-        
-        # Apply mask or unmask locally
-        if self.mask_radio.isChecked():
-            self.current_mask[y_min:y_max, x_min:x_max][mask_region] = True
-        else:
-            self.current_mask[y_min:y_max, x_min:x_max][mask_region] = False
+        # Only the bounding box of the brush is touched
+        region = rasterize_circle(x, y, radius, self.current_mask.shape)
+        dirty = apply_region(self.current_mask, region, self.mask_radio.isChecked())
         
         # Fast mask-only update instead of full redraw
-        self.update_mask_only()
+        if dirty is not None:
+            self.update_mask_only(dirty)
         self.update_mask_statistics()
     
     def apply_circle_mask(self, start, end):
@@ -1338,15 +1298,9 @@ class MaskModule(GUIBase):
         cx, cy = start
         radius = np.sqrt((end[0] - start[0])**2 + (end[1] - start[1])**2)
         
-        Y, X = np.ogrid[:self.current_mask.shape[0], :self.current_mask.shape[1]]
-        dist = np.sqrt((X - cx)**2 + (Y - cy)**2)
-        mask_region = dist <= radius
-        
-        # Apply mask or unmask
-        if self.mask_radio.isChecked():
-            self.current_mask[mask_region] = True
-        else:
-            self.current_mask[mask_region] = False
+        # Apply mask or unmask within the circle's bounding box
+        region = rasterize_circle(cx, cy, radius, self.current_mask.shape)
+        return apply_region(self.current_mask, region, self.mask_radio.isChecked())
     
     def apply_rectangle_mask(self, start, end):
         """Apply rectangular mask"""
@@ -1355,24 +1309,9 @@ class MaskModule(GUIBase):
         
         self.update_deque()
         
-        x1, y1 = start
-        x2, y2 = end
-        
-        # Ensure correct order
-        xmin, xmax = min(x1, x2), max(x1, x2)
-        ymin, ymax = min(y1, y2), max(y1, y2)
-        
-        # Clip to image bounds
-        xmin = max(0, xmin)
-        xmax = min(self.current_mask.shape[1] - 1, xmax)
-        ymin = max(0, ymin)
-        ymax = min(self.current_mask.shape[0] - 1, ymax)
-        
-        # Apply mask or unmask
-        if self.mask_radio.isChecked():
-            self.current_mask[ymin:ymax+1, xmin:xmax+1] = True
-        else:
-            self.current_mask[ymin:ymax+1, xmin:xmax+1] = False
+        # Apply mask or unmask (corners included, clipped to the image)
+        region = rasterize_rectangle(start, end, self.current_mask.shape)
+        return apply_region(self.current_mask, region, self.mask_radio.isChecked())
     
     def apply_polygon_mask(self):
         """Apply polygon mask"""
@@ -1381,24 +1320,9 @@ class MaskModule(GUIBase):
         
         self.update_deque()
         
-        from matplotlib.path import Path
-        
-        # Create polygon path
-        path = Path(self.polygon_points)
-        
-        # Create grid of points
-        ny, nx = self.current_mask.shape
-        x, y = np.meshgrid(np.arange(nx), np.arange(ny))
-        points = np.vstack((x.flatten(), y.flatten())).T
-        
-        # Check which points are inside polygon
-        mask_region = path.contains_points(points).reshape(ny, nx)
-        
-        # Apply mask or unmask
-        if self.mask_radio.isChecked():
-            self.current_mask[mask_region] = True
-        else:
-            self.current_mask[mask_region] = False
+        # Scanline fill of the polygon's bounding box
+        region = rasterize_polygon(self.polygon_points, self.current_mask.shape)
+        apply_region(self.current_mask, region, self.mask_radio.isChecked())
         
         # Clear polygon points
         self.polygon_points = []
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent Mask Overlay Rendering
+Keeps the detector image and the mask overlay as long-lived matplotlib
+artists instead of clearing the axes and re-running imshow on every edit.
+
+The overlay is an RGBA buffer at display resolution, split into tiles that
+are animated artists. A full canvas draw caches two backgrounds: the base
+(image, axes, grid) and the composite (base + overlay). A mask edit updates
+the buffer over its dirty rectangle, restores the base under that rectangle
+and redraws only the tiles it touches, so a brush stroke costs the same on
+any detector size. Shape previews are blitted over the composite.
+"""
+
+import numpy as np
+
+from matplotlib.transforms import Bbox
+
+
+# Overlay tile size (display pixels)
+TILE = 256
+
+
+class MaskOverlay:
+    """Image and tiled mask overlay artists of one axes"""
+
+    def __init__(self, canvas, ax, color=(255, 0, 0), alpha=0.7):
+        """
+        Args:
+            canvas: Matplotlib canvas holding ax
+            ax: Axes to draw in
+            color (tuple): Overlay RGB color (0-255)
+            alpha (float): Overlay opacity of masked pixels
+        """
+        self.canvas = canvas
+        self.ax = ax
+        self.color = color
+        self.alpha = int(round(alpha * 255))
+        self.image_artist = None
+        self.tiles = []             # [(row slice, col slice, artist)] of the RGBA buffer
+        self._image_source = None
+        self._rgba = None
+        self._shape = None
+        self._downsample = 1
+        self._base = None           # Cached background without the overlay
+        self._background = None     # Cached background with the overlay
+        self._dirty = None          # Frame box (r0, r1, c0, c1) changed since the last render
+        self._extra_artists = []
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def set_image(self, img_display, vmin, vmax, shape, downsample=1):
+        """
+        Show an image (already scaled for display) covering a detector frame
+
+        The artists are created on the first call and when the frame shape or
+        the display downsampling changes; otherwise only data and color limits
+        are updated.
+
+        Args:
+            img_display (numpy.ndarray): Display image (downsampled frame)
+            vmin, vmax (float): Color limits
+            shape (tuple): Detector frame shape (rows, cols)
+            downsample (int): Frame pixels per display pixel
+
+        Returns:
+            bool: True when the artists were (re)created (axes limits reset)
+        """
+        shape = tuple(shape)
+        if self.image_artist is not None and self._shape == shape and self._downsample == downsample:
+            if img_display is not self._image_source:
+                self.image_artist.set_data(img_display)
+                self._image_source = img_display
+            self.image_artist.set_clim(vmin, vmax)
+            return False
+
+        self.ax.clear()
+        self.image_artist = self.ax.imshow(img_display, cmap='viridis', origin='lower',
+                                           interpolation='bilinear', vmin=vmin, vmax=vmax,
+                                           extent=[0, shape[1], 0, shape[0]])
+        self._image_source = img_display
+        self._shape = shape
+        self._downsample = downsample
+        self._base = self._background = None
+        self._dirty = None
+
+        ds = downsample
+        rows, cols = -(-shape[0] // ds), -(-shape[1] // ds)
+        self._rgba = np.zeros((rows, cols, 4), dtype=np.uint8)
+        self._rgba[..., :3] = self.color
+        self.tiles = []
+        for r0 in range(0, rows, TILE):
+            for c0 in range(0, cols, TILE):
+                r1, c1 = min(r0 + TILE, rows), min(c0 + TILE, cols)
+                artist = self.ax.imshow(self._rgba[r0:r1, c0:c1], origin='lower',
+                                        extent=[c0 * ds, c1 * ds, r0 * ds, r1 * ds],
+                                        interpolation='nearest', zorder=10, animated=True)
+                self.tiles.append((slice(r0, r1), slice(c0, c1), artist))
+        # imshow of the tiles must not change the view of the frame
+        self.ax.set_xlim(0, shape[1])
+        self.ax.set_ylim(0, shape[0])
+        return True
+
+    def set_mask(self, mask, dirty=None):
+        """
+        Update the overlay from the mask, in place
+
+        Args:
+            mask (numpy.ndarray or None): Full-resolution mask (True = masked)
+            dirty (tuple, optional): (row slice, column slice) of the changed
+                                     pixels; the whole frame if None
+        """
+        if self._rgba is None:
+            return
+        ds = self._downsample
+        rows, cols = dirty if dirty is not None else (slice(0, self._shape[0]),
+                                                       slice(0, self._shape[1]))
+        r0, r1 = rows.start // ds, -(-rows.stop // ds)
+        c0, c1 = cols.start // ds, -(-cols.stop // ds)
+        if mask is None:
+            self._rgba[r0:r1, c0:c1, 3] = 0
+        else:
+            block = mask[r0 * ds:r1 * ds, c0 * ds:c1 * ds]
+            if ds > 1:
+                # A display pixel is masked when any frame pixel under it is
+                pad = ((0, (r1 - r0) * ds - block.shape[0]), (0, (c1 - c0) * ds - block.shape[1]))
+                if pad[0][1] or pad[1][1]:
+                    block = np.pad(block, pad)
+                block = block.reshape(r1 - r0, ds, c1 - c0, ds).any(axis=(1, 3))
+            self._rgba[r0:r1, c0:c1, 3] = np.where(block, self.alpha, 0)
+
+        for tile_rows, tile_cols, artist in self._tiles_in(r0, r1, c0, c1):
+            artist.set_data(self._rgba[tile_rows, tile_cols])
+        box = (r0 * ds, r1 * ds, c0 * ds, c1 * ds)
+        if self._dirty is not None:
+            box = (min(box[0], self._dirty[0]), max(box[1], self._dirty[1]),
+                   min(box[2], self._dirty[2]), max(box[3], self._dirty[3]))
+        self._dirty = box
+
+    def blit(self, extra_artists=()):
+        """
+        Bring the canvas up to date without a full draw: re-render the
+        overlay under the dirty rectangle, then blit with the animated extra
+        artists (shape previews) on top. Falls back to a full draw before the
+        first draw or on canvases without blitting.
+        """
+        self._extra_artists = list(extra_artists)
+        for artist in self._extra_artists:
+            artist.set_animated(True)
+        if self._background is None or not self.canvas.supports_blit:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        if self._dirty is not None:
+            self._render_dirty()
+            self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_extra()
+        self.canvas.blit(self.ax.bbox)
+
+    def _tiles_in(self, r0, r1, c0, c1):
+        """Tiles overlapping a box of the RGBA buffer"""
+        return [tile for tile in self.tiles
+                if tile[0].start < r1 and tile[0].stop > r0
+                and tile[1].start < c1 and tile[1].stop > c0]
+
+    def _render_dirty(self):
+        """Restore the base under the dirty box and redraw the tiles there"""
+        r0, r1, c0, c1 = self._dirty
+        self._dirty = None
+        (x0, y0), (x1, y1) = self.ax.transData.transform([(c0, r0), (c1, r1)])
+        box = Bbox.from_extents(min(x0, x1) - 2, min(y0, y1) - 2, max(x0, x1) + 2, max(y0, y1) + 2)
+        box = Bbox.intersection(box, self.ax.bbox)
+        if box is None:
+            return  # Outside the current view
+
+        # Whole pixels; the base region uses the buffer convention (origin top-left)
+        height = self.canvas.get_renderer().height
+        left, right = int(np.floor(box.x0)), int(np.ceil(box.x1))
+        top, bottom = int(height - np.ceil(box.y1)), int(height - np.floor(box.y0))
+        origin = self._base.get_extents()[:2]
+        self.canvas.restore_region(self._base, bbox=(left, top, right, bottom), xy=origin)
+
+        clip = Bbox.from_extents(left, height - bottom, right, height - top)
+        for _, _, artist in self._tiles_in_display(clip):
+            previous = artist.get_clip_box()
+            artist.set_clip_box(clip)
+            self.ax.draw_artist(artist)
+            artist.set_clip_box(previous)
+
+        # Agg clips images inclusively: put back the column and row just past the box
+        self.canvas.restore_region(self._background, bbox=(right, top, right + 1, bottom + 1), xy=origin)
+        self.canvas.restore_region(self._background, bbox=(left, bottom, right + 1, bottom + 1), xy=origin)
+
+    def _tiles_in_display(self, clip):
+        """Tiles whose screen area overlaps a display box"""
+        inverse = self.ax.transData.inverted()
+        (x0, y0), (x1, y1) = inverse.transform([(clip.x0, clip.y0), (clip.x1, clip.y1)])
+        ds = self._downsample
+        c0, c1 = sorted((x0, x1))
+        r0, r1 = sorted((y0, y1))
+        return self._tiles_in(int(np.floor(r0 / ds)), int(np.ceil(r1 / ds)),
+                              int(np.floor(c0 / ds)), int(np.ceil(c1 / ds)))
+
+    def _draw_extra(self):
+        for artist in self._extra_artists:
+            if artist.axes is self.ax:
+                self.ax.draw_artist(artist)
+
+    def _on_draw(self, event):
+        # Full draws skip animated artists: cache the base, add the overlay,
+        # cache the composite, then add the previews
+        if not self.tiles:
+            return
+        self._base = self.canvas.copy_from_bbox(self.ax.bbox)
+        for _, _, artist in self.tiles:
+            self.ax.draw_artist(artist)
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._dirty = None
+        self._draw_extra()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Bounding-Box Mask Shape Rasterization
+Rasterizes mask drawing shapes (circle, rectangle, polygon, annulus)
+on the pixels of the shape's bounding box only, so the cost follows the
+shape area rather than the detector size.
+
+Every rasterizer returns a Region: the (row, column) slices of the clipped
+bounding box and the boolean pixels of the shape inside it, or None when the
+shape lies outside the image. Pixel (row, col) has its centre at x=col, y=row,
+as in the mask tools. apply_region writes a region into a mask and returns the
+slices it touched (the dirty rectangle).
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+
+Region = namedtuple('Region', ['slices', 'pixels'])
+
+
+def _clip_box(x_min, x_max, y_min, y_max, shape):
+    """Integer pixel box [min, max] clipped to the image, as slices (None if empty)"""
+    x0 = max(0, int(np.ceil(x_min)))
+    x1 = min(shape[1] - 1, int(np.floor(x_max)))
+    y0 = max(0, int(np.ceil(y_min)))
+    y1 = min(shape[0] - 1, int(np.floor(y_max)))
+    if x0 > x1 or y0 > y1:
+        return None
+    return slice(y0, y1 + 1), slice(x0, x1 + 1)
+
+
+def _local_grid(slices):
+    """Pixel-centre coordinates of a box, as broadcastable (y, x) columns"""
+    rows, cols = slices
+    return np.ogrid[rows.start:rows.stop, cols.start:cols.stop]
+
+
+def rasterize_rectangle(start, end, shape):
+    """
+    Rectangle between two corners, both included
+
+    Args:
+        start (tuple): (x, y) of one corner
+        end (tuple): (x, y) of the opposite corner
+        shape (tuple): Image shape (rows, cols)
+    """
+    (x0, y0), (x1, y1) = start, end
+    slices = _clip_box(min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1), shape)
+    if slices is None:
+        return None
+    return Region(slices, np.ones((slices[0].stop - slices[0].start,
+                                   slices[1].stop - slices[1].start), dtype=bool))
+
+
+def rasterize_circle(cx, cy, radius, shape):
+    """Disc of pixels within radius of (cx, cy)"""
+    return rasterize_annulus(cx, cy, 0.0, radius, shape)
+
+
+def rasterize_annulus(cx, cy, inner, outer, shape):
+    """Ring of pixels with inner <= distance from (cx, cy) <= outer"""
+    slices = _clip_box(cx - outer, cx + outer, cy - outer, cy + outer, shape)
+    if slices is None:
+        return None
+    y, x = _local_grid(slices)
+    dist2 = (x - cx) ** 2 + (y - cy) ** 2
+    pixels = dist2 <= outer ** 2
+    if inner > 0:
+        pixels &= dist2 >= inner ** 2
+    return Region(slices, pixels)
+
+
+def rasterize_polygon(points, shape):
+    """
+    Polygon filled by scanline (even-odd rule)
+
+    Edge crossings are computed for every row of the bounding box at once and
+    turned into runs with a cumulative sum, so only the box is touched.
+
+    Args:
+        points (list): [(x, y), ...] vertices (at least 3)
+        shape (tuple): Image shape (rows, cols)
+    """
+    vertices = np.asarray(points, dtype=np.float64)
+    if len(vertices) < 3:
+        return None
+    xs, ys = vertices[:, 0], vertices[:, 1]
+    slices = _clip_box(xs.min(), xs.max(), ys.min(), ys.max(), shape)
+    if slices is None:
+        return None
+    rows, cols = slices
+    height, width = rows.stop - rows.start, cols.stop - cols.start
+
+    # Edges (x0, y0) -> (x1, y1); a row at y crosses an edge when y0 <= y < y1 (or reversed)
+    x0, y0 = xs, ys
+    x1, y1 = np.roll(xs, -1), np.roll(ys, -1)
+    y = np.arange(rows.start, rows.stop, dtype=np.float64)[:, np.newaxis]
+    crosses = ((y0 <= y) & (y < y1)) | ((y1 <= y) & (y < y0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    x_cross = np.where(crosses, x_cross, np.inf)
+    x_cross.sort(axis=1)
+
+    # Runs between crossing pairs: +1 where a run starts, -1 after it ends
+    counts = crosses.sum(axis=1)
+    edges = np.zeros((height, width + 1), dtype=np.int32)
+    row_index = np.arange(height)
+    for k in range(0, x_cross.shape[1] - 1, 2):
+        valid = counts > k + 1
+        if not valid.any():
+            break
+        left = np.clip(np.ceil(x_cross[valid, k]) - cols.start, 0, width).astype(np.intp)
+        right = np.clip(np.floor(x_cross[valid, k + 1]) - cols.start + 1, 0, width).astype(np.intp)
+        keep = left < right
+        np.add.at(edges, (row_index[valid][keep], left[keep]), 1)
+        np.add.at(edges, (row_index[valid][keep], right[keep]), -1)
+    pixels = np.cumsum(edges[:, :width], axis=1) > 0
+    return Region(slices, pixels)
+
+
+def apply_region(mask, region, value=True):
+    """
+    Set the pixels of a region in a mask
+
+    Args:
+        mask (numpy.ndarray): Mask, modified in place
+        region (Region or None): Rasterized shape
+        value: Value written to the shape pixels (True = masked)
+
+    Returns:
+        tuple or None: (row slice, column slice) of the touched box
+    """
+    if region is None:
+        return None
+    mask[region.slices][region.pixels] = value
+    return region.slices
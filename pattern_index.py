@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Pattern Metadata Index
+Sidecar CSV written next to the integration outputs, one row per output
+pattern, so downstream steps (stacked plots, peak fitting, volume
+calculation) look metadata up instead of re-parsing file names:
+
+    name, source_file, frames, pressure, is_unload, sector,
+    azimuth_start, azimuth_end, acquisition_time
+
+name is the output file name without extension (e.g. 10.5GPa_Bin001_0.0-10.0).
+azimuth_start/azimuth_end are the azimuthal range of the pattern in degrees
+(empty for full integration).
+Rows are appended as files complete; a pattern integrated again (re-run,
+resume) replaces its earlier row when the index is read or compacted.
+"""
+
+import os
+import csv
+from datetime import datetime
+
+import h5py
+
+
+INDEX_NAME = 'pattern_index.csv'
+# azimuth_start/azimuth_end in degrees
+COLUMNS = ['name', 'source_file', 'frames', 'pressure', 'is_unload', 'sector',
+           'azimuth_start', 'azimuth_end', 'acquisition_time']
+
+# HDF5 locations of the acquisition start time (NeXus and common detector layouts)
+_TIME_PATHS = ('entry/start_time', 'entry/instrument/detector/start_time', 'start_time')
+
+
+def acquisition_time(h5_file, h5_file_obj=None):
+    """
+    Acquisition time of a source file: the HDF5 start time when recorded,
+    the file modification time otherwise (ISO 8601)
+
+    Args:
+        h5_file (str): Source file
+        h5_file_obj (h5py.File, optional): The source file, already open for
+                                           reading; avoids opening it again
+    """
+    try:
+        if h5_file_obj is not None:
+            recorded = _recorded_time(h5_file_obj)
+        else:
+            with h5py.File(h5_file, 'r') as f:
+                recorded = _recorded_time(f)
+        if recorded is not None:
+            return recorded
+    except (OSError, KeyError):
+        pass
+    return datetime.fromtimestamp(os.path.getmtime(h5_file)).isoformat(timespec='seconds')
+
+
+def _recorded_time(f):
+    for path in _TIME_PATHS:
+        if path in f:
+            value = f[path][()]
+            return value.decode() if isinstance(value, bytes) else str(value)
+    for key in ('start_time', 'file_time'):
+        if key in f.attrs:
+            value = f.attrs[key]
+            return value.decode() if isinstance(value, bytes) else str(value)
+    return None
+
+
+def _parse_row(row):
+    def number(text):
+        return float(text) if text not in ('', None) else None
+    return {
+        'name': row['name'],
+        'source_file': row['source_file'],
+        'frames': [int(frame) for frame in row['frames'].split()],
+        'pressure': number(row['pressure']),
+        'is_unload': row['is_unload'] == '1',
+        'sector': row['sector'] or None,
+        'azimuth_start': number(row['azimuth_start']),
+        'azimuth_end': number(row['azimuth_end']),
+        'acquisition_time': row['acquisition_time'],
+    }
+
+
+def read_pattern_index(path):
+    """
+    Read an index (a file, or the directory containing pattern_index.csv)
+
+    Returns:
+        dict: {name: row}, see COLUMNS; the last row of a name wins. Empty
+              when there is no index.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, INDEX_NAME)
+    rows = {}
+    if not os.path.exists(path):
+        return rows
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                rows[row['name']] = _parse_row(row)
+            except (KeyError, ValueError, AttributeError):
+                continue  # torn last line of an interrupted run
+    return rows
+
+
+def find_pattern_index(path, levels=2):
+    """
+    Index of the patterns a result file was derived from
+
+    Looks in the directory of path and up to levels parent directories, e.g.
+    <output_dir>/fit_output/batch_fitting_results.csv finds
+    <output_dir>/pattern_index.csv.
+
+    Returns:
+        dict: {name: row}, empty when no index is found
+    """
+    directory = path if os.path.isdir(path) else os.path.dirname(os.path.abspath(path))
+    for _ in range(levels + 1):
+        if os.path.exists(os.path.join(directory, INDEX_NAME)):
+            return read_pattern_index(directory)
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    return {}
+
+
+def lookup(index, name):
+    """Row of a pattern name, also accepting file names with an output extension"""
+    row = index.get(name)
+    if row is None:
+        base, ext = os.path.splitext(os.path.basename(str(name)))
+        if ext.lower() in ('.xy', '.dat', '.chi', '.fxye', '.png', '.svg', '.txt'):
+            row = index.get(base)
+    return row
+
+
+class PatternIndex:
+    """Append-only writer of the pattern index of an output directory"""
+
+    def __init__(self, output_dir):
+        """
+        Args:
+            output_dir (str): Output directory of the integration run
+        """
+        self.path = os.path.join(output_dir, INDEX_NAME)
+        self._rows_written = 0
+        self._file = None
+        self._writer = None
+
+    def record(self, rows):
+        """
+        Append the rows of one source file
+
+        Args:
+            rows (list): [{column: value}, ...], see COLUMNS
+        """
+        if self._file is None:
+            self._open()
+        for row in rows:
+            self._writer.writerow(self._format(row))
+        self._file.flush()
+        self._rows_written += len(rows)
+
+    def _format(self, row):
+        def number(value):
+            return '' if value is None else f"{float(value):.6g}"
+        return [row['name'], row['source_file'], ' '.join(str(int(f)) for f in row['frames']),
+                number(row['pressure']), '1' if row['is_unload'] else '0', row.get('sector') or '',
+                number(row.get('azimuth_start')), number(row.get('azimuth_end')),
+                row.get('acquisition_time', '')]
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        torn = False
+        if not new_file:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) not in (b"\n", b"\r")
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        if torn:
+            self._file.write("\n")
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(COLUMNS)
+
+    def close(self):
+        """Close and drop rows replaced by later ones"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        rows = read_pattern_index(self.path)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            line_count = sum(1 for _ in f) - 1
+        if line_count > len(rows):
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                for row in rows.values():
+                    writer.writerow(self._format(row))
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Consolidated HDF5 Pattern Store
+Keeps every integrated 1D pattern of a run in a single HDF5 file instead of
+one small text file per pattern and format
+
+Layout:
+    /patterns/intensity     (n_patterns, npt) float32, chunked + compressed
+    /patterns/radial        (npt,) shared radial axis
+    /patterns/radial_rows   (n_patterns, npt) only if a pattern has its own axis
+    /patterns/name          output name of each pattern (e.g. 10.5GPa_Bin001_0.0-10.0)
+    /patterns/source_file   source HDF5 image file
+    /patterns/frame         frame index in the source file
+    /patterns/sector        sector/bin name ('' for full integration)
+    /patterns/pressure      pressure parsed from the filename (GPa)
+    /patterns/is_unload     True for unloading data ('d' prefix)
+"""
+
+import os
+import numpy as np
+import h5py
+
+
+GROUP = 'patterns'
+_STR = h5py.string_dtype(encoding='utf-8')
+
+# Per-pattern metadata datasets: name -> dtype
+_METADATA = {
+    'name': _STR,
+    'source_file': _STR,
+    'frame': np.int32,
+    'sector': _STR,
+    'pressure': np.float64,
+    'is_unload': np.bool_,
+}
+
+
+class PatternStore:
+    """Append-only writer for a consolidated HDF5 pattern file"""
+
+    def __init__(self, filename, mode='w', unit='2th_deg', chunk_rows=64, compression='gzip'):
+        """
+        Open (or create) a pattern store
+
+        Args:
+            filename (str): Path of the .h5 store
+            mode (str): 'w' to start a new store, 'a' to append to an existing one
+            unit (str): Radial unit, stored as attribute
+            chunk_rows (int): Patterns per HDF5 chunk (also the write buffer size)
+            compression (str): HDF5 compression filter ('gzip', 'lzf' or None)
+        """
+        self.filename = filename
+        self.unit = unit
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.file = h5py.File(filename, mode)
+        self.group = self.file.require_group(GROUP)
+        self.group.attrs.setdefault('unit', unit)
+        self._buffer = []
+
+    def __len__(self):
+        stored = self.group['intensity'].shape[0] if 'intensity' in self.group else 0
+        return stored + len(self._buffer)
+
+    def append(self, radial, intensity, name='', source_file='', frame=0, sector='',
+               pressure=np.nan, is_unload=False):
+        """
+        Append one pattern (buffered, written in blocks of chunk_rows)
+
+        Args:
+            radial (array): Radial axis of the pattern
+            intensity (array): Integrated intensity
+            name (str): Output name of the pattern
+            source_file (str): Source image file
+            frame (int): Frame index in the source file
+            sector (str): Sector/bin name
+            pressure (float): Pressure in GPa
+            is_unload (bool): Unloading data flag
+        """
+        self._buffer.append((
+            np.asarray(radial, dtype=np.float64),
+            np.asarray(intensity, dtype=np.float32),
+            {
+                'name': name,
+                'source_file': source_file,
+                'frame': frame,
+                'sector': sector or '',
+                'pressure': pressure,
+                'is_unload': is_unload,
+            },
+        ))
+        if len(self._buffer) >= self.chunk_rows:
+            self.flush()
+
+    def _create_datasets(self, npt, radial):
+        """Create the resizable datasets on first write"""
+        self.group.create_dataset(
+            'intensity', shape=(0, npt), maxshape=(None, npt), dtype=np.float32,
+            chunks=(self.chunk_rows, npt), compression=self.compression, shuffle=True
+        )
+        self.group.create_dataset('radial', data=radial)
+        for key, dtype in _METADATA.items():
+            self.group.create_dataset(
+                key, shape=(0,), maxshape=(None,), dtype=dtype, chunks=(max(self.chunk_rows, 256),)
+            )
+
+    def flush(self):
+        """Write buffered patterns to disk"""
+        if not self._buffer:
+            return
+
+        npt = len(self._buffer[0][1])
+        if 'intensity' not in self.group:
+            self._create_datasets(npt, self._buffer[0][0])
+
+        intensity_ds = self.group['intensity']
+        if any(len(row[1]) != intensity_ds.shape[1] for row in self._buffer):
+            raise ValueError(f"All patterns in {self.filename} must have {intensity_ds.shape[1]} points")
+
+        start = intensity_ds.shape[0]
+        stop = start + len(self._buffer)
+        intensity_ds.resize(stop, axis=0)
+        intensity_ds[start:stop] = np.stack([row[1] for row in self._buffer])
+
+        for key in _METADATA:
+            ds = self.group[key]
+            ds.resize(stop, axis=0)
+            ds[start:stop] = [row[2][key] for row in self._buffer]
+
+        # Patterns whose axis differs from the shared one (e.g. a sector with its
+        # own radial range) get a per-row axis, back-filled with the shared axis
+        shared = self.group['radial'][()]
+        own_axis = [not np.allclose(row[0], shared) for row in self._buffer]
+        if any(own_axis) or 'radial_rows' in self.group:
+            if 'radial_rows' not in self.group:
+                rows = self.group.create_dataset(
+                    'radial_rows', shape=(start, npt), maxshape=(None, npt), dtype=np.float64,
+                    chunks=(self.chunk_rows, npt), compression=self.compression
+                )
+                if start:
+                    rows[:] = np.broadcast_to(shared, (start, npt))
+            rows = self.group['radial_rows']
+            rows.resize(stop, axis=0)
+            rows[start:stop] = np.stack([row[0] for row in self._buffer])
+
+        self._buffer = []
+        # Hand the rows to the OS: a killed process keeps every flushed pattern
+        self.file.flush()
+
+    def copy_from(self, filename, source_files=None):
+        """
+        Append the patterns of another store
+
+        Args:
+            filename (str): Store to copy from
+            source_files (set, optional): Only copy patterns of these source files
+
+        Returns:
+            int: Number of copied patterns
+        """
+        copied = 0
+        with h5py.File(filename, 'r') as f:
+            group = f[GROUP]
+            if 'intensity' not in group:
+                return 0
+            metadata = {
+                key: group[key].asstr()[()] if h5py.check_string_dtype(group[key].dtype) else group[key][()]
+                for key in _METADATA
+            }
+            per_row_axis = 'radial_rows' in group
+            shared = group['radial'][()]
+            for i in range(len(metadata['name'])):
+                if source_files is not None and metadata['source_file'][i] not in source_files:
+                    continue
+                radial = group['radial_rows'][i] if per_row_axis else shared
+                self.append(radial, group['intensity'][i], **{key: metadata[key][i] for key in _METADATA})
+                copied += 1
+        return copied
+
+    def close(self):
+        """Flush and close the store"""
+        if self.file:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def is_pattern_store(filename):
+    """Check whether a file is a consolidated pattern store"""
+    try:
+        with h5py.File(filename, 'r') as f:
+            return GROUP in f and 'intensity' in f[GROUP]
+    except Exception:
+        return False
+
+
+def stored_sources(filename):
+    """
+    Count the stored patterns of every source file
+
+    Returns:
+        dict: source_file -> number of patterns; empty if the store is missing
+              or unreadable (e.g. left behind by a killed run)
+    """
+    try:
+        with h5py.File(filename, 'r') as f:
+            group = f[GROUP]
+            if 'intensity' not in group:
+                return {}
+            sources, counts = np.unique(group['source_file'].asstr()[()], return_counts=True)
+    except Exception:
+        return {}
+    return {str(source): int(count) for source, count in zip(sources, counts)}
+
+
+def merge_stores(filenames, target, unit='2th_deg'):
+    """
+    Merge pattern stores into one, later stores replacing the patterns of a source file
+
+    The merged store is written next to target and moved over it once closed,
+    so an interrupted merge leaves every input intact. Unreadable inputs are
+    treated as empty.
+
+    Args:
+        filenames (list): Stores to merge, oldest first (target may be one of them)
+        target (str): Path of the merged store
+        unit (str): Radial unit of a store created from scratch
+
+    Returns:
+        int: Number of patterns in the merged store
+    """
+    members = [set(stored_sources(filename)) for filename in filenames]
+    merged = target + '.merging'
+    with PatternStore(merged, mode='w', unit=unit) as store:
+        for i, filename in enumerate(filenames):
+            keep = members[i].difference(*members[i + 1:])
+            if keep:
+                store.copy_from(filename, keep)
+        count = len(store)
+    os.replace(merged, target)
+    return count
+
+
+def read_pattern_store(filename):
+    """
+    Read a whole pattern store into memory
+
+    Returns:
+        dict: 'radial' (npt,) or (n, npt), 'intensity' (n, npt), 'unit' and
+              one array per metadata field ('name', 'source_file', 'frame', ...)
+    """
+    with h5py.File(filename, 'r') as f:
+        group = f[GROUP]
+        data = {
+            'intensity': group['intensity'][()],
+            'radial': group['radial_rows'][()] if 'radial_rows' in group else group['radial'][()],
+            'unit': group.attrs.get('unit', '2th_deg'),
+        }
+        for key in _METADATA:
+            if h5py.check_string_dtype(group[key].dtype):
+                data[key] = group[key].asstr()[()]
+            else:
+                data[key] = group[key][()]
+    return data
+
+
+def iter_patterns(filename):
+    """
+    Iterate over the patterns of a store without loading it all at once
+
+    Yields:
+        tuple: (name, x, y) for every stored pattern
+    """
+    with h5py.File(filename, 'r') as f:
+        group = f[GROUP]
+        intensity = group['intensity']
+        names = group['name'].asstr()[()]
+        per_row_axis = 'radial_rows' in group
+        shared = group['radial'][()]
+        for i in range(intensity.shape[0]):
+            x = group['radial_rows'][i] if per_row_axis else shared
+            yield names[i], x, intensity[i]
+
+
+def default_store_path(output_dir):
+    """Default location of the pattern store of an output directory"""
+    return os.path.join(output_dir, 'patterns.h5')
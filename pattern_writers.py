@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk Text Writers for 1D Patterns
+Formats whole arrays with a single %-format call and writes each file in one
+buffered write, instead of one f.write per data point
+
+The row formats reproduce the legacy per-row writers byte for byte; run this
+module directly to check that and to benchmark every format:
+
+    python pattern_writers.py [npt] [repeats]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+
+def format_columns(columns, row_fmt):
+    """
+    Format equal-length columns as text
+
+    Args:
+        columns (sequence): 1D arrays, one per column
+        row_fmt (str): %-format of one row including the newline, e.g. "%.6f %.6f\\n"
+
+    Returns:
+        str: All rows as one string
+    """
+    data = np.column_stack(columns)
+    # tolist() gives Python floats, which format exactly like the numpy scalars
+    # the per-row writers used
+    return (row_fmt * data.shape[0]) % tuple(data.ravel().tolist())
+
+
+def row_format(fmt, n_columns, delimiter=' '):
+    """Row format of n_columns equal columns, like np.savetxt(fmt=fmt, delimiter=delimiter)"""
+    return delimiter.join([fmt] * n_columns) + "\n"
+
+
+def write_columns(filename, columns, row_fmt, header=''):
+    """
+    Write a header and equal-length columns to a text file in one write
+
+    Args:
+        filename (str): Output file
+        columns (sequence): 1D arrays, one per column
+        row_fmt (str): %-format of one row including the newline
+        header (str): Text written before the rows (including its newlines)
+    """
+    text = header + format_columns(columns, row_fmt)
+    with open(filename, 'w') as f:
+        f.write(text)
+
+
+def gsas_esd(y):
+    """ESD column of GSAS .fxye files: sqrt(y) for positive counts, 1.0 otherwise"""
+    y = np.asarray(y)
+    positive = y > 0
+    return np.where(positive, np.sqrt(np.where(positive, y, 1)), 1.0)
+
+
+def poisson_sigma(y):
+    """Poisson sigma with counts clipped to at least 1: sqrt(max(y, 1))"""
+    return np.sqrt(np.maximum(np.asarray(y), 1))
+
+
+# ---------- Benchmark ----------
+def _legacy_chi(filename, x, y):
+    with open(filename, 'w') as f:
+        f.write("# Chi file generated by pyFAI\n")
+        f.write("# 2theta (deg) Intensity\n")
+        for xi, yi in zip(x, y):
+            f.write(f"{xi:12.6f} {yi:16.6f}\n")
+
+
+def _bulk_chi(filename, x, y):
+    write_columns(filename, (x, y), "%12.6f %16.6f\n",
+                  header="# Chi file generated by pyFAI\n# 2theta (deg) Intensity\n")
+
+
+def _legacy_fxye(filename, x, y):
+    with open(filename, 'w') as f:
+        f.write("TITLE pyFAI integration\n")
+        for xi, yi in zip(x, y):
+            esd = np.sqrt(yi) if yi > 0 else 1.0
+            f.write(f"{xi:15.6f} {yi:15.6f} {esd:15.6f}\n")
+
+
+def _bulk_fxye(filename, x, y):
+    write_columns(filename, (x, y, gsas_esd(y)), "%15.6f %15.6f %15.6f\n",
+                  header="TITLE pyFAI integration\n")
+
+
+def _legacy_xy(filename, x, y):
+    np.savetxt(filename, np.column_stack((x, y)), fmt='%.6f')
+
+
+def _bulk_xy(filename, x, y):
+    write_columns(filename, (x, y), "%.6f %.6f\n")
+
+
+def _legacy_dat(filename, x, y):
+    with open(filename, 'w') as f:
+        f.write("# 2Theta   Intensity\n")
+        for xi, yi in zip(x, y):
+            f.write(f"{xi:.6f}  {yi:.6f}\n")
+
+
+def _bulk_dat(filename, x, y):
+    write_columns(filename, (x, y), "%.6f  %.6f\n", header="# 2Theta   Intensity\n")
+
+
+def _legacy_sigma_fxye(filename, x, y):
+    with open(filename, 'w') as f:
+        f.write("XYDATA\n")
+        for xi, yi in zip(x, y):
+            sigma = np.sqrt(max(yi, 1))
+            f.write(f"{xi:.6f}  {yi:.6f}  {sigma:.6f}\n")
+
+
+def _bulk_sigma_fxye(filename, x, y):
+    write_columns(filename, (x, y, poisson_sigma(y)), "%.6f  %.6f  %.6f\n", header="XYDATA\n")
+
+
+BENCHMARKS = {
+    'xy': (_legacy_xy, _bulk_xy),
+    'chi': (_legacy_chi, _bulk_chi),
+    'fxye': (_legacy_fxye, _bulk_fxye),
+    'dat (radial)': (_legacy_dat, _bulk_dat),
+    'fxye (radial)': (_legacy_sigma_fxye, _bulk_sigma_fxye),
+}
+
+
+def _time_writer(writer, filename, x, y, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        writer(filename, x, y)
+    return (time.perf_counter() - start) / repeats
+
+
+def run_benchmark(npt=2000, repeats=20):
+    """
+    Compare legacy per-row writers with the bulk writers
+
+    Checks byte identity of every format on a pattern with zeros, negative
+    values and a NaN, then prints per-format time and throughput.
+    """
+    rng = np.random.default_rng(0)
+    x = np.linspace(1.0, 30.0, npt)
+    y = (rng.gamma(2.0, 500.0, npt) - 50.0).astype(np.float32)
+    y[:5] = 0.0
+    y[5] = np.nan
+
+    print(f"Bulk writer benchmark: {npt} points, {repeats} repeats")
+    print(f"{'format':<15}{'legacy (ms)':>13}{'bulk (ms)':>11}{'speedup':>9}{'bulk rows/s':>14}  identical")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, (legacy, bulk) in BENCHMARKS.items():
+            legacy_file = os.path.join(tmp, 'legacy.txt')
+            bulk_file = os.path.join(tmp, 'bulk.txt')
+            legacy_time = _time_writer(legacy, legacy_file, x, y, repeats)
+            bulk_time = _time_writer(bulk, bulk_file, x, y, repeats)
+            with open(legacy_file, 'rb') as f1, open(bulk_file, 'rb') as f2:
+                identical = f1.read() == f2.read()
+            print(f"{fmt:<15}{legacy_time * 1e3:>13.2f}{bulk_time * 1e3:>11.2f}"
+                  f"{legacy_time / bulk_time:>8.1f}x{npt / bulk_time:>14.0f}  {'✓' if identical else '✗'}")
+
+
+if __name__ == "__main__":
+    run_benchmark(*(int(arg) for arg in sys.argv[1:3]))
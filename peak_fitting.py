@@ -5,6 +5,7 @@ from scipy.signal import find_peaks, peak_widths, savgol_filter
 import os
 import pandas as pd
 from scipy.special import wofz
+from pattern_store import is_pattern_store, iter_patterns
 
 # ---------- Voigt ----------
 def voigt(x, amplitude, center, sigma, gamma):
@@ -59,6 +60,26 @@ class BatchFitter:
             return
 
         filename = os.path.splitext(os.path.basename(file_path))[0]
+        return self.process_pattern(filename, x, y)
+
+    def process_store(self, store_path, skip=()):
+        """
+        Fit every pattern of a consolidated HDF5 pattern store
+
+        Args:
+            store_path (str): Pattern store (patterns.h5)
+            skip (set): Pattern names already fitted (e.g. from .xy files of the same run)
+        """
+        dfs = []
+        for name, x, y in iter_patterns(store_path):
+            if name in skip:
+                continue
+            df = self.process_pattern(name, np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+            if df is not None:
+                dfs.append(df)
+        return dfs
+
+    def process_pattern(self, filename, x, y):
         print(f"\n📄 Processing file: {filename}")
 
         # Find all peaks with width info
@@ -201,7 +222,11 @@ class BatchFitter:
 
     def run_batch_fitting(self):
         files = sorted(f for f in os.listdir(self.folder) if f.endswith(".xy"))
+        stores = sorted(f for f in os.listdir(self.folder)
+                        if f.endswith(".h5") and is_pattern_store(os.path.join(self.folder, f)))
         all_dfs = []
+        # Runs written as both .xy and patterns.h5 hold each pattern twice: fit it once
+        fitted = {os.path.splitext(fname)[0] for fname in files}
 
         for fname in files:
             fpath = os.path.join(self.folder, fname)
@@ -210,6 +235,11 @@ class BatchFitter:
                 all_dfs.append(df)
                 all_dfs.append(pd.DataFrame([[""] * len(df.columns)], columns=df.columns))  # add blank row
 
+        for fname in stores:
+            for df in self.process_store(os.path.join(self.folder, fname), skip=fitted):
+                all_dfs.append(df)
+                all_dfs.append(pd.DataFrame([[""] * len(df.columns)], columns=df.columns))  # add blank row
+
         if all_dfs:
             combined_df = pd.concat(all_dfs, ignore_index=True)
             combined_csv_path = os.path.join(self.save_dir, "all_results.csv")
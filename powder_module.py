@@ -27,8 +27,8 @@ TODO:
 from PyQt6.QtWidgets import (QWidget, QLabel, QVBoxLayout, QHBoxLayout, QPushButton,
                               QLineEdit, QTextEdit, QCheckBox, QComboBox, QGroupBox,
                               QFileDialog, QMessageBox, QFrame, QScrollArea, QRadioButton,
-                              QButtonGroup)
-from PyQt6.QtCore import Qt, QObject, pyqtSignal, QTimer
+                              QButtonGroup, QProgressBar)
+from PyQt6.QtCore import Qt, QObject, pyqtSignal
 from PyQt6.QtGui import QFont
 import threading
 import subprocess
@@ -39,6 +39,7 @@ from theme_module import CuteSheepProgressBar, ModernButton
 from custom_widgets import SpinboxStyleButton, CustomSpinbox
 from h5_preview_dialog import H5PreviewDialog
 from unified_config_dialog import UnifiedConfigDialog
+from progress_channel import ProgressServer, RateEstimator
 
 
 class WorkerSignals(QObject):
@@ -48,6 +49,13 @@ class WorkerSignals(QObject):
     progress = pyqtSignal(str)
 
 
+class IntegrationSignals(QObject):
+    """Signals from the integration subprocess reader threads"""
+    output = pyqtSignal(str)      # one stdout line
+    message = pyqtSignal(dict)    # one progress channel message
+    exited = pyqtSignal(int)      # return code
+
+
 class WorkerThread(threading.Thread):
     """Worker thread for background processing using Python threading"""
     
@@ -112,6 +120,8 @@ class PowderXRDModule(GUIBase):
         self.mask_path = ""
         self.input_pattern = ""
         self.output_dir = ""
+        self.index_cache = True  # Reuse cached directory listings (see file_index)
+        self.use_cache = True  # Reuse integrated patterns of unchanged files (see IntegrationCache)
         self.dataset_path = "entry/data/data"
         self.npt = 4000
         self.unit = '2θ (°)'
@@ -124,6 +134,7 @@ class PowderXRDModule(GUIBase):
         self.format_fxye = False
         self.format_svg = False
         self.format_png = False
+        self.format_h5 = False
 
         # Stacked plot options
         self.create_stacked_plot = False
@@ -174,6 +185,50 @@ class PowderXRDModule(GUIBase):
 
         self.progress = CuteSheepProgressBar(width=780, height=40, parent=prog_widget)  # Reduced height from 80 to 40
         prog_layout.addWidget(self.progress, alignment=Qt.AlignmentFlag.AlignCenter)
+
+        # File progress of a running batch (fed by the subprocess progress channel)
+        self.file_progress_row = QWidget()
+        self.file_progress_row.setStyleSheet(f"background-color: {self.colors['bg']};")
+        file_progress_layout = QHBoxLayout(self.file_progress_row)
+        file_progress_layout.setContentsMargins(0, 0, 0, 0)
+        file_progress_layout.setSpacing(10)
+
+        self.file_progress = QProgressBar()
+        self.file_progress.setFixedWidth(420)
+        self.file_progress.setFixedHeight(18)
+        self.file_progress.setTextVisible(False)
+        self.file_progress.setStyleSheet(f"""
+            QProgressBar {{
+                background-color: white;
+                border: 1px solid #CCCCCC;
+                border-radius: 4px;
+            }}
+            QProgressBar::chunk {{
+                background-color: {self.colors['secondary']};
+                border-radius: 3px;
+            }}
+        """)
+        file_progress_layout.addWidget(self.file_progress)
+
+        self.progress_label = QLabel("")
+        self.progress_label.setFont(QFont('Arial', 9))
+        self.progress_label.setMinimumWidth(240)
+        self.progress_label.setStyleSheet(f"color: {self.colors['text_dark']}; background-color: {self.colors['bg']};")
+        file_progress_layout.addWidget(self.progress_label)
+
+        self.cancel_btn = ModernButton(
+            "Cancel",
+            self.cancel_integration,
+            bg_color="#F8D7DA",
+            hover_color="#F1B0B7",
+            width=90, height=28,
+            font_size=9,
+            parent=self.file_progress_row
+        )
+        file_progress_layout.addWidget(self.cancel_btn)
+
+        self.file_progress_row.setVisible(False)
+        prog_layout.addWidget(self.file_progress_row, alignment=Qt.AlignmentFlag.AlignCenter)
         content_layout.addWidget(prog_widget)
 
         # Log area
@@ -352,6 +407,13 @@ class PowderXRDModule(GUIBase):
         self.create_folder_input(left_layout, "Output Directory:", "output_dir")
         self.create_text_input(left_layout, "Dataset Directory:", "dataset_path", placeholder="entry/data/data", with_browse=True)
 
+        # Cached directory listings can miss files still arriving from the detector
+        self.index_cache_cb = self.create_option_checkbox(
+            left_layout, "Rescan input folders (ignore file index cache)", 'index_cache', invert=True)
+        # Results are kept in <output>/.integration_cache, least recently used beyond its size limit dropped
+        self.use_cache_cb = self.create_option_checkbox(
+            left_layout, "Reuse cached results of unchanged files", 'use_cache')
+
         # Add Run Integration button centered
         run_int_btn_row = QWidget()
         run_int_btn_row.setStyleSheet(f"background-color: {self.colors['card_bg']};")
@@ -370,6 +432,19 @@ class PowderXRDModule(GUIBase):
         )
         run_int_btn.setFont(QFont('Arial', 9))
         run_int_btn_layout.addWidget(run_int_btn)
+        run_int_btn_layout.addSpacing(12)
+
+        # Live integration of a folder receiving new files (beamtime mode)
+        self.watch_btn = ModernButton(
+            "Watch Folder",
+            self.toggle_watch_mode,
+            bg_color=self.colors['secondary'],
+            hover_color=self.colors['primary_hover'],
+            width=170, height=36,
+            parent=run_int_btn_row
+        )
+        self.watch_btn.setFont(QFont('Arial', 9))
+        run_int_btn_layout.addWidget(self.watch_btn)
         run_int_btn_layout.addStretch()
 
         left_layout.addWidget(run_int_btn_row)
@@ -541,7 +616,8 @@ class PowderXRDModule(GUIBase):
         formats_row2_layout = QHBoxLayout(formats_row2)
         formats_row2_layout.setContentsMargins(0, 0, 0, 0)
         formats_row2_layout.setSpacing(20)
-        for key, label, default in [('fxye', '.fxye', False), ('svg', '.svg', False), ('png', '.png', False)]:
+        for key, label, default in [('fxye', '.fxye', False), ('svg', '.svg', False), ('png', '.png', False),
+                                    ('h5', '.h5 (one file)', False)]:
             cb = QCheckBox(label)
             cb.setChecked(default)
             cb.setFont(QFont('Arial', 9))
@@ -961,10 +1037,126 @@ class PowderXRDModule(GUIBase):
         """Show success dialog"""
         QMessageBox.information(self.root, title, message)
 
+    def _collect_formats(self):
+        """Collect the selected output formats"""
+        formats = []
+        if self.format_xy:
+            formats.append('xy')
+        if self.format_dat:
+            formats.append('dat')
+        if self.format_chi:
+            formats.append('chi')
+        if self.format_fxye:
+            formats.append('fxye')
+        if self.format_svg:
+            formats.append('svg')
+        if self.format_png:
+            formats.append('png')
+        if self.format_h5:
+            formats.append('h5')
+        
+        if not formats:
+            formats = ['xy']  # Default
+        
+        return formats
+    
+    def _pyfai_unit(self):
+        """Convert the selected unit name to pyFAI format"""
+        unit_map = {
+            '2θ (°)': '2th_deg',
+            'q (nm⁻¹)': 'q_nm^-1',
+            'q (A⁻¹)': 'q_A^-1',
+            'r (mm)': 'r_mm'
+        }
+        return unit_map.get(self.unit, '2th_deg')
+    
+    def _collect_sector_params(self):
+        """
+        Build integration sector parameters from the current configuration
+        
+        Returns:
+            tuple: (sector_kwargs, bins_param)
+        """
+        sector_kwargs = {}
+        bins_param = None
+
+        # Priority: bin_config (Single Sector) > sector_config (Multiple Sectors) > sector_params (H5 Preview)
+        if self.bin_config:
+            # Single Sector mode (from unified config dialog)
+            # Add angle average to bin names for stacked plot visualization
+            bins_param = []
+            for bin_data in self.bin_config:
+                bin_start = bin_data['start']
+                bin_end = bin_data['end']
+                angle_avg = (bin_start + bin_end) / 2.0
+
+                # Create new bin name with angle range for stacked plot identification
+                original_name = bin_data['name']
+                new_name = f"{original_name}_{bin_start:.1f}-{bin_end:.1f}"
+
+                bins_param.append({
+                    'name': new_name,
+                    'start': bin_start,
+                    'end': bin_end,
+                    'rad_min': bin_data.get('rad_min', 0.0),
+                    'rad_max': bin_data.get('rad_max', 0.0)
+                })
+
+            self.log(f"Using Single Sector mode: {len(bins_param)} bins configured")
+        elif self.sector_config:
+            # Multiple Sectors mode (from unified config dialog)
+            # Expand sectors into bins based on bin_size
+            bins_param = []
+            self.log(f"Using Multiple Sectors mode: {len(self.sector_config)} sectors configured")
+            for sector in self.sector_config:
+                sector_name = sector['name']
+                azim_start = sector['azim_start']
+                azim_end = sector['azim_end']
+                bin_size = sector.get('bin_size', 10.0)
+                rad_min = sector.get('rad_min', 0.0)
+                rad_max = sector.get('rad_max', 0.0)
+
+                # Calculate number of bins in this sector
+                num_bins = int((azim_end - azim_start) / bin_size)
+                self.log(f"  Sector '{sector_name}': {azim_start:.1f}° - {azim_end:.1f}° → {num_bins} bins ({bin_size}° each)")
+
+                # Generate bins for this sector
+                for i in range(num_bins):
+                    bin_start = azim_start + i * bin_size
+                    bin_end = min(azim_start + (i + 1) * bin_size, azim_end)
+                    angle_avg = (bin_start + bin_end) / 2.0
+
+                    # Include angle range in bin name for stacked plot visualization
+                    bin_name = f"{sector_name}_Bin{i+1:03d}_{bin_start:.1f}-{bin_end:.1f}"
+
+                    bins_param.append({
+                        'name': bin_name,
+                        'start': bin_start,
+                        'end': bin_end,
+                        'rad_min': rad_min,
+                        'rad_max': rad_max
+                    })
+
+            self.log(f"  Total bins generated: {len(bins_param)}")
+        elif self.sector_params:
+            # H5 Preview sector parameters
+            # Convert azimuthal angles from degrees to radians for pyFAI
+            import math
+            azim_start_rad = math.radians(self.sector_params['azim_start'])
+            azim_end_rad = math.radians(self.sector_params['azim_end'])
+            sector_kwargs['azimuth_range'] = (azim_start_rad, azim_end_rad)
+            self.log(f"Using H5 Preview sector: Azimuth {self.sector_params['azim_start']:.1f}° - {self.sector_params['azim_end']:.1f}°")
+        
+        return sector_kwargs, bins_param
+    
     # Functionality methods
     def run_integration(self):
         """Run batch integration using subprocess (isolated process)"""
         try:
+            if getattr(self, 'integration_process', None) is not None:
+                self.show_error("Error", "An integration is already running")
+                return
+
             # Validate inputs
             if not self.poni_path:
                 self.show_error("Error", "Please select a PONI file")
@@ -981,32 +1173,8 @@ class PowderXRDModule(GUIBase):
                 self.show_error("Error", f"PONI file not found: {self.poni_path}")
                 return
             
-            # Collect output formats
-            formats = []
-            if self.format_xy:
-                formats.append('xy')
-            if self.format_dat:
-                formats.append('dat')
-            if self.format_chi:
-                formats.append('chi')
-            if self.format_fxye:
-                formats.append('fxye')
-            if self.format_svg:
-                formats.append('svg')
-            if self.format_png:
-                formats.append('png')
-            
-            if not formats:
-                formats = ['xy']  # Default
-            
-            # Convert unit name to pyFAI format
-            unit_map = {
-                '2θ (°)': '2th_deg',
-                'q (nm⁻¹)': 'q_nm^-1',
-                'q (A⁻¹)': 'q_A^-1',
-                'r (mm)': 'r_mm'
-            }
-            unit_pyFAI = unit_map.get(self.unit, '2th_deg')
+            formats = self._collect_formats()
+            unit_pyFAI = self._pyfai_unit()
             
             # Log start
             self.log("="*60)
@@ -1023,75 +1191,19 @@ class PowderXRDModule(GUIBase):
             self.progress.start()
             
             # Prepare sector parameters if available
-            sector_kwargs = {}
-            bins_param = None
-
-            # Priority: bin_config (Single Sector) > sector_config (Multiple Sectors) > sector_params (H5 Preview)
-            if self.bin_config:
-                # Single Sector mode (from unified config dialog)
-                # Add angle average to bin names for stacked plot visualization
-                bins_param = []
-                for bin_data in self.bin_config:
-                    bin_start = bin_data['start']
-                    bin_end = bin_data['end']
-                    angle_avg = (bin_start + bin_end) / 2.0
-
-                    # Create new bin name with angle range for stacked plot identification
-                    original_name = bin_data['name']
-                    new_name = f"{original_name}_{bin_start:.1f}-{bin_end:.1f}"
-
-                    bins_param.append({
-                        'name': new_name,
-                        'start': bin_start,
-                        'end': bin_end,
-                        'rad_min': bin_data.get('rad_min', 0.0),
-                        'rad_max': bin_data.get('rad_max', 0.0)
-                    })
-
-                self.log(f"Using Single Sector mode: {len(bins_param)} bins configured")
-            elif self.sector_config:
-                # Multiple Sectors mode (from unified config dialog)
-                # Expand sectors into bins based on bin_size
-                bins_param = []
-                self.log(f"Using Multiple Sectors mode: {len(self.sector_config)} sectors configured")
-                for sector in self.sector_config:
-                    sector_name = sector['name']
-                    azim_start = sector['azim_start']
-                    azim_end = sector['azim_end']
-                    bin_size = sector.get('bin_size', 10.0)
-                    rad_min = sector.get('rad_min', 0.0)
-                    rad_max = sector.get('rad_max', 0.0)
-
-                    # Calculate number of bins in this sector
-                    num_bins = int((azim_end - azim_start) / bin_size)
-                    self.log(f"  Sector '{sector_name}': {azim_start:.1f}° - {azim_end:.1f}° → {num_bins} bins ({bin_size}° each)")
-
-                    # Generate bins for this sector
-                    for i in range(num_bins):
-                        bin_start = azim_start + i * bin_size
-                        bin_end = min(azim_start + (i + 1) * bin_size, azim_end)
-                        angle_avg = (bin_start + bin_end) / 2.0
-
-                        # Include angle range in bin name for stacked plot visualization
-                        bin_name = f"{sector_name}_Bin{i+1:03d}_{bin_start:.1f}-{bin_end:.1f}"
-
-                        bins_param.append({
-                            'name': bin_name,
-                            'start': bin_start,
-                            'end': bin_end,
-                            'rad_min': rad_min,
-                            'rad_max': rad_max
-                        })
-
-                self.log(f"  Total bins generated: {len(bins_param)}")
-            elif self.sector_params:
-                # H5 Preview sector parameters
-                # Convert azimuthal angles from degrees to radians for pyFAI
-                import math
-                azim_start_rad = math.radians(self.sector_params['azim_start'])
-                azim_end_rad = math.radians(self.sector_params['azim_end'])
-                sector_kwargs['azimuth_range'] = (azim_start_rad, azim_end_rad)
-                self.log(f"Using H5 Preview sector: Azimuth {self.sector_params['azim_start']:.1f}° - {self.sector_params['azim_end']:.1f}°")
+            sector_kwargs, bins_param = self._collect_sector_params()
+
+            # Progress arrives as JSON lines on a localhost socket, separate from the log
+            signals = IntegrationSignals()
+            signals.output.connect(self.log)
+            signals.message.connect(self._on_progress_message)
+            signals.exited.connect(self._on_integration_exit)
+            self.integration_signals = signals
+            self.progress_server = ProgressServer(signals.message.emit)
+            self.progress_rate = RateEstimator()
+            # Set by cancel_integration; the exit handler must not rely on the socket's 'done'
+            # message, which is not ordered with the end of stdout
+            self._cancel_requested = False
             
             # Create integration script for subprocess
             script = self._create_integration_script(
@@ -1106,32 +1218,47 @@ class PowderXRDModule(GUIBase):
                 create_stacked_plot=self.create_stacked_plot,
                 stacked_plot_offset=self.stacked_plot_offset,
                 sector_kwargs=sector_kwargs,
-                bins=bins_param
+                bins=bins_param,
+                index_cache=self.index_cache,
+                use_cache=self.use_cache,
+                progress_port=self.progress_server.port
             )
             
-            # Start subprocess
+            # Start subprocess (unbuffered, stderr merged so one reader drains everything)
             self.integration_process = subprocess.Popen(
-                [sys.executable, '-c', script],
+                [sys.executable, '-u', '-c', script],
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
                 text=True,
                 cwd=os.getcwd()
             )
             
             self.log("✓ Subprocess started successfully")
 
-            # Stop any existing timer first
-            if hasattr(self, 'check_timer') and self.check_timer:
-                self.check_timer.stop()
-                self.check_timer.deleteLater()
-
-            # Create new timer for checking subprocess status
-            self.check_timer = QTimer()
-            self.check_timer.timeout.connect(self._check_integration_status)
-            self.check_timer.start(500)  # Check every 500ms
+            # Drain stdout continuously: the log updates live and the pipe never fills up
+            process = self.integration_process
+            self.integration_output = []
+
+            def read_output():
+                for line in process.stdout:
+                    self.integration_output.append(line)
+                    if line.strip():
+                        signals.output.emit(line.rstrip())
+                signals.exited.emit(process.wait())
+
+            reader = threading.Thread(target=read_output, daemon=True)
+            self.running_threads.append(reader)
+            reader.start()
+
+            self.file_progress.setRange(0, 0)  # busy until the file count is known
+            self.progress_label.setText("Searching files...")
+            self.cancel_btn.setEnabled(True)
+            self.file_progress_row.setVisible(True)
             
         except Exception as e:
             self.progress.stop()
+            self._close_progress_channel()
+            self.integration_process = None
             self.log(f"❌ Error: {str(e)}")
             self.show_error("Error", f"Failed to start integration:\n{str(e)}")
     
@@ -1176,7 +1303,10 @@ try:
         formats={params['formats']},
         create_stacked_plot={params['create_stacked_plot']},
         stacked_plot_offset="{params['stacked_plot_offset']}",
-        disable_progress_bar=True{sector_kwargs_str}{bins_str}
+        disable_progress_bar=True,
+        use_cache={params['use_cache']},
+        index_cache={params['index_cache']},
+        progress_port={params['progress_port']}{sector_kwargs_str}{bins_str}
     )
     
     print("\\n\\n=== INTEGRATION_SUCCESS ===", flush=True)
@@ -1188,92 +1318,233 @@ except Exception as e:
     sys.exit(1)
 '''
     
-    def _check_integration_status(self):
-        """Check subprocess status periodically"""
+    def _on_progress_message(self, message):
+        """Update the file progress bar, rate and ETA from a progress channel message"""
+        rate = getattr(self, 'progress_rate', None)
+        if rate is None:
+            return
+        rate.update(message)
+        if message.get('event') in ('start', 'file') and rate.total:
+            self.file_progress.setRange(0, rate.total)
+            self.file_progress.setValue(rate.done)
+        self.progress_label.setText(rate.summary())
+
+    def cancel_integration(self):
+        """Ask the integration subprocess to stop after the current file"""
+        server = getattr(self, 'progress_server', None)
+        if server is None or getattr(self, 'integration_process', None) is None:
+            return
+        server.cancel()
+        self._cancel_requested = True
+        self.cancel_btn.setEnabled(False)
+        self.progress_label.setText(self.progress_label.text() + " · cancelling...")
+        self.log("⚠ Cancelling integration after the current file...")
+
+    def _close_progress_channel(self):
+        server = getattr(self, 'progress_server', None)
+        if server is not None:
+            server.close()
+        self.progress_server = None
+
+    def _on_integration_exit(self, returncode):
+        """Handle the end of the integration subprocess"""
         try:
-            if not hasattr(self, 'integration_process'):
-                # No process to check, stop timer
-                if hasattr(self, 'check_timer') and self.check_timer:
-                    self.check_timer.stop()
-                    self.progress.stop()
-                return
-
-            retcode = self.integration_process.poll()
-
-            if retcode is not None:
-                # Process has finished - stop timer and progress bar immediately
-                if hasattr(self, 'check_timer') and self.check_timer:
-                    self.check_timer.stop()
-                self.progress.stop()
-
-                try:
-                    stdout, stderr = self.integration_process.communicate(timeout=1)
-                except:
-                    stdout, stderr = "", ""
-
-                # Output complete stdout to console so users can see file search logs
-                if stdout:
-                    self.log("="*60)
-                    self.log("Subprocess Output:")
-                    self.log("="*60)
-                    for line in stdout.splitlines():
-                        if line.strip():  # Skip empty lines
-                            self.log(line)
-                    self.log("="*60)
-
-                if "INTEGRATION_SUCCESS" in stdout:
-                    self.log("✓ Integration completed successfully!")
-                    
-                    # Check if stacked plot was generated
-                    stacked_plot_generated = False
-                    azimuthal_plot_count = 0
-                    
-                    if "Azimuthal stacked plot generation completed" in stdout:
-                        stacked_plot_generated = True
-                        # Try to extract the number of plots generated
-                        import re
-                        match = re.search(r'Total plots generated:\s*(\d+)', stdout)
-                        if match:
-                            azimuthal_plot_count = int(match.group(1))
-                    elif "Stacked plot generation completed" in stdout:
-                        stacked_plot_generated = True
-                    elif "Stacked plot saved:" in stdout:
-                        stacked_plot_generated = True
-                    
-                    # Show appropriate success message
-                    if stacked_plot_generated:
-                        if azimuthal_plot_count > 0:
-                            message = f"Batch integration completed!\n\n✓ {azimuthal_plot_count} azimuthal stacked plot(s) generated successfully."
-                        else:
-                            message = "Batch integration completed!\n\n✓ Stacked plot(s) generated successfully."
+            self.progress.stop()
+            self._close_progress_channel()
+            self.cancel_btn.setEnabled(False)
+            self.file_progress_row.setVisible(False)
+
+            stdout = "".join(getattr(self, 'integration_output', []))
+            rate = getattr(self, 'progress_rate', None)
+            # A cancelled run still exits cleanly (INTEGRATION_SUCCESS): trust our own request
+            cancelled = getattr(self, '_cancel_requested', False)
+
+            if cancelled:
+                summary = f" ({rate.summary()})" if rate is not None else ""
+                self.log(f"⚠ Integration cancelled{summary}")
+            elif "INTEGRATION_SUCCESS" in stdout:
+                self.log("✓ Integration completed successfully!")
+                
+                # Check if stacked plot was generated
+                stacked_plot_generated = False
+                azimuthal_plot_count = 0
+                
+                if "Azimuthal stacked plot generation completed" in stdout:
+                    stacked_plot_generated = True
+                    # Try to extract the number of plots generated
+                    import re
+                    match = re.search(r'Total plots generated:\s*(\d+)', stdout)
+                    if match:
+                        azimuthal_plot_count = int(match.group(1))
+                elif "Stacked plot generation completed" in stdout:
+                    stacked_plot_generated = True
+                elif "Stacked plot saved:" in stdout:
+                    stacked_plot_generated = True
+                
+                # Show appropriate success message
+                if stacked_plot_generated:
+                    if azimuthal_plot_count > 0:
+                        message = f"Batch integration completed!\n\n✓ {azimuthal_plot_count} azimuthal stacked plot(s) generated successfully."
                     else:
-                        message = "Batch integration completed!"
-                    
-                    self.show_success("Integration Complete", message)
+                        message = "Batch integration completed!\n\n✓ Stacked plot(s) generated successfully."
                 else:
-                    self.log("❌ Integration failed or was interrupted")
-                    if stderr:
-                        # Show first 1000 chars of error
-                        error_preview = stderr[:1000]
-                        self.log(f"Error output:\n{error_preview}")
-                        if len(stderr) > 1000:
-                            self.log("... (error message truncated)")
-                    self.show_error("Error", "Integration failed. Check log for details.")
-
-                self.log("="*60)
+                    message = "Batch integration completed!"
+                
+                self.show_success("Integration Complete", message)
+            else:
+                # Error output was merged into stdout and is already in the log
+                self.log(f"❌ Integration failed or was interrupted (exit code {returncode})")
+                self.show_error("Error", "Integration failed. Check log for details.")
 
-                # Cleanup
-                del self.integration_process
+            self.log("="*60)
 
         except Exception as e:
-            # Error during status check - stop everything
-            self.log(f"⚠ Error checking integration status: {str(e)}")
-            if hasattr(self, 'check_timer') and self.check_timer:
-                self.check_timer.stop()
-            self.progress.stop()
-            if hasattr(self, 'integration_process'):
-                del self.integration_process
+            self.log(f"⚠ Error finishing integration: {str(e)}")
+        finally:
+            self.integration_process = None
+            self.progress_rate = None
+            self._cancel_requested = False
     
+    def toggle_watch_mode(self):
+        """Start or stop live integration of the input folder"""
+        if getattr(self, 'watch_process', None) is not None:
+            self.stop_watch_mode()
+            return
+
+        try:
+            if not self.poni_path or not os.path.exists(self.poni_path):
+                self.show_error("Error", "Please select a valid PONI file")
+                return
+            if not self.input_pattern:
+                self.show_error("Error", "Please specify the input folder to watch")
+                return
+            if not self.output_dir:
+                self.show_error("Error", "Please select output directory")
+                return
+
+            # Input may be a folder or a folder/pattern such as /data/*.h5
+            if os.path.isdir(self.input_pattern):
+                watch_dir, file_pattern = self.input_pattern, '*.h5'
+            else:
+                watch_dir, file_pattern = os.path.split(self.input_pattern)
+                file_pattern = file_pattern or '*.h5'
+            if not os.path.isdir(watch_dir):
+                self.show_error("Error", f"Folder not found: {watch_dir}")
+                return
+
+            sector_kwargs, bins_param = self._collect_sector_params()
+            script = self._create_watch_script(
+                poni_path=self.poni_path,
+                mask_path=self.mask_path if self.mask_path else "",
+                watch_dir=watch_dir,
+                file_pattern=file_pattern,
+                output_dir=self.output_dir,
+                dataset_path=self.dataset_path if self.dataset_path else "",
+                npt=self.npt,
+                unit=self._pyfai_unit(),
+                formats=self._collect_formats(),
+                create_stacked_plot=self.create_stacked_plot,
+                stacked_plot_offset=self.stacked_plot_offset,
+                sector_kwargs=sector_kwargs,
+                bins=bins_param,
+                use_cache=self.use_cache,
+                index_cache=self.index_cache
+            )
+
+            self.log("="*60)
+            self.log(f"Starting live integration of folder: {watch_dir} ({file_pattern})")
+
+            # stdout is read line by line by a thread, so new results show up immediately
+            self.watch_process = subprocess.Popen(
+                [sys.executable, '-u', '-c', script],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                cwd=os.getcwd()
+            )
+
+            signals = WorkerSignals()
+            signals.progress.connect(self.log)
+            signals.finished.connect(self._on_watch_finished)
+            self.watch_signals = signals
+
+            process = self.watch_process
+
+            def read_output():
+                for line in process.stdout:
+                    if line.strip():
+                        signals.progress.emit(line.rstrip())
+                process.wait()
+                signals.finished.emit(f"Watch process exited with code {process.returncode}")
+
+            reader = threading.Thread(target=read_output, daemon=True)
+            self.running_threads.append(reader)
+            reader.start()
+
+            self.watch_btn.setText("Stop Watching")
+            self.progress.start()
+
+        except Exception as e:
+            self.log(f"❌ Error: {str(e)}")
+            self.show_error("Error", f"Failed to start watch mode:\n{str(e)}")
+
+    def stop_watch_mode(self):
+        """Ask the watch subprocess to finish the current file and exit"""
+        process = getattr(self, 'watch_process', None)
+        if process is None:
+            return
+        self.log("Stopping live integration...")
+        try:
+            process.stdin.write("stop\n")
+            process.stdin.flush()
+        except Exception:
+            process.terminate()
+
+    def _on_watch_finished(self, message):
+        """Handle end of the watch subprocess"""
+        self.progress.stop()
+        self.log(message)
+        self.log("="*60)
+        self.watch_process = None
+        self.watch_btn.setText("Watch Folder")
+
+    def _create_watch_script(self, **params):
+        """Create Python script running live folder integration in a subprocess"""
+        def escape(s):
+            return s.replace('\\', '\\\\').replace('"', '\\"') if s else ""
+
+        sector_kwargs = params.get('sector_kwargs', {})
+        sector_kwargs_str = ", sector_kwargs=" + str(sector_kwargs) if sector_kwargs else ""
+        bins = params.get('bins', None)
+        bins_str = ", bins=" + str(bins) if bins else ""
+
+        return f'''
+import sys
+import os
+
+sys.path.insert(0, "{escape(os.path.dirname(os.path.abspath(__file__)))}")
+
+from batch_integration import run_watch_integration
+
+run_watch_integration(
+    poni_file="{escape(params['poni_path'])}",
+    mask_file="{escape(params['mask_path'])}" if "{escape(params['mask_path'])}" else None,
+    watch_dir="{escape(params['watch_dir'])}",
+    output_dir="{escape(params['output_dir'])}",
+    dataset_path="{escape(params['dataset_path'])}" if "{escape(params['dataset_path'])}" else None,
+    npt={params['npt']},
+    unit="{params['unit']}",
+    formats={params['formats']},
+    create_stacked_plot={params['create_stacked_plot']},
+    stacked_plot_offset="{params['stacked_plot_offset']}",
+    file_pattern="{escape(params['file_pattern'])}",
+    use_cache={params['use_cache']},
+    index_cache={params['index_cache']},
+    stop_on_stdin=True{sector_kwargs_str}{bins_str}
+)
+'''
+
     def _on_integration_finished(self, message):
         """Handle integration completion"""
         self.progress.stop()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Preview Rendering for Integrated Patterns
+Renders the per-pattern PNG/SVG previews of a batch run with one reusable Agg
+figure: only the line data, x label and limits change between patterns, so no
+figure, axes or artist is rebuilt per file.
+
+Modes:
+    'full'       10 x 6 in figure, PNG at 300 dpi (the original previews)
+    'thumbnail'  5 x 3 in figure, PNG at 72 dpi (cheap previews for every file)
+
+PreviewPool renders in separate processes so plotting overlaps integration.
+Run this module directly to benchmark the renderers:
+
+    python preview_renderer.py [n_patterns]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from collections import deque
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+PREVIEW_MODES = {
+    'full': {'figsize': (10, 6), 'dpi': 300, 'layout': None},
+    # Small figures need the tight layout to keep the axis labels on the canvas
+    'thumbnail': {'figsize': (5, 3), 'dpi': 72, 'layout': 'tight'},
+}
+
+
+class PreviewRenderer:
+    """One Agg figure and line artist reused for every rendered pattern"""
+
+    def __init__(self, mode='full', dpi=None, title='Integrated Diffraction Pattern'):
+        """
+        Args:
+            mode (str): 'full' or 'thumbnail', see PREVIEW_MODES
+            dpi (int, optional): PNG resolution overriding the mode default
+            title (str): Axes title
+        """
+        if mode not in PREVIEW_MODES:
+            raise ValueError(f"Unknown preview mode '{mode}', expected one of {list(PREVIEW_MODES)}")
+        settings = PREVIEW_MODES[mode]
+        self.mode = mode
+        self.dpi = dpi or settings['dpi']
+        self.rendered = 0
+
+        self.figure = Figure(figsize=settings['figsize'], layout=settings['layout'])
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.line, = self.ax.plot([], [], 'b-', linewidth=1)
+        self.ax.set_ylabel('Intensity')
+        self.ax.set_title(title)
+        self.ax.grid(True, alpha=0.3)
+
+    def render(self, x, y, filename, fmt='png', xlabel='2θ (deg)'):
+        """
+        Render one pattern to a file
+
+        Args:
+            x, y (array): Pattern data
+            filename (str): Output file
+            fmt (str): 'png' or 'svg'
+            xlabel (str): Label of the radial axis
+        """
+        self.line.set_data(x, y)
+        self.ax.set_xlabel(xlabel)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        # Vector output keeps the figure's own dpi, as pyplot did
+        self.figure.savefig(filename, format=fmt, dpi=self.dpi if fmt == 'png' else None)
+        self.rendered += 1
+
+
+# Renderer owned by each PreviewPool process (created once by _init_render_worker)
+_worker_renderer = None
+
+
+def _init_render_worker(mode, dpi):
+    """Pool initializer: build the reusable figure once per process"""
+    global _worker_renderer
+    _worker_renderer = PreviewRenderer(mode, dpi)
+
+
+def _render_task(job):
+    """Pool task: render one (x, y, filename, fmt, xlabel) job"""
+    _worker_renderer.render(*job)
+    return job[2]
+
+
+class PreviewPool:
+    """Render previews in a process pool while the caller keeps integrating"""
+
+    def __init__(self, workers=2, mode='full', dpi=None, max_pending=None):
+        """
+        Args:
+            workers (int): Rendering processes
+            mode (str): Preview mode, see PREVIEW_MODES
+            dpi (int, optional): PNG resolution overriding the mode default
+            max_pending (int, optional): Queued jobs before submit() blocks (default 4 per worker)
+        """
+        if mode not in PREVIEW_MODES:
+            raise ValueError(f"Unknown preview mode '{mode}', expected one of {list(PREVIEW_MODES)}")
+        self.workers = workers
+        self.max_pending = max_pending or 4 * workers
+        self.rendered = 0
+        self.errors = []
+        self._pending = deque()
+        self._pool = multiprocessing.Pool(processes=workers, initializer=_init_render_worker,
+                                          initargs=(mode, dpi))
+
+    def submit(self, x, y, filename, fmt='png', xlabel='2θ (deg)'):
+        """Queue one pattern for rendering"""
+        job = (np.asarray(x), np.asarray(y), filename, fmt, xlabel)
+        self._pending.append((filename, self._pool.apply_async(_render_task, (job,))))
+        # Bounded backlog: wait for the oldest job instead of queueing arrays without limit
+        while len(self._pending) > self.max_pending:
+            self._collect(*self._pending.popleft())
+
+    def _collect(self, filename, async_result):
+        try:
+            async_result.get()
+            self.rendered += 1
+        except Exception as e:
+            self.errors.append((filename, str(e)))
+
+    def close(self):
+        """
+        Wait for all queued previews and shut the pool down
+
+        Returns:
+            list: [(filename, error), ...] of failed renders
+        """
+        while self._pending:
+            self._collect(*self._pending.popleft())
+        self._pool.close()
+        self._pool.join()
+        return self.errors
+
+
+# ---------- Benchmark ----------
+def _render_pyplot(x, y, filename, fmt):
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(10, 6))
+    plt.plot(x, y, 'b-', linewidth=1)
+    plt.xlabel('2θ (deg)')
+    plt.ylabel('Intensity')
+    plt.title('Integrated Diffraction Pattern')
+    plt.grid(True, alpha=0.3)
+    plt.savefig(filename, format=fmt, dpi=300 if fmt == 'png' else None)
+    plt.close()
+
+
+def run_benchmark(n_patterns=20, npt=2000):
+    """Time per-pattern pyplot figures against the reusable renderer"""
+    rng = np.random.default_rng(0)
+    x = np.linspace(1.0, 30.0, npt)
+    patterns = [rng.gamma(2.0, 500.0, npt) for _ in range(n_patterns)]
+
+    print(f"Preview benchmark: {n_patterns} patterns, {npt} points")
+    print(f"{'renderer':<28}{'ms/pattern':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        def timed(name, render):
+            start = time.perf_counter()
+            for i, y in enumerate(patterns):
+                render(x, y, os.path.join(tmp, f"p{i}.png"))
+            print(f"{name:<28}{(time.perf_counter() - start) / n_patterns * 1e3:>12.1f}")
+
+        timed('pyplot figure per pattern', lambda x, y, f: _render_pyplot(x, y, f, 'png'))
+        full = PreviewRenderer('full')
+        timed('reused figure (300 dpi)', lambda x, y, f: full.render(x, y, f))
+        thumb = PreviewRenderer('thumbnail')
+        timed('reused figure (thumbnail)', lambda x, y, f: thumb.render(x, y, f))
+
+        pool = PreviewPool(workers=2, mode='full')
+        start = time.perf_counter()
+        for i, y in enumerate(patterns):
+            pool.submit(x, y, os.path.join(tmp, f"q{i}.png"))
+        pool.close()
+        print(f"{'process pool, 2 workers':<28}{(time.perf_counter() - start) / n_patterns * 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Integration Progress Channel
+Machine-readable progress of a batch integration subprocess, sent as JSON lines
+over a localhost TCP socket so it never mixes with the human-readable log on stdout
+
+Messages (child -> GUI), one JSON object per line:
+    {"event": "start", "total": 120}
+    {"event": "file", "file": ".../10.5GPa.h5", "index": 3, "total": 120,
+     "seconds": 0.84, "status": "ok" | "failed" | "cached" | "skipped", "error": "..."}
+    {"event": "done", "success": 118, "failed": 2, "cancelled": false, "seconds": 101.3}
+
+Commands (GUI -> child):
+    cancel      stop after the file currently being integrated
+"""
+
+import json
+import socket
+import threading
+
+
+class ProgressReporter:
+    """Child side: sends progress messages and listens for a cancel command"""
+
+    def __init__(self, port=None, host='127.0.0.1'):
+        """
+        Args:
+            port (int, optional): Port of the GUI's ProgressServer; None disables reporting
+            host (str): Host of the ProgressServer
+        """
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._sock = None
+        if port:
+            self._sock = socket.create_connection((host, int(port)), timeout=5)
+            self._sock.settimeout(None)
+            threading.Thread(target=self._listen, daemon=True).start()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def _listen(self):
+        try:
+            for line in self._sock.makefile('r', encoding='utf-8'):
+                if line.strip() == 'cancel':
+                    self.cancel_event.set()
+        except (OSError, ValueError):
+            pass
+
+    def send(self, event, **fields):
+        """Send one message; a closed GUI end silently disables the channel"""
+        if self._sock is None:
+            return
+        line = json.dumps(dict(fields, event=event), default=str) + "\n"
+        with self._lock:
+            try:
+                self._sock.sendall(line.encode('utf-8'))
+            except OSError:
+                self._sock = None
+
+    def start(self, total):
+        self.send('start', total=total)
+
+    def file(self, file, index, total, seconds, status, error=None):
+        fields = dict(file=file, index=index, total=total, seconds=round(seconds, 4), status=status)
+        if error:
+            fields['error'] = error
+        self.send('file', **fields)
+
+    def done(self, success, failed, cancelled, seconds):
+        self.send('done', success=success, failed=failed, cancelled=cancelled, seconds=round(seconds, 3))
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                try:
+                    self._sock.close()
+                except OSError:
+                    pass
+                self._sock = None
+
+
+class ProgressServer:
+    """GUI side: accepts the connection of one integration subprocess"""
+
+    def __init__(self, on_message, host='127.0.0.1'):
+        """
+        Args:
+            on_message (callable): Called with every decoded message (dict), from
+                                   a background thread
+            host (str): Interface to listen on (localhost only by default)
+        """
+        self.on_message = on_message
+        self._server = socket.create_server((host, 0))
+        self._server.settimeout(0.5)
+        self.port = self._server.getsockname()[1]
+        self._conn = None
+        self._cancel_requested = False
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while not self._closed.is_set():
+            try:
+                conn, _ = self._server.accept()
+                break
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+        else:
+            return
+
+        conn.settimeout(None)
+        with self._lock:
+            self._conn = conn
+            # A cancel issued before the child connected is delivered now
+            if self._cancel_requested:
+                self._send_cancel()
+
+        try:
+            for line in conn.makefile('r', encoding='utf-8'):
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                self.on_message(message)
+        except (OSError, ValueError):
+            pass
+
+    def _send_cancel(self):
+        try:
+            self._conn.sendall(b"cancel\n")
+        except OSError:
+            pass
+
+    def cancel(self):
+        """Ask the connected subprocess to stop after its current file"""
+        with self._lock:
+            self._cancel_requested = True
+            if self._conn is not None:
+                self._send_cancel()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            for sock in (self._conn, self._server):
+                if sock is not None:
+                    try:
+                        sock.close()
+                    except OSError:
+                        pass
+            self._conn = None
+
+
+class RateEstimator:
+    """Files/s and ETA from the messages of a ProgressReporter"""
+
+    def __init__(self):
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.processed = 0       # integrated files (cache hits excluded)
+        self.busy_seconds = 0.0  # time spent on integrated files
+        self.cancelled = False
+        self.finished = False
+
+    def update(self, message):
+        """Feed one progress message"""
+        event = message.get('event')
+        if event == 'start':
+            self.total = message.get('total', 0)
+        elif event == 'file':
+            self.total = message.get('total', self.total)
+            self.done = message.get('index', self.done) + 1
+            if message.get('status') == 'failed':
+                self.failed += 1
+            if message.get('status') not in ('cached', 'skipped'):
+                # Cache hits and resumed files are near-instant and would inflate the rate
+                self.processed += 1
+                self.busy_seconds += message.get('seconds', 0.0)
+        elif event == 'done':
+            self.cancelled = bool(message.get('cancelled'))
+            self.finished = True
+
+    def rate(self):
+        """Integrated files per second"""
+        return self.processed / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+    def eta(self):
+        """Estimated seconds left, or None before the first integrated file"""
+        rate = self.rate()
+        if rate <= 0:
+            return None
+        return (self.total - self.done) / rate
+
+    def summary(self):
+        """One-line status, e.g. '12/100 files · 3.2 files/s · ETA 0:27'"""
+        text = f"{self.done}/{self.total} files"
+        if self.processed:
+            text += f" · {self.rate():.1f} files/s"
+        eta = self.eta()
+        if eta is not None and self.done < self.total:
+            minutes, seconds = divmod(int(round(eta)), 60)
+            text += f" · ETA {minutes // 60}:{minutes % 60:02d}:{seconds:02d}" if minutes >= 60 \
+                else f" · ETA {minutes}:{seconds:02d}"
+        if self.failed:
+            text += f" · {self.failed} failed"
+        return text
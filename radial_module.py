@@ -24,16 +24,25 @@ import glob
 import h5py
 import numpy as np
 import re
+import time
 from pathlib import Path
 from datetime import datetime
 from gui_base import GUIBase
+from pattern_writers import write_columns, poisson_sigma
+from sector_engine_cache import SectorEngineCache, mask_digest
+from mask_io import load_mask
+from h5_layout import resolve_layout
+from file_index import FileIndexer, find_files
+from stage_timer import StageTimer
+from pattern_store import default_store_path, is_pattern_store
+from pattern_index import PatternIndex, acquisition_time, read_pattern_index, lookup
+from stacked_renderer import render_stacked, render_waterfall, patterns_from_store, patterns_from_files
 from theme_module import CuteSheepProgressBar, ModernButton
 from custom_widgets import SpinboxStyleButton, CustomSpinbox
 
 # Import pyFAI (with fallback if not available)
 try:
     import pyFAI
-    import fabio
     PYFAI_AVAILABLE = True
 except ImportError:
     PYFAI_AVAILABLE = False
@@ -118,6 +127,7 @@ class AzimuthalIntegrationModule(GUIBase):
         self.poni_path = ""
         self.mask_path = ""
         self.input_pattern = ""
+        self.index_cache = True  # Reuse cached directory listings (see file_index)
         self.output_dir = ""
         self.dataset_path = "entry/data/data"
         
@@ -298,6 +308,10 @@ class AzimuthalIntegrationModule(GUIBase):
         self.create_folder_input(left_layout, "Output Directory", "output_dir")
         self.create_text_input(left_layout, "Dataset Path", "dataset_path", placeholder="entry/data/data")
 
+        # Cached directory listings can miss files still arriving from the detector
+        self.index_cache_cb = self.create_option_checkbox(
+            left_layout, "Rescan input folders (ignore file index cache)", 'index_cache', invert=True)
+
         # Parameters row (Azimuthal Points, Radial Points, Unit)
         params_row = QWidget()
         params_row.setStyleSheet(f"background-color: {self.colors['card_bg']};")
@@ -650,6 +664,41 @@ class AzimuthalIntegrationModule(GUIBase):
         offset_layout.addStretch()
         viz_grid_layout.addWidget(offset_row)
         
+        # Frame range option for multi-frame HDF5 stacks
+        frames_row = QWidget()
+        frames_row.setStyleSheet(f"background-color: {self.colors['card_bg']};")
+        frames_layout = QHBoxLayout(frames_row)
+        frames_layout.setContentsMargins(0, 0, 0, 0)
+        frames_layout.setSpacing(8)
+        
+        frames_label = QLabel("Frames:")
+        frames_label.setFont(QFont('Arial', 9, QFont.Weight.Bold))
+        frames_label.setStyleSheet(f"color: black; background-color: {self.colors['card_bg']};border:none;")
+        frames_layout.addWidget(frames_label)
+        
+        self.frames_entry = QLineEdit("")
+        self.frames_entry.setFixedWidth(70)
+        self.frames_entry.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.frames_entry.setFont(QFont('Arial', 9))
+        self.frames_entry.setStyleSheet(f"""
+            QLineEdit {{
+                background-color: white;
+                color: {self.colors['text_dark']};
+                border: 1px solid {self.colors['border']};
+                padding: 3px;
+            }}
+        """)
+        self.frames_entry.setPlaceholderText("first")
+        frames_layout.addWidget(self.frames_entry)
+        
+        frames_hint = QLabel("(all or start:stop:step)")
+        frames_hint.setFont(QFont('Arial', 8))
+        frames_hint.setStyleSheet("color: #999999;border: none;")
+        frames_layout.addWidget(frames_hint)
+        
+        frames_layout.addStretch()
+        viz_grid_layout.addWidget(frames_row)
+        
         settings_layout.addWidget(viz_grid)
 
         right_layout.addWidget(settings_card, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignHCenter)
@@ -997,65 +1046,21 @@ class AzimuthalIntegrationModule(GUIBase):
     def _do_integration(self):
         """Perform the actual integration work"""
         try:
+            run_start = time.perf_counter()
             # Initialize integrator
             integrator = BatchIntegrator(
                 self.poni_path,
                 self.mask_path if self.mask_path else None
             )
             
-            # Find input files with intelligent fallback mechanism
-            input_files = []
-            
+            # Find input files with the cached single-pass indexer
             self.log(f"🔍 Searching for input files: {self.input_pattern}")
-            
-            # Method 1: Try the pattern as-is with recursive search
-            input_files = sorted(glob.glob(self.input_pattern, recursive=True))
-            # Filter out directories and only keep .h5 files
-            input_files = [f for f in input_files if f.endswith('.h5') and os.path.isfile(f)]
+            indexer = FileIndexer(use_cache=self.index_cache)
+            input_files, search = find_files(self.input_pattern, ('.h5',), indexer)
             if input_files:
-                self.log(f"✓ Method 1: Found {len(input_files)} files")
-            
-            # Method 2: If no files and it's a directory path, search for **/*.h5 recursively
-            if not input_files and os.path.isdir(self.input_pattern):
-                pattern = os.path.join(self.input_pattern, '**', '*.h5')
-                self.log(f"📂 Method 2: Searching recursively in directory...")
-                input_files = sorted(glob.glob(pattern, recursive=True))
-                if input_files:
-                    self.log(f"✓ Method 2: Found {len(input_files)} files")
-            
-            # Method 3: If pattern contains *.h5 but no **, try recursive search
-            if not input_files and '*.h5' in self.input_pattern and '**' not in self.input_pattern:
-                if self.input_pattern.endswith('*.h5'):
-                    base_dir = self.input_pattern[:-len('*.h5')].rstrip('/\\')
-                    if not base_dir:
-                        base_dir = '.'
-                    recursive_pattern = os.path.join(base_dir, '**', '*.h5')
-                else:
-                    recursive_pattern = self.input_pattern.replace('*.h5', '**/*.h5')
-                self.log(f"📂 Method 3: Converting to recursive pattern...")
-                input_files = sorted(glob.glob(recursive_pattern, recursive=True))
-                if input_files:
-                    self.log(f"✓ Method 3: Found {len(input_files)} files")
-            
-            # Method 4: Try as directory with recursive **/*.h5
-            if not input_files:
-                clean_path = self.input_pattern.rstrip('/*')
-                if os.path.isdir(clean_path):
-                    recursive_pattern = os.path.join(clean_path, '**', '*.h5')
-                    self.log(f"📂 Method 4: Trying cleaned directory path...")
-                    input_files = sorted(glob.glob(recursive_pattern, recursive=True))
-                    if input_files:
-                        self.log(f"✓ Method 4: Found {len(input_files)} files")
-            
-            # Method 5: Try parent directory
-            if not input_files and os.path.sep in self.input_pattern:
-                parent_dir = os.path.dirname(self.input_pattern)
-                if parent_dir and os.path.isdir(parent_dir):
-                    recursive_pattern = os.path.join(parent_dir, '**', '*.h5')
-                    self.log(f"📂 Method 5: Trying parent directory...")
-                    input_files = sorted(glob.glob(recursive_pattern, recursive=True))
-                    if input_files:
-                        self.log(f"✓ Method 5: Found {len(input_files)} files")
+                self.log(f"✓ Matched by {search}: {len(input_files)} files "
+                         f"({indexer.cached_dirs} of {indexer.scanned_dirs + indexer.cached_dirs} "
+                         f"directories unchanged)")
             
             if not input_files:
                 raise ValueError(f"No .h5 files found matching pattern: {self.input_pattern}")
@@ -1108,108 +1113,127 @@ class AzimuthalIntegrationModule(GUIBase):
             else:
                 self.log("Normal Mode: Full integration")
             
-            # Process each file
+            # Frame selection for multi-frame stacks ("" = first frame only)
+            frames = None
+            frame_text = self.frames_entry.text().strip() if hasattr(self, 'frames_entry') else ""
+            if frame_text:
+                # Same parser as the batch script (imported here: it needs pyFAI)
+                from batch_integration import parse_frame_range
+                frames = parse_frame_range(frame_text)
+                self.log(f"Frame mode: {frame_text} (one pattern per frame)")
+            
+            # Process each file; every output is listed in the pattern index of the output directory
             all_patterns = []
+            pattern_index = PatternIndex(self.output_dir)
             for i, h5_file in enumerate(input_files, 1):
                 basename = os.path.splitext(os.path.basename(h5_file))[0]
+                pressure, is_unload = integrator._extract_pressure(h5_file)
+                file_info = {'source_file': os.path.abspath(h5_file), 'pressure': pressure,
+                             'is_unload': is_unload}
                 
                 try:
-                    if use_bin_mode:
-                        # Single Sector mode: Process each sector separately
-                        self.log(f"Processing ({i}/{len(input_files)}): {basename} - {len(self.bins)} single sectors")
-                        for j, bin_data in enumerate(self.bins, 1):
-                            bin_name = bin_data['name']
-                            azim_start = bin_data['start']
-                            azim_end = bin_data['end']
-                            rad_min = bin_data.get('rad_min', 0.0)
-                            rad_max = bin_data.get('rad_max', 0.0)
-                            
-                            output_base = os.path.join(self.output_dir, f"{basename}_{bin_name}_{azim_start:.1f}-{azim_end:.1f}")
+                    # Frames are streamed chunk by chunk; without a frame range only the first frame is read
+                    for frame, img_data in integrator._iter_h5_frames(h5_file, self.dataset_path, frames):
+                        # Read while the file was open for its frames, not by opening it again
+                        file_info['acquisition_time'] = integrator.acquisition_times.pop(
+                            h5_file, file_info.get('acquisition_time'))
+                        frame_label = basename if frames is None else f"{basename}_f{frame:05d}"
+                        if use_bin_mode:
+                            # Single Sector mode: read the frame once, integrate every sector from it
+                            self.log(f"Processing ({i}/{len(input_files)}): {frame_label} - {len(self.bins)} single sectors")
                             
-                            self.log(f"  [{j}/{len(self.bins)}] Sector: {bin_name} ({azim_start}° - {azim_end}°)")
+                            sectors = []
+                            for bin_data in self.bins:
+                                rad_min = bin_data.get('rad_min', 0.0)
+                                rad_max = bin_data.get('rad_max', 0.0)
+                                sectors.append({
+                                    'azimuth_range': (bin_data['start'], bin_data['end']),
+                                    'radial_range': (rad_min, rad_max) if rad_max > 0 else None
+                                })
                             
-                            # Build kwargs for integration
-                            integration_kwargs = {
-                                'azimuth_range': (azim_start, azim_end)
-                            }
-                            if rad_max > 0:
-                                integration_kwargs['radial_range'] = (rad_min, rad_max)
-                            
-                            two_theta, intensity = integrator.integrate_single(
-                                h5_file,
-                                output_base,
-                                npt=self.npt_rad,
-                                unit=pyfai_unit,
-                                dataset_path=self.dataset_path,
-                                formats=formats,
-                                **integration_kwargs
+                            patterns = integrator.integrate_sectors(
+                                img_data, sectors, npt=self.npt_rad, unit=pyfai_unit
                             )
                             
-                            all_patterns.append((f"{basename}_{bin_name}", two_theta, intensity))
+                            for j, (bin_data, (two_theta, intensity)) in enumerate(zip(self.bins, patterns), 1):
+                                bin_name = bin_data['name']
+                                azim_start = bin_data['start']
+                                azim_end = bin_data['end']
+                                
+                                output_base = os.path.join(self.output_dir, f"{frame_label}_{bin_name}_{azim_start:.1f}-{azim_end:.1f}")
+                                
+                                self.log(f"  [{j}/{len(self.bins)}] Sector: {bin_name} ({azim_start}° - {azim_end}°)")
+                                integrator.save_pattern(output_base, two_theta, intensity, formats)
+                                pattern_index.record([dict(file_info, name=os.path.basename(output_base),
+                                                           frames=[frame], sector=bin_name,
+                                                           azimuth_start=azim_start, azimuth_end=azim_end)])
+                                
+                                all_patterns.append((os.path.basename(output_base), two_theta, intensity))
+                            
+                            self.log(f"  ✓ Completed all single sectors for {frame_label}")
                         
-                        self.log(f"  ✓ Completed all single sectors for {basename}")
-                    
-                    elif use_multiple_sectors:
-                        # Multiple sectors: Process each sector separately
-                        self.log(f"Processing ({i}/{len(input_files)}): {basename} - {len(self.sectors)} sectors")
-                        for j, sector in enumerate(self.sectors, 1):
-                            sector_name = sector['name']
-                            azim_start = sector['azim_start']
-                            azim_end = sector['azim_end']
-                            rad_min = sector['rad_min']
-                            rad_max = sector['rad_max'] if sector['rad_max'] > 0 else None
+                        elif use_multiple_sectors:
+                            # Multiple sectors: read the frame once, integrate every sector from it
+                            self.log(f"Processing ({i}/{len(input_files)}): {frame_label} - {len(self.sectors)} sectors")
                             
-                            output_base = os.path.join(self.output_dir, f"{basename}_{sector_name}")
+                            sectors = []
+                            for sector in self.sectors:
+                                rad_max = sector['rad_max'] if sector['rad_max'] > 0 else None
+                                sectors.append({
+                                    'azimuth_range': (sector['azim_start'], sector['azim_end']),
+                                    'radial_range': (sector['rad_min'], rad_max) if rad_max else None
+                                })
                             
-                            self.log(f"  [{j}/{len(self.sectors)}] Sector: {sector_name} ({azim_start}° - {azim_end}°)")
+                            patterns = integrator.integrate_sectors(
+                                img_data, sectors, npt=self.npt_rad, unit=pyfai_unit
+                            )
+                            
+                            for j, (sector, (two_theta, intensity)) in enumerate(zip(self.sectors, patterns), 1):
+                                sector_name = sector['name']
+                                output_base = os.path.join(self.output_dir, f"{frame_label}_{sector_name}")
+                                
+                                self.log(f"  [{j}/{len(self.sectors)}] Sector: {sector_name} ({sector['azim_start']}° - {sector['azim_end']}°)")
+                                integrator.save_pattern(output_base, two_theta, intensity, formats)
+                                pattern_index.record([dict(file_info, name=os.path.basename(output_base),
+                                                           frames=[frame], sector=sector_name,
+                                                           azimuth_start=sector['azim_start'],
+                                                           azimuth_end=sector['azim_end'])])
+                                
+                                all_patterns.append((os.path.basename(output_base), two_theta, intensity))
+                            
+                            self.log(f"  ✓ Completed all sectors for {frame_label}")
+                        
+                        else:
+                            # Normal mode: Full integration
+                            output_base = os.path.join(self.output_dir, frame_label)
                             
-                            # Build kwargs for integration
-                            integration_kwargs = {
-                                'azimuth_range': (azim_start, azim_end)
-                            }
-                            if rad_max:
-                                integration_kwargs['radial_range'] = (rad_min, rad_max)
+                            self.log(f"Processing ({i}/{len(input_files)}): {frame_label}")
                             
-                            two_theta, intensity = integrator.integrate_single(
-                                h5_file,
+                            two_theta, intensity = integrator.integrate_image(
+                                img_data,
                                 output_base,
                                 npt=self.npt_rad,
                                 unit=pyfai_unit,
-                                dataset_path=self.dataset_path,
-                                formats=formats,
-                                **integration_kwargs
+                                formats=formats
                             )
                             
-                            all_patterns.append((f"{basename}_{sector_name}", two_theta, intensity))
-                        
-                        self.log(f"  ✓ Completed all sectors for {basename}")
-                    
-                    else:
-                        # Normal mode: Full integration
-                        output_base = os.path.join(self.output_dir, basename)
-                        
-                        self.log(f"Processing ({i}/{len(input_files)}): {basename}")
-                        
-                        two_theta, intensity = integrator.integrate_single(
-                            h5_file,
-                            output_base,
-                            npt=self.npt_rad,
-                            unit=pyfai_unit,
-                            dataset_path=self.dataset_path,
-                            formats=formats
-                        )
+                            pattern_index.record([dict(file_info, name=frame_label, frames=[frame], sector=None)])
+                            
+                            all_patterns.append((frame_label, two_theta, intensity))
+                            self.log(f"  ✓ Completed")
                         
-                        all_patterns.append((basename, two_theta, intensity))
-                        self.log(f"  ✓ Completed")
-                    
                 except Exception as e:
                     self.log(f"  ⚠ Warning: Failed to process {basename}: {str(e)}")
                     continue
+            pattern_index.close()
             
             if not all_patterns:
                 raise ValueError("No files were successfully processed")
             
             self.log(f"✓ Successfully processed {len(all_patterns)} files")
+            stats = integrator.engine_cache.stats()
+            self.log(f"Engine cache: {stats['hits']} hits, {stats['misses']} misses, "
+                     f"{stats['engines']}/{stats['max_engines']} engines")
             
             # Create stacked plot if requested
             if hasattr(self, 'create_stacked_plot_flag') and self.create_stacked_plot_flag:
@@ -1229,15 +1253,20 @@ class AzimuthalIntegrationModule(GUIBase):
                         else:
                             offset_value = 'auto'
                     
-                    integrator.create_stacked_plot(
-                        self.output_dir,
-                        offset=offset_value,
-                        output_name='stacked_plot.png'
-                    )
+                    # Drawn from the patterns in memory instead of re-reading the outputs
+                    with integrator.timer.stage('plot_stacked'):
+                        integrator.create_stacked_plot(
+                            self.output_dir,
+                            offset=offset_value,
+                            output_name='stacked_plot.png',
+                            patterns=[{'name': f"{name}.xy", 'x': x, 'y': y}
+                                      for name, x, y in all_patterns]
+                        )
                     self.log("✓ Stacked plot generated")
                 except Exception as e:
                     self.log(f"⚠ Warning: Failed to create stacked plot: {str(e)}")
             
+            integrator.timer.report(time.perf_counter() - run_start, log=self.log)
             return f"Integration completed: {len(all_patterns)} files processed"
             
         except Exception as e:
@@ -1274,13 +1303,14 @@ class AzimuthalIntegrationModule(GUIBase):
 class BatchIntegrator:
     """Batch integration processor - migrated from batch_integration.py"""
     
-    def __init__(self, poni_file, mask_file=None):
+    def __init__(self, poni_file, mask_file=None, max_engines=16):
         """
         Initialize the integrator
         
         Args:
             poni_file (str): Path to calibration file (.poni)
             mask_file (str, optional): Path to mask file
+            max_engines (int): Sector definitions whose integration engines are kept (LRU)
         """
         if not PYFAI_AVAILABLE:
             raise ImportError("pyFAI is required for integration")
@@ -1299,22 +1329,18 @@ class BatchIntegrator:
             print(f"  Masked pixels: {np.sum(self.mask)}")
         elif mask_file:
             print(f"⚠ Warning: Mask file not found: {mask_file}")
+        
+        # Integration engines per sector definition, reused across the file series
+        self.mask_digest = mask_digest(self.mask)
+        self.engine_cache = SectorEngineCache(self.ai, max_engines)
+        # Per-stage time and bytes (open, read, integrate1d, save_<fmt>, ...), see StageTimer
+        self.timer = StageTimer()
+        # Acquisition time of each source file, taken while its frames are read
+        self.acquisition_times = {}
     
     def _load_mask(self, mask_file):
-        """Load mask file"""
-        ext = os.path.splitext(mask_file)[1].lower()
-        
-        if ext == '.npy':
-            mask = np.load(mask_file)
-        elif ext in ['.edf', '.tif', '.tiff', '.png']:
-            mask = fabio.open(mask_file).data
-        else:
-            raise ValueError(f"Unsupported mask file format: {ext}")
-        
-        if mask.dtype != bool:
-            mask = mask.astype(bool)
-        
-        return mask
+        """Load mask file (.npz compact, .npy, .edf, .tif, .png) through the mask cache"""
+        return load_mask(mask_file)
     
     def _read_h5_image(self, h5_file, dataset_path=None, frame_index=0):
         """
@@ -1328,6 +1354,7 @@ class BatchIntegrator:
         Returns:
             numpy.ndarray: Image data
         """
+        start = time.perf_counter()
         with h5py.File(h5_file, 'r') as f:
             if dataset_path is None:
                 dataset_path = self._find_image_dataset(f)
@@ -1336,49 +1363,75 @@ class BatchIntegrator:
                 raise ValueError(f"Dataset not found in HDF5 file: {dataset_path}")
             
             data = f[dataset_path]
+            self.acquisition_times[h5_file] = acquisition_time(h5_file, f)
+            self.timer.add('open', time.perf_counter() - start)
             
+            start = time.perf_counter()
             if len(data.shape) == 3:
                 if frame_index >= data.shape[0]:
                     raise ValueError(f"Frame index {frame_index} out of bounds (total frames: {data.shape[0]})")
                 img_data = data[frame_index]
             else:
                 img_data = data[()]
+            self.timer.add('read', time.perf_counter() - start, img_data.nbytes)
         
         return img_data
     
-    def _find_image_dataset(self, h5_file_obj):
-        """Automatically find image dataset path in HDF5"""
-        common_paths = [
-            '/entry/data/data',
-            '/entry/instrument/detector/data',
-            '/entry/data/image',
-            '/data/data',
-            '/data',
-            '/image',
-            'data',
-        ]
+    def _iter_h5_frames(self, h5_file, dataset_path=None, frames=None, chunk_size=16):
+        """
+        Stream frames of an HDF5 image stack chunk by chunk
         
-        for path in common_paths:
-            if path in h5_file_obj:
-                return path
-        
-        def find_dataset(obj, path=''):
-            if isinstance(obj, h5py.Dataset):
-                if len(obj.shape) >= 2:
-                    return path
-            elif isinstance(obj, h5py.Group):
-                for key in obj.keys():
-                    result = find_dataset(obj[key], path + '/' + key)
-                    if result:
-                        return result
-            return None
-        
-        result = find_dataset(h5_file_obj)
-        if result:
-            print(f"  Automatically found dataset: {result}")
-            return result
-        else:
-            raise ValueError("No suitable image dataset found in HDF5 file")
+        Args:
+            h5_file (str): Path to HDF5 file
+            dataset_path (str, optional): Dataset path within HDF5
+            frames (slice, optional): Frame selection; None reads only the first frame
+            chunk_size (int): Number of selected frames read per h5py call
+        
+        Yields:
+            tuple: (frame_index, image)
+        """
+        start = time.perf_counter()
+        with h5py.File(h5_file, 'r') as f:
+            if dataset_path is None:
+                dataset_path = self._find_image_dataset(f)
+            
+            if dataset_path not in f:
+                raise ValueError(f"Dataset not found in HDF5 file: {dataset_path}")
+            
+            data = f[dataset_path]
+            self.acquisition_times[h5_file] = acquisition_time(h5_file, f)
+            self.timer.add('open', time.perf_counter() - start)
+            
+            if len(data.shape) != 3 or frames is None:
+                start = time.perf_counter()
+                img_data = data[()] if len(data.shape) != 3 else data[0]
+                self.timer.add('read', time.perf_counter() - start, img_data.nbytes)
+                yield 0, img_data
+                return
+            
+            start, stop, step = frames.indices(data.shape[0])
+            if step < 1:
+                raise ValueError(f"Frame step must be positive, got {step}")
+            if not range(start, stop, step):
+                raise ValueError(f"Frame selection {frames.start}:{frames.stop}:{frames.step} "
+                                 f"matches no frame of {h5_file} ({data.shape[0]} frames)")
+            
+            span = chunk_size * step
+            for chunk_start in range(start, stop, span):
+                read_start = time.perf_counter()
+                block = data[chunk_start:min(chunk_start + span, stop):step]
+                self.timer.add('read', time.perf_counter() - read_start, block.nbytes)
+                for offset, img_data in enumerate(block):
+                    yield chunk_start + offset * step, img_data
+    
+    def _find_image_dataset(self, h5_file_obj):
+        """
+        Automatically find image dataset path in HDF5
+
+        The layout of the first file of a directory is cached (see h5_layout),
+        later files of the series only get a cheap validation of that path.
+        """
+        return resolve_layout(h5_file_obj).path
     
     def integrate_single(self, h5_file, output_base, npt=2000, unit="2th_deg",
                         dataset_path=None, frame_index=0, formats=['xy'], **kwargs):
@@ -1400,62 +1453,116 @@ class BatchIntegrator:
         # Read image
         img_data = self._read_h5_image(h5_file, dataset_path, frame_index)
         
-        # Perform integration
-        result = self.ai.integrate1d(
-            img_data,
-            npt,
-            mask=self.mask,
-            unit=unit,
-            **kwargs
-        )
+        return self.integrate_image(img_data, output_base, npt=npt, unit=unit,
+                                    formats=formats, **kwargs)
+    
+    def integrate_image(self, img_data, output_base, npt=2000, unit="2th_deg",
+                        formats=['xy'], **kwargs):
+        """
+        Integrate an image already in memory and save in multiple formats
+        
+        Returns:
+            tuple: (two_theta, intensity) arrays
+        """
+        with self.timer.stage('integrate1d'):
+            result = self.engine_cache.integrate1d(
+                img_data,
+                npt,
+                mask=self.mask,
+                mask_digest=self.mask_digest,
+                unit=unit,
+                **kwargs
+            )
         
         two_theta = result.radial
         intensity = result.intensity
         
         # Save in requested formats
+        self.save_pattern(output_base, two_theta, intensity, formats)
+        
+        return two_theta, intensity
+    
+    def integrate_sectors(self, img_data, sectors, npt=2000, unit="2th_deg", **kwargs):
+        """
+        Integrate several sectors of an image that has already been read
+        
+        The frame is read once per file and every sector pattern is produced
+        from the same array, instead of reopening the HDF5 file per sector.
+        Each sector's integration engine comes from self.engine_cache, so the
+        pyFAI sparse matrix is built once per sector definition, not per file.
+        
+        Args:
+            img_data (numpy.ndarray): Detector image
+            sectors (list): [{'azimuth_range': (min, max), 'radial_range': (min, max) or None}, ...]
+            npt (int): Number of points in output pattern
+            unit (str): Unit for integration ('2th_deg', 'q_nm^-1', etc.)
+        
+        Returns:
+            list: [(two_theta, intensity), ...] in the same order as sectors
+        """
+        patterns = []
+        for sector in sectors:
+            sector_kwargs = dict(kwargs)
+            sector_kwargs['azimuth_range'] = sector['azimuth_range']
+            if sector.get('radial_range'):
+                sector_kwargs['radial_range'] = sector['radial_range']
+            
+            with self.timer.stage('integrate1d'):
+                result = self.engine_cache.integrate1d(
+                    img_data,
+                    npt,
+                    mask=self.mask,
+                    mask_digest=self.mask_digest,
+                    unit=unit,
+                    **sector_kwargs
+                )
+            patterns.append((result.radial, result.intensity))
+        
+        return patterns
+    
+    def save_pattern(self, output_base, x, y, formats):
+        """Save one integrated pattern in all requested formats"""
         for fmt in formats:
+            start = time.perf_counter()
             if fmt == 'xy':
-                self._save_xy(output_base + '.xy', two_theta, intensity)
+                self._save_xy(output_base + '.xy', x, y)
             elif fmt == 'dat':
-                self._save_dat(output_base + '.dat', two_theta, intensity)
+                self._save_dat(output_base + '.dat', x, y)
             elif fmt == 'chi':
-                self._save_chi(output_base + '.chi', two_theta, intensity)
+                self._save_chi(output_base + '.chi', x, y)
             elif fmt == 'fxye':
-                self._save_fxye(output_base + '.fxye', two_theta, intensity)
+                self._save_fxye(output_base + '.fxye', x, y)
             elif fmt == 'svg':
-                self._save_svg(two_theta, intensity, output_base + '.svg')
+                self._save_svg(x, y, output_base + '.svg')
             elif fmt == 'png':
-                self._save_png(two_theta, intensity, output_base + '.png')
-        
-        return two_theta, intensity
+                self._save_png(x, y, output_base + '.png')
+            else:
+                continue
+            try:
+                nbytes = os.path.getsize(f"{output_base}.{fmt}")
+            except OSError:
+                nbytes = 0
+            self.timer.add(f"save_{fmt}", time.perf_counter() - start, nbytes)
     
     def _save_xy(self, filename, x, y):
         """Save as .xy format (two columns)"""
-        np.savetxt(filename, np.column_stack((x, y)), fmt='%.6f  %.6f', delimiter='  ')
+        write_columns(filename, (x, y), "%.6f  %.6f\n")
     
     def _save_dat(self, filename, x, y):
         """Save as .dat format"""
-        with open(filename, 'w') as f:
-            f.write("# 2Theta   Intensity\n")
-            for xi, yi in zip(x, y):
-                f.write(f"{xi:.6f}  {yi:.6f}\n")
+        write_columns(filename, (x, y), "%.6f  %.6f\n", header="# 2Theta   Intensity\n")
     
     def _save_chi(self, filename, x, y):
         """Save as .chi format (GSAS-II compatible)"""
-        with open(filename, 'w') as f:
-            f.write(f"{os.path.basename(filename)}\n")
-            f.write(f"Wavelength: {self.ai.wavelength*1e10:.6f}\n")
-            f.write(f"2-Theta    Intensity\n")
-            for xi, yi in zip(x, y):
-                f.write(f"{xi:.4f}  {yi:.4f}\n")
+        header = (f"{os.path.basename(filename)}\n"
+                  f"Wavelength: {self.ai.wavelength*1e10:.6f}\n"
+                  f"2-Theta    Intensity\n")
+        write_columns(filename, (x, y), "%.4f  %.4f\n", header=header)
     
     def _save_fxye(self, filename, x, y):
         """Save as .fxye format (GSAS format)"""
-        with open(filename, 'w') as f:
-            f.write("XYDATA\n")
-            for xi, yi in zip(x, y):
-                sigma = np.sqrt(max(yi, 1))  # Poisson statistics
-                f.write(f"{xi:.6f}  {yi:.6f}  {sigma:.6f}\n")
+        # Poisson statistics
+        write_columns(filename, (x, y, poisson_sigma(y)), "%.6f  %.6f  %.6f\n", header="XYDATA\n")
     
     def _save_svg(self, x, y, filename):
         """Save as SVG plot"""
@@ -1547,7 +1654,8 @@ class BatchIntegrator:
         
         return None
     
-    def create_stacked_plot(self, output_dir, offset='auto', output_name='stacked_plot.png'):
+    def create_stacked_plot(self, output_dir, offset='auto', output_name='stacked_plot.png',
+                            patterns=None, waterfall=False):
         """
         Create stacked diffraction pattern plot
         
@@ -1559,51 +1667,68 @@ class BatchIntegrator:
             output_dir (str): Directory containing .xy or .dat files
             offset (str or float): Offset between curves ('auto' or specific value)
             output_name (str): Output filename
+            patterns (list, optional): In-memory patterns [{'name': output file name, 'x', 'y'}, ...];
+                                       read from the pattern store or .xy/.dat files if None
+            waterfall (bool): Also render intensity maps (waterfall*.png)
         """
         if not MATPLOTLIB_AVAILABLE:
             print("⚠ matplotlib not available, cannot create stacked plot")
             return
         
-        # Find all .xy or .dat files
-        xy_files = glob.glob(os.path.join(output_dir, '*.xy'))
-        if not xy_files:
-            xy_files = glob.glob(os.path.join(output_dir, '*.dat'))
+        if patterns is None:
+            store_path = default_store_path(output_dir)
+            if is_pattern_store(store_path):
+                patterns = patterns_from_store(store_path)
+            else:
+                xy_files = glob.glob(os.path.join(output_dir, '*.xy'))
+                if not xy_files:
+                    xy_files = glob.glob(os.path.join(output_dir, '*.dat'))
+                patterns = patterns_from_files(xy_files)
         
-        if not xy_files:
+        if not patterns:
             print("⚠ No .xy or .dat files found for stacked plot")
             return
         
-        # Group files by pressure
+        # Group patterns by pressure (from the pattern index; names are parsed only without one)
         from collections import defaultdict
         pressure_groups = defaultdict(list)
+        index = read_pattern_index(output_dir)
         
-        for f in xy_files:
-            pressure, is_unload = self._extract_pressure(f)
-            range_avg = self._extract_range_average(f)
-            pressure_groups[pressure].append((f, range_avg))
+        for pattern in patterns:
+            row = lookup(index, pattern['name'])
+            if row is not None:
+                pattern['pressure'], pattern['is_unload'] = row['pressure'], row['is_unload']
+                pattern['range_avg'] = (None if row['azimuth_start'] is None
+                                        else (row['azimuth_start'] + row['azimuth_end']) / 2.0)
+            else:
+                if 'pressure' not in pattern:
+                    pattern['pressure'], pattern['is_unload'] = self._extract_pressure(pattern['name'])
+                pattern['range_avg'] = self._extract_range_average(pattern['name'])
+            pressure_groups[pattern['pressure']].append(pattern)
         
         # Check if any pressure group contains more than 2 files
-        has_multi_file_groups = any(len(files) > 2 for files in pressure_groups.values())
+        has_multi_file_groups = any(len(group) > 2 for group in pressure_groups.values())
         
         if has_multi_file_groups:
             # Mode 1: Generate separate stacked plot for each pressure group
             print(f"Detected multiple data files at same pressure, generating separate plots...")
-            
-            for pressure, file_list in sorted(pressure_groups.items()):
-                if len(file_list) <= 2:
+        
+            for pressure, group in sorted(pressure_groups.items()):
+                if len(group) <= 2:
                     continue
-                
-                print(f"  Generating stacked plot for pressure {pressure:.2f} GPa ({len(file_list)} files)...")
+        
+                print(f"  Generating stacked plot for pressure {pressure:.2f} GPa ({len(group)} files)...")
                 self._create_single_pressure_stacked_plot(
-                    pressure, file_list, output_dir, offset,
-                    f'stacked_plot_{pressure:.2f}GPa.png'
+                    pressure, group, output_dir, offset,
+                    f'stacked_plot_{pressure:.2f}GPa.png', waterfall
                 )
         else:
             # Mode 2: All pressures in one plot
             print(f"Generating stacked plot for all pressures...")
-            self._create_all_pressure_stacked_plot(xy_files, output_dir, offset, output_name)
+            self._create_all_pressure_stacked_plot(patterns, output_dir, offset, output_name, waterfall)
     
-    def _create_single_pressure_stacked_plot(self, pressure, file_list, output_dir, offset, output_name):
+    def _create_single_pressure_stacked_plot(self, pressure, patterns, output_dir, offset, output_name,
+                                             waterfall=False):
         """
         Create stacked plot for multiple data files at a single pressure point
         """
@@ -1611,70 +1736,30 @@ class BatchIntegrator:
             return
         
         # Sort by range average
-        file_list_sorted = sorted(file_list, key=lambda x: x[1] if x[1] is not None else 0)
-        
-        # Load data
-        data_list = []
-        range_avgs = []
-        for file_path, range_avg in file_list_sorted:
-            try:
-                data = np.loadtxt(file_path)
-                data_list.append(data)
-                range_avgs.append(range_avg if range_avg is not None else 0)
-            except Exception as e:
-                print(f"    Warning: Could not load {file_path}: {e}")
-        
-        if not data_list:
-            return
-        
-        # Calculate offset
-        if offset == 'auto':
-            max_intensities = [np.max(data[:, 1]) for data in data_list]
-            calc_offset = np.mean(max_intensities) * 1.2
-        else:
-            calc_offset = float(offset)
-        
-        # Create figure
-        plt.figure(figsize=(12, 10))
+        patterns = sorted(patterns, key=lambda p: p['range_avg'] if p['range_avg'] is not None else 0)
+        range_avgs = [p['range_avg'] if p['range_avg'] is not None else 0 for p in patterns]
+        curves = [(p['x'], p['y']) for p in patterns]
         
         # Color map (cycles every 90 degrees)
         base_colors = plt.cm.tab20(np.linspace(0, 1, 20))
+        colors = [base_colors[int(avg // 90) % len(base_colors)] for avg in range_avgs]
+        labels = [f'{avg:.1f}°' for avg in range_avgs]
         
-        for idx, (data, range_avg) in enumerate(zip(data_list, range_avgs)):
-            y_offset = idx * calc_offset
-            color_idx = int(range_avg // 90) if range_avg is not None else idx
-            color = base_colors[color_idx % len(base_colors)]
-            label = f'{range_avg:.1f}°' if range_avg is not None else f'Data {idx+1}'
-            
-            plt.plot(data[:, 0], data[:, 1] + y_offset,
-                    color=color, linewidth=1.2, label=label)
-            
-            # Add label between current baseline and next baseline
-            x_pos = data[0, 0] + (data[-1, 0] - data[0, 0]) * 0.02
-            # Position at 75% between current and next baseline to avoid overlap
-            # y_offset is current baseline (idx * calc_offset)
-            # Next baseline is (idx + 1) * calc_offset = y_offset + calc_offset
-            y_pos = y_offset + calc_offset * 0.95
-            
-            plt.text(x_pos, y_pos, label,
-                    fontsize=8, verticalalignment='bottom',
-                    color='black', fontname='Arial')
-        
-        plt.xlabel('2θ (degrees)', fontsize=12)
-        plt.ylabel('Intensity (offset)', fontsize=12)
-        plt.title(f'Stacked Diffraction Patterns at {pressure:.2f} GPa',
-                 fontsize=14, fontweight='bold')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        
-        # Save figure
+        # Labels just below the next baseline
         output_path = os.path.join(output_dir, output_name)
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-        plt.close()
+        render_stacked(curves, output_path, offset, colors=colors, labels=labels, label_y=0.95,
+                       title=f'Stacked Diffraction Patterns at {pressure:.2f} GPa',
+                       label_style={'fontname': 'Arial'})
         
         print(f"    ✓ Stacked plot saved: {output_path}")
+        
+        if waterfall:
+            waterfall_path = os.path.join(output_dir, output_name.replace('stacked_plot', 'waterfall', 1))
+            render_waterfall(curves, waterfall_path, labels, ylabel='Azimuth',
+                             title=f'Intensity Map at {pressure:.2f} GPa')
+            print(f"    ✓ Waterfall plot saved: {waterfall_path}")
     
-    def _create_all_pressure_stacked_plot(self, xy_files, output_dir, offset, output_name):
+    def _create_all_pressure_stacked_plot(self, patterns, output_dir, offset, output_name, waterfall=False):
         """
         Create stacked plot for all pressures
         
@@ -1685,86 +1770,29 @@ class BatchIntegrator:
         if not MATPLOTLIB_AVAILABLE:
             return
         
-        # Extract pressure, is_unload and sort
-        file_info_list = []
-        for f in xy_files:
-            pressure, is_unload = self._extract_pressure(f)
-            file_info_list.append((f, pressure, is_unload))
-        
-        # Separate loading and unloading data
-        loading_data = [(f, p) for f, p, u in file_info_list if not u]
-        unloading_data = [(f, p) for f, p, u in file_info_list if u]
-        
         # Sort
-        loading_data.sort(key=lambda x: x[1])
-        unloading_data.sort(key=lambda x: x[1], reverse=True)
+        loading_data = sorted((p for p in patterns if not p['is_unload']), key=lambda p: p['pressure'])
+        unloading_data = sorted((p for p in patterns if p['is_unload']), key=lambda p: p['pressure'],
+                                reverse=True)
         
         # Combine
-        file_pressure_pairs = loading_data + unloading_data
-        
-        # Load data
-        data_list = []
-        pressures = []
-        is_unload_list = []
-        for file_path, pressure in file_pressure_pairs:
-            try:
-                data = np.loadtxt(file_path)
-                data_list.append(data)
-                pressures.append(pressure)
-                _, is_unload = self._extract_pressure(file_path)
-                is_unload_list.append(is_unload)
-            except Exception as e:
-                print(f"Warning: Could not load {file_path}: {e}")
-        
-        if not data_list:
-            return
-        
-        # Calculate offset
-        if offset == 'auto':
-            max_intensities = [np.max(data[:, 1]) for data in data_list]
-            calc_offset = np.mean(max_intensities) * 1.2
-        else:
-            calc_offset = float(offset)
+        ordered = loading_data + unloading_data
+        pressures = [p['pressure'] for p in ordered]
+        curves = [(p['x'], p['y']) for p in ordered]
         
         # Color map (change every 10 GPa)
         colors = plt.cm.tab10(np.arange(10))
+        labels = [f"d{p['pressure']:.1f} GPa" if p['is_unload'] else f"{p['pressure']:.1f} GPa"
+                  for p in ordered]
         
-        # Create plot
-        plt.figure(figsize=(12, 10))
-        
-        for idx, (data, pressure, is_unload) in enumerate(zip(data_list, pressures, is_unload_list)):
-            color_idx = int(pressure // 10) % 10
-            y_offset = idx * calc_offset
-            label = f'd{pressure:.1f} GPa' if is_unload else f'{pressure:.1f} GPa'
-            
-            plt.plot(data[:, 0], data[:, 1] + y_offset,
-                    color=colors[color_idx], linewidth=1.2, label=label)
-            
-            # Add pressure label between current baseline and next baseline
-            x_pos = data[0, 0] + (data[-1, 0] - data[0, 0]) * 0.02
-            # Position at 75% between current and next baseline to avoid overlap
-            # y_offset is current baseline (idx * calc_offset)
-            # Next baseline is (idx + 1) * calc_offset = y_offset + calc_offset
-            y_pos = y_offset + calc_offset * 0.75
-            
-            plt.text(x_pos, y_pos, label,
-                    fontsize=8, verticalalignment='bottom',
-                    color='black', fontname='Arial')
-        
-        plt.xlabel('2θ (degrees)', fontsize=12)
-        plt.ylabel('Intensity (offset)', fontsize=12)
-        plt.title('Stacked Diffraction Patterns (Loading + Unloading)',
-                 fontsize=14, fontweight='bold')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        
-        # Save plot
+        # Pressure labels at 75% between current baseline and next baseline
         output_path = os.path.join(output_dir, output_name)
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
-        plt.close()
+        render_stacked(curves, output_path, offset, colors=[colors[int(p // 10) % 10] for p in pressures],
+                       labels=labels, label_y=0.75, label_style={'fontname': 'Arial'},
+                       title='Stacked Diffraction Patterns (Loading + Unloading)')
         
         print(f"✓ Stacked plot saved: {output_path}")
-        print(f"  Total patterns: {len(data_list)}")
+        print(f"  Total patterns: {len(curves)}")
         print(f"  Loading data: {len(loading_data)}, Unloading data: {len(unloading_data)}")
         if pressures:
             print(f"  Pressure range: {min(pressures):.1f} - {max(pressures):.1f} GPa")
\ No newline at end of file
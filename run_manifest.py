@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Resume Manifest for Batch Integration
+Append-only JSON-lines log of completed source files, kept in the output
+directory. One line is written (and fsynced) per completed file:
+
+    {"file": "/data/run/10.5GPa.h5", "size": 4194816, "mtime_ns": 1712...,
+     "settings": "<sha1 of the integration settings>",
+     "patterns": [{"name": "10.5GPa_f00000", "frames": [0], "sector": null,
+                   "outputs": {"10.5GPa_f00000.xy": [31250, 2868093121]}}]}
+
+Output paths are relative to the output directory, with [size, crc32] of
+each output (null for previews rendered asynchronously, which are only
+checked for existence). Files whose patterns also went to the consolidated
+pattern store carry "store": <number of patterns>; they are recorded only
+after the store was flushed. A line cut short by a crash is ignored, so a
+file is either completely recorded or integrated again. On resume, a file is
+skipped only when its source, settings, every recorded output and its
+patterns in the store are unchanged; partially written or deleted outputs
+make it run again.
+"""
+
+import os
+import json
+import zlib
+import hashlib
+from datetime import datetime
+
+
+MANIFEST_NAME = 'integration_manifest.jsonl'
+
+# Outputs that may still be rendering when the file is recorded
+_UNCHECKED_FORMATS = ('.png', '.svg')
+
+
+def file_checksum(filename, block_size=1 << 20):
+    """CRC32 of a file's content"""
+    crc = 0
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+
+def settings_digest(settings):
+    """Fingerprint of integration settings (any JSON-serializable structure)"""
+    text = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class RunManifest:
+    """Completed source files of an output directory"""
+
+    def __init__(self, output_dir, filename=MANIFEST_NAME):
+        """
+        Args:
+            output_dir (str): Output directory of the run (outputs are recorded relative to it)
+            filename (str): Manifest file name inside output_dir
+        """
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, filename)
+        self.entries = {}
+        self.skipped = 0
+        self.redone = 0
+        self._load()
+        self._file = None
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn line of an interrupted write
+                if isinstance(entry, dict) and 'file' in entry:
+                    self.entries[entry['file']] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _output_ok(self, rel_path, checksum):
+        path = os.path.join(self.output_dir, rel_path)
+        if checksum is None:
+            return os.path.exists(path)
+        size, crc = checksum
+        try:
+            return os.path.getsize(path) == size and file_checksum(path) == crc
+        except OSError:
+            return False
+
+    def is_complete(self, source_file, settings, store=None):
+        """
+        Whether a source file was completed with these settings and its outputs are intact
+
+        Args:
+            source_file (str): Source file
+            settings (str): settings_digest() of the integration settings
+            store (dict, optional): Patterns per source file of the pattern store the
+                                    run carries over (see pattern_store.stored_sources)
+        """
+        entry = self.entries.get(os.path.abspath(source_file))
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(source_file)
+        except OSError:
+            self.redone += 1
+            return False
+
+        complete = (entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+                    and entry.get('settings') == settings
+                    and all(self._output_ok(rel_path, checksum)
+                            for pattern in entry.get('patterns', [])
+                            for rel_path, checksum in pattern['outputs'].items())
+                    and self._store_ok(entry, store))
+        if complete:
+            self.skipped += 1
+        else:
+            self.redone += 1
+        return complete
+
+    def _store_ok(self, entry, store):
+        if 'store' not in entry:
+            return True
+        return store is not None and store.get(entry['file'], 0) >= entry['store']
+
+    def record(self, source_file, settings, patterns, in_store=False):
+        """
+        Append one completed source file
+
+        Args:
+            source_file (str): Source file
+            settings (str): settings_digest() of the integration settings
+            patterns (list): [{'name': str, 'frames': [int], 'sector': str or None,
+                               'outputs': [path, ...]}, ...]
+            in_store (bool): Every pattern was also flushed to the pattern store
+        """
+        stat = os.stat(source_file)
+        recorded = []
+        for pattern in patterns:
+            outputs = {}
+            for path in pattern['outputs']:
+                rel_path = os.path.relpath(path, self.output_dir).replace(os.sep, '/')
+                if path.lower().endswith(_UNCHECKED_FORMATS) or not os.path.exists(path):
+                    outputs[rel_path] = None
+                else:
+                    outputs[rel_path] = [os.path.getsize(path), file_checksum(path)]
+            recorded.append(dict(pattern, outputs=outputs))
+
+        entry = {
+            'file': os.path.abspath(source_file),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'settings': settings,
+            'patterns': recorded,
+            'time': datetime.now().isoformat(timespec='seconds'),
+        }
+        if in_store:
+            entry['store'] = sum(len(pattern['frames']) for pattern in patterns)
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps(entry) + "\n")
+        # Durable before the next file starts: a crash loses at most the file in flight
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.entries[entry['file']] = entry
+
+    def _open(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Terminate a line torn by a crash so the next entry starts on its own line
+        torn = False
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if torn:
+            self._file.write("\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
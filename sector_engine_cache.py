@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Sector Engine Cache
+pyFAI keeps one integration engine (lookup table / CSR matrix) per method and
+rebuilds it whenever azimuth_range, radial_range, npt, unit or the mask change.
+Multi-sector jobs alternate between sectors for every frame, so without help the
+sparse matrix is rebuilt for every sector of every file.
+
+SectorEngineCache keeps one set of engines per sector definition, keyed by
+(npt, unit, azimuth_range, radial_range, method, mask digest), and swaps it into
+the integrator around each integrate1d call. At most max_engines sets are kept,
+least recently used first out.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def mask_digest(mask):
+    """Short fingerprint of a mask array (None for no mask)"""
+    if mask is None:
+        return None
+    mask = np.asarray(mask, dtype=bool)
+    digest = hashlib.sha1(str(mask.shape).encode('utf-8'))
+    digest.update(np.packbits(mask).tobytes())
+    return digest.hexdigest()
+
+
+def _range_key(value):
+    return None if value is None else tuple(float(v) for v in value)
+
+
+class SectorEngineCache:
+    """LRU cache of pyFAI integration engines, one set per sector definition"""
+
+    def __init__(self, ai, max_engines=16):
+        """
+        Args:
+            ai: pyFAI AzimuthalIntegrator whose engines are cached
+            max_engines (int): Sector definitions kept before the least recently used is dropped
+        """
+        self.ai = ai
+        self.max_engines = max_engines
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._engines = OrderedDict()
+        # integrate1d runs with swapped engines, so calls are serialized
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._engines)
+
+    def make_key(self, npt, unit, azimuth_range=None, radial_range=None, method=None, mask_digest=None):
+        """Cache key of one sector definition"""
+        return (int(npt), str(unit), _range_key(azimuth_range), _range_key(radial_range),
+                repr(method), mask_digest)
+
+    def integrate1d(self, img_data, npt, unit="2th_deg", mask=None, mask_digest=None, **kwargs):
+        """
+        ai.integrate1d with the engines of this sector definition
+
+        Args:
+            img_data (numpy.ndarray): Detector image
+            npt (int): Number of points
+            unit (str): Radial unit
+            mask (numpy.ndarray, optional): Mask passed to integrate1d
+            mask_digest (str, optional): Fingerprint of mask, see mask_digest()
+            **kwargs: Other integrate1d arguments (azimuth_range, radial_range, method, ...)
+
+        Returns:
+            pyFAI Integrate1dResult
+        """
+        key = self.make_key(npt, unit, kwargs.get('azimuth_range'), kwargs.get('radial_range'),
+                            kwargs.get('method'), mask_digest)
+        with self._lock:
+            engines = self._engines.get(key)
+            if engines is None:
+                self.misses += 1
+                engines = self._engines[key] = {}
+                while len(self._engines) > self.max_engines:
+                    _, evicted = self._engines.popitem(last=False)
+                    for engine in evicted.values():
+                        engine.reset()
+                    self.evictions += 1
+            else:
+                self.hits += 1
+                self._engines.move_to_end(key)
+
+            previous = self.ai.engines
+            self.ai.engines = engines
+            try:
+                return self.ai.integrate1d(img_data, npt, mask=mask, unit=unit, **kwargs)
+            finally:
+                self.ai.engines = previous
+
+    def stats(self):
+        """Hit/miss counters as a dict"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'engines': len(self._engines), 'max_engines': self.max_engines}
+
+    def clear(self):
+        """Drop every cached engine"""
+        with self._lock:
+            for engines in self._engines.values():
+                for engine in engines.values():
+                    engine.reset()
+            self._engines.clear()
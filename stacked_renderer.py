@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Stacked Pattern Renderer
+Draws series of 1D patterns that may run into the thousands (pressure
+ramps, frame stacks, azimuthal bins):
+
+    render_stacked      all curves as a single LineCollection with offsets,
+                        optionally decimated to the output pixel width
+    render_waterfall    intensity vs. radial axis vs. pattern as one image,
+                        constant cost whatever the number of patterns
+
+Patterns come from memory (the integration run that just finished), from a
+consolidated pattern store or, as a fallback, from the text outputs.
+"""
+
+import os
+import numpy as np
+
+from pattern_store import read_pattern_store
+
+
+# Labels drawn at most per stacked plot; larger stacks get evenly spaced labels
+MAX_LABELS = 60
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def decimate_minmax(x, y, width):
+    """
+    Reduce a curve to one min/max pair per output pixel column
+
+    Peaks survive the reduction, unlike plain subsampling.
+
+    Args:
+        x (numpy.ndarray): Radial axis
+        y (numpy.ndarray): Intensity
+        width (int): Output width in pixels
+
+    Returns:
+        tuple: (x, y), unchanged when the curve has fewer than 2 points per pixel
+    """
+    n = len(x)
+    if width <= 0 or n <= 2 * width:
+        return x, y
+    starts = np.linspace(0, n, width + 1).astype(np.intp)[:-1]
+    ends = np.append(starts[1:], n) - 1
+    y_min = np.minimum.reduceat(y, starts)
+    y_max = np.maximum.reduceat(y, starts)
+    out_x = np.empty(2 * width, dtype=np.float64)
+    out_y = np.empty(2 * width, dtype=np.float64)
+    out_x[0::2], out_x[1::2] = x[starts], x[ends]
+    out_y[0::2], out_y[1::2] = y_min, y_max
+    return out_x, out_y
+
+
+def auto_offset(curves):
+    """Default vertical spacing: 1.2 x the mean curve maximum"""
+    return float(np.mean([np.nanmax(y) for _, y in curves])) * 1.2
+
+
+def _label_rows(n, max_labels):
+    if n <= max_labels:
+        return range(n)
+    return sorted(set(np.linspace(0, n - 1, max_labels).round().astype(int)))
+
+
+def render_stacked(curves, output_path, offset='auto', colors=None, labels=None, label_y=0.75,
+                   title='', xlabel='2θ (degrees)', ylabel='Intensity (offset)',
+                   figsize=(12, 10), dpi=300, decimate=True, max_labels=MAX_LABELS,
+                   label_style=None):
+    """
+    Draw curves stacked with a vertical offset, as one LineCollection
+
+    Args:
+        curves (list): [(x, y), ...] bottom to top
+        output_path (str): Image file to write
+        offset (str or float): Offset between curves ('auto' or specific value)
+        colors (list, optional): One matplotlib color per curve
+        labels (list, optional): One text label per curve
+        label_y (float or callable): Label height above the curve baseline, as a
+                                     fraction of the offset, or f(index, x, y, offset)
+                                     returning the height in data units
+        title (str): Figure title
+        xlabel (str): X axis label
+        ylabel (str): Y axis label
+        figsize (tuple): Figure size (inches)
+        dpi (int): Output resolution
+        decimate (bool): Reduce curves to min/max per pixel column of the output
+        max_labels (int): Label at most this many curves (evenly spaced)
+        label_style (dict, optional): Extra text properties of the labels
+
+    Returns:
+        float: Offset used between curves
+    """
+    plt = _pyplot()
+    from matplotlib.collections import LineCollection
+
+    calc_offset = auto_offset(curves) if offset == 'auto' else float(offset)
+    width = int(figsize[0] * dpi) if decimate else 0
+
+    segments = []
+    for idx, (x, y) in enumerate(curves):
+        x, y = decimate_minmax(np.asarray(x), np.asarray(y), width)
+        segments.append(np.column_stack((x, y + idx * calc_offset)))
+
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.add_collection(LineCollection(segments, colors=colors, linewidths=1.2))
+    ax.autoscale_view()
+
+    if labels is not None:
+        style = dict(fontsize=8, verticalalignment='bottom', color='black')
+        style.update(label_style or {})
+        for idx in _label_rows(len(curves), max_labels):
+            x, y = curves[idx]
+            x_pos = x[0] + (x[-1] - x[0]) * 0.02
+            if callable(label_y):
+                height = label_y(idx, x, y, calc_offset)
+            else:
+                height = calc_offset * label_y
+            ax.text(x_pos, idx * calc_offset + height, labels[idx], **style)
+
+    ax.set_xlabel(xlabel, fontsize=12)
+    ax.set_ylabel(ylabel, fontsize=12)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3)
+    fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return calc_offset
+
+
+def _common_grid(curves):
+    """Intensity matrix of the curves on one shared radial axis"""
+    x0 = np.asarray(curves[0][0])
+    if all(len(x) == len(x0) and np.allclose(x, x0) for x, _ in curves):
+        return x0, np.stack([np.asarray(y, dtype=np.float32) for _, y in curves])
+    lo = min(np.min(x) for x, _ in curves)
+    hi = max(np.max(x) for x, _ in curves)
+    grid = np.linspace(lo, hi, max(len(x) for x, _ in curves))
+    matrix = np.stack([np.interp(grid, x, y, left=np.nan, right=np.nan) for x, y in curves])
+    return grid, matrix.astype(np.float32)
+
+
+def render_waterfall(curves, output_path, row_labels=None, title='', xlabel='2θ (degrees)',
+                     ylabel='Pattern', figsize=(10, 8), dpi=150, log_scale=False, cmap='viridis'):
+    """
+    Draw curves as an image: radial axis horizontally, one row per curve
+
+    Args:
+        curves (list): [(x, y), ...] bottom to top
+        output_path (str): Image file to write
+        row_labels (list, optional): Tick label of every row (a subset is shown)
+        title (str): Figure title
+        xlabel (str): X axis label
+        ylabel (str): Y axis label
+        figsize (tuple): Figure size (inches)
+        dpi (int): Output resolution
+        log_scale (bool): Logarithmic intensity scale
+        cmap (str): Matplotlib colormap
+    """
+    plt = _pyplot()
+    from matplotlib.colors import LogNorm, Normalize
+
+    grid, matrix = _common_grid(curves)
+    finite = matrix[np.isfinite(matrix)]
+    if log_scale:
+        positive = finite[finite > 0]
+        vmin, vmax = np.percentile(positive, [1, 99.9]) if positive.size else (1, 10)
+        norm = LogNorm(vmin=vmin, vmax=vmax)
+    else:
+        vmin, vmax = np.percentile(finite, [1, 99.9]) if finite.size else (0, 1)
+        norm = Normalize(vmin=vmin, vmax=vmax)
+
+    fig, ax = plt.subplots(figsize=figsize)
+    image = ax.imshow(matrix, aspect='auto', origin='lower', interpolation='nearest', cmap=cmap,
+                      norm=norm, extent=(grid[0], grid[-1], -0.5, len(curves) - 0.5))
+    fig.colorbar(image, ax=ax, label='Intensity')
+
+    if row_labels is not None:
+        rows = _label_rows(len(curves), 20)
+        ax.set_yticks(list(rows))
+        ax.set_yticklabels([row_labels[i] for i in rows], fontsize=8)
+
+    ax.set_xlabel(xlabel, fontsize=12)
+    ax.set_ylabel(ylabel, fontsize=12)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+
+
+def patterns_from_store(filename):
+    """
+    Patterns of a consolidated pattern store
+
+    Returns:
+        list: [{'name', 'x', 'y', 'pressure', 'is_unload'}, ...]
+    """
+    data = read_pattern_store(filename)
+    radial = data['radial']
+    per_row_axis = radial.ndim == 2
+    return [{'name': str(name),
+             'x': radial[i] if per_row_axis else radial,
+             'y': data['intensity'][i],
+             'pressure': float(data['pressure'][i]),
+             'is_unload': bool(data['is_unload'][i])}
+            for i, name in enumerate(data['name'])]
+
+
+def patterns_from_files(files):
+    """
+    Patterns of two-column text outputs (.xy/.dat), skipping unreadable files
+
+    Returns:
+        list: [{'name' (file name), 'x', 'y'}, ...]; pressure is left to the caller
+    """
+    patterns = []
+    for filename in files:
+        try:
+            data = np.loadtxt(filename)
+        except Exception as e:
+            print(f"Warning: Could not load {filename}: {e}")
+            continue
+        patterns.append({'name': os.path.basename(filename),
+                         'x': data[:, 0], 'y': data[:, 1]})
+    return patterns
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Per-Stage Timing of Batch Integration
+Accumulates wall time, call counts and bytes per named stage (file open,
+dataset read, correction, integrate1d, each output format, plotting), so a
+run shows whether it is I/O-bound or CPU-bound.
+
+Stages timed while a file is active (StageTimer.file) are kept per file and
+handed back with pop_file(); the caller merges them into the run totals. This
+works the same for the serial loop, the pipeline threads and pool workers,
+whose per-file stats travel back with their results.
+"""
+
+import csv
+import time
+import threading
+from contextlib import contextmanager
+
+
+# Stage names in report order; the CSV trace has one column per stage
+STAGES = ['open', 'read', 'correct', 'auto_mask', 'integrate1d',
+          'save_xy', 'save_dat', 'save_chi', 'save_fxye', 'save_frames', 'save_h5',
+          'save_svg', 'save_png', 'plot_stacked']
+
+# Stages counted as disk I/O for the I/O- vs CPU-bound verdict
+IO_STAGES = ('open', 'read', 'save_xy', 'save_dat', 'save_chi', 'save_fxye', 'save_frames', 'save_h5')
+
+
+def _add(stats, name, seconds, calls, nbytes):
+    entry = stats.setdefault(name, [0.0, 0, 0])
+    entry[0] += seconds
+    entry[1] += calls
+    entry[2] += nbytes
+
+
+class StageTimer:
+    """Thread-safe accumulator of per-stage time, calls and bytes"""
+
+    def __init__(self):
+        self.totals = {}    # stage -> [seconds, calls, bytes]
+        self._files = {}    # file -> {stage: [seconds, calls, bytes]}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def file(self, key):
+        """Attribute the stages timed in this thread to one source file"""
+        previous = getattr(self._local, 'key', None)
+        self._local.key = key
+        try:
+            yield
+        finally:
+            self._local.key = previous
+
+    @contextmanager
+    def stage(self, name, nbytes=0):
+        """Time the enclosed block as one call of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, nbytes)
+
+    def add(self, name, seconds, nbytes=0, calls=1):
+        """Add time (and bytes) to a stage of the active file, or to the totals"""
+        key = getattr(self._local, 'key', None)
+        with self._lock:
+            stats = self.totals if key is None else self._files.setdefault(key, {})
+            _add(stats, name, seconds, calls, nbytes)
+
+    def add_bytes(self, name, nbytes):
+        """Count bytes of a stage without adding a call"""
+        self.add(name, 0.0, nbytes, calls=0)
+
+    def pop_file(self, key):
+        """
+        Take the stats collected for one file
+
+        Returns:
+            dict: {stage: [seconds, calls, bytes]}
+        """
+        with self._lock:
+            return self._files.pop(key, {})
+
+    def merge(self, stats, key=None):
+        """
+        Add per-file stats (from pop_file, possibly of another process)
+
+        Args:
+            stats (dict): {stage: [seconds, calls, bytes]}
+            key (optional): Add to the stats of this file instead of the totals
+        """
+        with self._lock:
+            target = self.totals if key is None else self._files.setdefault(key, {})
+            for name, (seconds, calls, nbytes) in (stats or {}).items():
+                _add(target, name, seconds, calls, nbytes)
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+            self._files.clear()
+
+    def format_table(self, wall_time=None):
+        """
+        Summary table of the totals
+
+        Returns:
+            list: Lines of text (without newlines)
+        """
+        if not self.totals:
+            return []
+        names = [name for name in STAGES if name in self.totals]
+        names += sorted(name for name in self.totals if name not in STAGES)
+        stage_time = sum(self.totals[name][0] for name in names)
+
+        title = "Stage timing"
+        if wall_time is not None:
+            title += f" (wall time {wall_time:.2f} s)"
+        lines = [title + ":",
+                 f"  {'stage':<14}{'calls':>8}{'seconds':>10}{'share':>8}{'MB':>10}{'MB/s':>9}"]
+        for name in names:
+            seconds, calls, nbytes = self.totals[name]
+            share = seconds / stage_time * 100 if stage_time > 0 else 0.0
+            mb = nbytes / 1e6
+            rate = f"{mb / seconds:>9.1f}" if nbytes and seconds > 0 else f"{'':>9}"
+            mb_text = f"{mb:>10.1f}" if nbytes else f"{'':>10}"
+            lines.append(f"  {name:<14}{calls:>8}{seconds:>10.3f}{share:>7.0f}%{mb_text}{rate}")
+
+        io_time = sum(self.totals[name][0] for name in names if name in IO_STAGES)
+        if stage_time > 0:
+            io_share = io_time / stage_time * 100
+            verdict = "I/O-bound" if io_share >= 50 else "CPU-bound"
+            lines.append(f"  → {verdict}: {io_share:.0f}% of stage time in file I/O, "
+                         f"{100 - io_share:.0f}% in computation and plotting")
+        return lines
+
+    def report(self, wall_time=None, log=print):
+        """Print (or log) the summary table"""
+        for line in self.format_table(wall_time):
+            log(line)
+
+
+class TraceWriter:
+    """CSV trace with one row of stage timings per source file"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['file', 'status', 'total_s'] + [f"{name}_s" for name in STAGES]
+                              + ['bytes_read', 'bytes_written'])
+
+    def write(self, source_file, status, stats):
+        """Append the row of one file (stats as returned by StageTimer.pop_file)"""
+        stats = stats or {}
+        seconds = [stats.get(name, [0.0])[0] for name in STAGES]
+        bytes_read = sum(stats.get(name, [0, 0, 0])[2] for name in ('open', 'read'))
+        bytes_written = sum(entry[2] for name, entry in stats.items() if name.startswith('save_'))
+        self._writer.writerow([source_file, status, f"{sum(s[0] for s in stats.values()):.6f}"]
+                              + [f"{s:.6f}" for s in seconds] + [bytes_read, bytes_written])
+        # Rows survive an interrupted run
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Tests of the input file search (file_index.find_files)"""
+
+import os
+import sys
+import ntpath
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_index
+from file_index import FileIndexer, find_files
+
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+
+
+def test_directory_glob_with_windows_normcase(tmp_path, monkeypatch):
+    for rel in ('sub1/x.h5', 'sub2/y.h5', 'other/z.h5'):
+        _touch(os.path.join(tmp_path, *rel.split('/')))
+    # ntpath.normcase lowercases and turns '/' into '\\'
+    monkeypatch.setattr(file_index.os.path, 'normcase', ntpath.normcase)
+
+    files, search = find_files(os.path.join(str(tmp_path), 'sub*', '*.h5'),
+                               indexer=FileIndexer(use_cache=False))
+
+    assert search == 'pattern'
+    assert [os.path.relpath(f, tmp_path).replace(os.sep, '/') for f in files] == ['sub1/x.h5', 'sub2/y.h5']